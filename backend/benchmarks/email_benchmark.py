@@ -0,0 +1,355 @@
+"""
+Benchmark harness for sending invoice emails.
+
+Starts a local SMTP server and a local HTTP server standing in for the
+Mailgun and Resend APIs, both with configurable latency and failure rate,
+and drives `EmailService.send_invoice_email` with concurrent sends of a
+rendered invoice PDF. Reports messages per second, p50/p99 send latency,
+the connections the servers accepted and memory use per scenario.
+
+The stand-ins discard what they receive, so the numbers describe
+the client side: connection pooling, TLS-free protocol overhead and the
+cost of building and encoding the messages.
+
+Usage:
+    python benchmarks/email_benchmark.py
+    python benchmarks/email_benchmark.py --providers smtp --concurrency 1,10,50 --messages 500
+    python benchmarks/email_benchmark.py --latency-ms 50 --failure-rate 0.05 --pdf-items 100
+    python benchmarks/email_benchmark.py --trace-memory --output results.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import statistics
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_benchmark import build_payload, create_logo
+from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.pdf_service import PDFService
+from billirae_backend.app.services.email_service import EmailService
+from billirae_backend.app.services.smtp_pool import smtp_pool
+from billirae_backend.app.services.http_client import http_client
+
+PROVIDERS = ["smtp", "resend", "mailgun"]
+CONCURRENCY = [1, 10, 50]
+
+class StandIn:
+    """Latency, failure rate and counters shared by the stand-in servers."""
+
+    def __init__(self, latency: float, failure_rate: float, seed: int):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.connections = 0
+        self.messages = 0
+        self.failures = 0
+        self.bytes_received = 0
+
+    def reset(self) -> None:
+        self.connections = 0
+        self.messages = 0
+        self.failures = 0
+        self.bytes_received = 0
+
+    async def respond(self) -> bool:
+        """Wait for the configured latency and decide whether the message fails."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        if self.random.random() < self.failure_rate:
+            self.failures += 1
+            return False
+        return True
+
+class SMTPStandIn(StandIn):
+    """Minimal ESMTP server without TLS or authentication."""
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        writer.write(b"220 localhost ESMTP benchmark\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-localhost\r\n250-8BITMIME\r\n250-SIZE 52428800\r\n250 SMTPUTF8\r\n")
+                elif command == b"HELO":
+                    writer.write(b"250 localhost\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line == b".\r\n":
+                            break
+                        self.bytes_received += len(data_line)
+                    if await self.respond():
+                        writer.write(b"250 2.0.0 OK queued\r\n")
+                    else:
+                        writer.write(b"451 4.3.0 Temporary failure\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 2.0.0 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    # MAIL, RCPT, RSET, NOOP
+                    writer.write(b"250 2.0.0 OK\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+class HTTPStandIn(StandIn):
+    """Keep-alive HTTP/1.1 server answering like the Resend and Mailgun send APIs."""
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header_line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                await self._read_body(reader, headers)
+                if await self.respond():
+                    status, body = "200 OK", json.dumps({"id": f"benchmark-{self.messages}", "message": "Queued"})
+                else:
+                    status, body = "503 Service Unavailable", json.dumps({"message": "Temporary failure"})
+                writer.write((
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n{body}"
+                ).encode("ascii"))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: Dict[str, str]) -> None:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                self.bytes_received += size
+                if size == 0:
+                    break
+        else:
+            length = int(headers.get("content-length", "0"))
+            await reader.readexactly(length)
+            self.bytes_received += length
+
+def render_pdf(item_count: int) -> bytes:
+    """Render a realistic invoice PDF with logo and payment QR code."""
+    pdf_service = PDFService()
+    with tempfile.TemporaryDirectory() as directory:
+        payload = build_payload(
+            pdf_service,
+            item_count,
+            {"watermark": False, "logo": True, "qr": True},
+            create_logo(directory)
+        )
+        return pdf_service.render_invoice_pdf(payload)
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_scenario(
+    email_service: EmailService,
+    provider: str,
+    stand_in: StandIn,
+    pdf_data: bytes,
+    messages: int,
+    concurrency: int,
+    trace_memory: bool
+) -> Dict[str, Any]:
+    """Send `messages` emails with at most `concurrency` in flight and measure them."""
+    # Fresh pools, so every scenario pays its own connection setup
+    await smtp_pool.close()
+    await http_client.close()
+    stand_in.reset()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    outcomes: List[bool] = []
+
+    async def send(index: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            sent = await email_service.send_invoice_email(
+                recipient_email=f"kunde{index}@example.com",
+                subject=f"Rechnung BENCH-{index:05d}",
+                body_html="<html><body><p>Sehr geehrte Damen und Herren,</p>"
+                          "<p>anbei erhalten Sie Ihre Rechnung.</p></body></html>",
+                pdf_data=pdf_data,
+                pdf_filename=f"Rechnung_BENCH-{index:05d}.pdf",
+                provider=provider
+            )
+            latencies.append(time.perf_counter() - start)
+            outcomes.append(sent)
+
+    if trace_memory:
+        tracemalloc.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        await asyncio.gather(*[send(index) for index in range(messages)])
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    result = {
+        "messages": messages,
+        "concurrency": concurrency,
+        "sent": sum(outcomes),
+        "failed": len(outcomes) - sum(outcomes),
+        "messages_per_second": round(messages / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "cpu_ms_per_message": round(cpu / messages * 1000, 3),
+        "server_connections": stand_in.connections,
+        "server_kb_received": round(stand_in.bytes_received / 1024, 1),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    if peak is not None:
+        result["peak_memory_kb"] = round(peak / 1024, 1)
+    if provider == "smtp":
+        result["pool"] = smtp_pool.stats()
+    else:
+        result["pool"] = http_client.stats()
+    return result
+
+def format_result(result: Dict[str, Any]) -> str:
+    memory = f"  peak {result['peak_memory_kb']:>8.1f} KB" if "peak_memory_kb" in result else ""
+    return (
+        f"{result['messages_per_second']:>8.1f} msg/s  p50 {result['p50_ms']:>8.2f} ms  "
+        f"p99 {result['p99_ms']:>8.2f} ms  failed {result['failed']:>4}  "
+        f"connections {result['server_connections']:>4}  cpu {result['cpu_ms_per_message']:>6.3f} ms/msg{memory}"
+    )
+
+async def run(args: argparse.Namespace, pdf_data: bytes) -> Dict[str, Dict[str, Any]]:
+    latency = args.latency_ms / 1000
+    smtp_stand_in = SMTPStandIn(latency, args.failure_rate, args.seed)
+    http_stand_in = HTTPStandIn(latency, args.failure_rate, args.seed)
+    smtp_server = await asyncio.start_server(smtp_stand_in.handle, "127.0.0.1", 0)
+    http_server = await asyncio.start_server(http_stand_in.handle, "127.0.0.1", 0)
+    smtp_port = smtp_server.sockets[0].getsockname()[1]
+    http_url = f"http://127.0.0.1:{http_server.sockets[0].getsockname()[1]}"
+
+    settings.SMTP_SERVER = "127.0.0.1"
+    settings.SMTP_PORT = smtp_port
+    settings.SMTP_USERNAME = ""
+    settings.RESEND_API_URL = http_url
+    settings.MAILGUN_API_URL = http_url
+    settings.MAILGUN_DOMAIN = "benchmark.example.com"
+    if args.pool_size:
+        smtp_pool.max_connections = args.pool_size
+        http_client.max_connections = args.pool_size
+
+    email_service = EmailService()
+    email_service.api_key = "benchmark"
+
+    results = {}
+    try:
+        for provider in args.providers.split(","):
+            stand_in = smtp_stand_in if provider == "smtp" else http_stand_in
+            for concurrency in [int(value) for value in args.concurrency.split(",")]:
+                name = f"{provider}/concurrency={concurrency}"
+                results[name] = await run_scenario(
+                    email_service, provider, stand_in, pdf_data,
+                    args.messages, concurrency, args.trace_memory
+                )
+                print(f"{name:<26} {format_result(results[name])}", flush=True)
+    finally:
+        await smtp_pool.close()
+        await http_client.close()
+        smtp_server.close()
+        http_server.close()
+    return results
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine the numbers were taken with."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark sending invoice emails")
+    parser.add_argument("--providers", default=",".join(PROVIDERS),
+                        help=f"comma separated providers out of {', '.join(PROVIDERS)}")
+    parser.add_argument("--concurrency", default=",".join(str(value) for value in CONCURRENCY),
+                        help="comma separated numbers of concurrent sends")
+    parser.add_argument("--messages", type=int, default=200, help="emails sent per scenario")
+    parser.add_argument("--latency-ms", type=float, default=20.0,
+                        help="time the stand-ins take to accept a message")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="share of messages the stand-ins reject with a temporary failure")
+    parser.add_argument("--pdf-items", type=int, default=10, help="items of the attached invoice PDF")
+    parser.add_argument("--pool-size", type=int, help="override SMTP_POOL_SIZE and EMAIL_HTTP_MAX_CONNECTIONS")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the failure injection")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="measure peak Python memory with tracemalloc, which slows sending down")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    unknown = set(args.providers.split(",")) - set(PROVIDERS)
+    if unknown:
+        parser.error(f"unknown providers: {', '.join(sorted(unknown))}")
+
+    # Rejected sends are counted, not logged one by one
+    logging.getLogger("billirae_backend").setLevel(logging.CRITICAL)
+
+    pdf_data = render_pdf(args.pdf_items)
+    print(
+        f"Email benchmark, {args.messages} messages per scenario, PDF {len(pdf_data) / 1024:.1f} KB, "
+        f"latency {args.latency_ms:g} ms, failure rate {args.failure_rate:g}"
+    )
+    results = asyncio.run(run(args, pdf_data))
+
+    if args.output:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "environment": environment(),
+            "options": vars(args),
+            "pdf_bytes": len(pdf_data),
+            "results": results,
+        }
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
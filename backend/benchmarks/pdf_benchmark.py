@@ -0,0 +1,307 @@
+"""
+Benchmark suite for PDF invoice rendering.
+
+Renders invoices with `PDFService.render_invoice_pdf` across item counts and
+with the draft watermark, company logo and payment QR code switched on and
+off, and measures wall time, CPU time, peak Python memory and output size.
+
+Results are compared against the baseline of the current LAYOUT_VERSION in
+benchmarks/baselines/. The run exits with status 1 when any metric regresses
+beyond its threshold. Only that baseline is ever read, so recording one
+deletes the baselines of older layout versions; commit the deletion with the
+new baseline.
+
+Usage:
+    python benchmarks/pdf_benchmark.py                    # compare against the baseline
+    python benchmarks/pdf_benchmark.py --update-baseline  # record a new baseline
+    python benchmarks/pdf_benchmark.py --update-baseline --notes "..."  # and note what it measured
+    python benchmarks/pdf_benchmark.py --items 1,10,100 --repeat 5
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import reportlab
+from PIL import Image as PILImage, ImageDraw
+from billirae_backend.app.db.models.invoice import InvoiceInDB, InvoiceItem
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.db.models.client import ClientInDB, Address
+from billirae_backend.app.services.pdf_service import PDFService, LAYOUT_VERSION
+from billirae_backend.app.services.logo_cache import logo_cache
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+BASELINE_FORMAT = 1
+
+ITEM_COUNTS = [1, 10, 100, 1000, 10000]
+
+# Feature sets rendered for every item count: all off, each one on, all on
+FEATURE_SETS = {
+    "plain": {"watermark": False, "logo": False, "qr": False},
+    "watermark": {"watermark": True, "logo": False, "qr": False},
+    "logo": {"watermark": False, "logo": True, "qr": False},
+    "qr": {"watermark": False, "logo": False, "qr": True},
+    "all": {"watermark": True, "logo": True, "qr": True},
+}
+
+# Allowed relative increase per metric, and an absolute increase below which
+# a change is treated as noise
+THRESHOLDS = {
+    "wall_ms": (0.25, 5.0),
+    "cpu_ms": (0.25, 5.0),
+    "peak_memory_kb": (0.20, 64.0),
+    "size_bytes": (0.05, 256.0),
+}
+
+def create_logo(directory: str) -> str:
+    """Write a large RGBA logo, like an unprocessed upload, and return its path."""
+    logo_path = os.path.join(directory, "benchmark-logo.png")
+    image = PILImage.new("RGBA", (1200, 560), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((40, 40, 520, 520), fill=(32, 96, 160, 255))
+    draw.rectangle((580, 180, 1160, 260), fill=(32, 96, 160, 255))
+    draw.rectangle((580, 300, 1000, 380), fill=(120, 170, 210, 255))
+    image.save(logo_path)
+    # Only uploaded logos are rendered, treat the benchmark directory as the upload storage
+    logo_cache.storage_dir = os.path.realpath(directory)
+    return logo_path
+
+def build_payload(pdf_service: PDFService, item_count: int, features: Dict[str, bool], logo_path: str) -> Dict[str, Any]:
+    """Build the render payload for one benchmark scenario."""
+    user = UserInDB(
+        id=f"benchmark-{'-'.join(name for name, enabled in features.items() if enabled) or 'plain'}",
+        email="benchmark@example.com",
+        hashed_password="x",
+        first_name="Erika",
+        last_name="Musterfrau",
+        company_name="Musterfrau Massagen",
+        address="Hauptstraße 1",
+        postal_code="10115",
+        city="Berlin",
+        country="Deutschland",
+        tax_id="12/345/67890",
+        vat_id="DE123456789",
+        logo_url=logo_path if features["logo"] else None,
+        bank_name="Berliner Bank" if features["qr"] else None,
+        bank_iban="DE89370400440532013000" if features["qr"] else None,
+        bank_bic="COBADEFFXXX" if features["qr"] else None,
+    )
+    client = ClientInDB(
+        id="benchmark-client",
+        user_id=user.id,
+        name="Max Mustermann",
+        address=Address(street="Musterstraße 123", city="Berlin", zip="10115")
+    )
+    items = [
+        InvoiceItem(service=f"Massage {index + 1}", quantity=1 + index % 3, unit_price=80.0)
+        for index in range(item_count)
+    ]
+    subtotal = sum(item.quantity * item.unit_price for item in items)
+    invoice = InvoiceInDB(
+        id="benchmark-invoice",
+        user_id=user.id,
+        client_id=client.id,
+        invoice_number="BENCH-2025-001",
+        invoice_date=datetime(2025, 1, 15),
+        due_date=datetime(2025, 1, 29),
+        status="draft" if features["watermark"] else "sent",
+        items=items,
+        subtotal=subtotal,
+        tax_amount=round(subtotal * 0.19, 2),
+        total=round(subtotal * 1.19, 2),
+        notes="Vielen Dank für Ihren Besuch."
+    )
+    return pdf_service.build_render_payload(invoice, user, client)
+
+def measure(pdf_service: PDFService, payload: Dict[str, Any], repeat: int) -> Dict[str, float]:
+    """
+    Measure one scenario.
+
+    The first render warms the caches (logo, QR matrix, letterhead markup),
+    so the numbers describe the steady state of a render worker. Timings are
+    the median of `repeat` renders; peak memory is taken in a separate render
+    because tracemalloc slows down the code it traces.
+    """
+    pdf_bytes = pdf_service.render_invoice_pdf(payload)
+
+    wall_times = []
+    cpu_times = []
+    for _ in range(repeat):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        pdf_service.render_invoice_pdf(payload)
+        cpu_times.append(time.process_time() - cpu_start)
+        wall_times.append(time.perf_counter() - wall_start)
+
+    tracemalloc.start()
+    try:
+        pdf_service.render_invoice_pdf(payload)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms": round(statistics.median(wall_times) * 1000, 2),
+        "cpu_ms": round(statistics.median(cpu_times) * 1000, 2),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "size_bytes": len(pdf_bytes),
+    }
+
+def run(item_counts: List[int], feature_sets: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Run all scenarios and return their metrics by scenario name."""
+    pdf_service = PDFService()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        logo_path = create_logo(directory)
+        for item_count in item_counts:
+            for feature_name in feature_sets:
+                name = f"items={item_count}/{feature_name}"
+                payload = build_payload(pdf_service, item_count, FEATURE_SETS[feature_name], logo_path)
+                # Large invoices take seconds per render, fewer repeats keep the run short
+                results[name] = measure(pdf_service, payload, repeat if item_count < 1000 else min(repeat, 3))
+                print(f"{name:<26} {format_metrics(results[name])}", flush=True)
+    return results
+
+def format_metrics(metrics: Dict[str, float]) -> str:
+    return (
+        f"wall {metrics['wall_ms']:>10.2f} ms  cpu {metrics['cpu_ms']:>10.2f} ms  "
+        f"peak {metrics['peak_memory_kb']:>9.1f} KB  size {metrics['size_bytes']:>8} B"
+    )
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and library versions the numbers were taken with."""
+    return {
+        "python": platform.python_version(),
+        "reportlab": reportlab.Version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def baseline_path() -> str:
+    return os.path.join(BASELINE_DIR, f"pdf_layout_v{LAYOUT_VERSION}.json")
+
+def remove_superseded_baselines() -> List[str]:
+    """Delete the baselines of older layout versions, which are never compared against."""
+    removed = []
+    for filename in sorted(os.listdir(BASELINE_DIR)):
+        match = re.fullmatch(r"pdf_layout_v(\d+)\.json", filename)
+        if match and int(match.group(1)) < int(LAYOUT_VERSION):
+            os.remove(os.path.join(BASELINE_DIR, filename))
+            removed.append(filename)
+    return removed
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], scale: float) -> List[Tuple[str, str, float, float]]:
+    """
+    Compare results against a baseline.
+
+    Returns:
+        List of (scenario, metric, baseline value, current value) regressions
+    """
+    regressions = []
+    for name, metrics in results.items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            print(f"{name}: not in baseline, skipped")
+            continue
+        for metric, (relative, absolute) in THRESHOLDS.items():
+            limit = expected[metric] * (1 + relative * scale) + absolute
+            if metrics[metric] > limit:
+                regressions.append((name, metric, expected[metric], metrics[metric]))
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark PDF invoice rendering")
+    parser.add_argument("--items", default=",".join(str(count) for count in ITEM_COUNTS),
+                        help="comma separated item counts")
+    parser.add_argument("--features", default=",".join(FEATURE_SETS),
+                        help=f"comma separated feature sets out of {', '.join(FEATURE_SETS)}")
+    parser.add_argument("--repeat", type=int, default=5, help="timed renders per scenario")
+    parser.add_argument("--threshold-scale", type=float, default=1.0,
+                        help="multiply the allowed relative regressions, e.g. 2 on noisy CI machines")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the results as baseline of the current layout version "
+                             "and delete the baselines of older versions")
+    parser.add_argument("--notes", action="append",
+                        help="note stored with a new baseline, repeat for several; "
+                             "the notes of the previous baseline are kept if omitted")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    item_counts = [int(count) for count in args.items.split(",")]
+    feature_sets = args.features.split(",")
+    unknown = set(feature_sets) - set(FEATURE_SETS)
+    if unknown:
+        parser.error(f"unknown feature sets: {', '.join(sorted(unknown))}")
+
+    print(f"PDF benchmark, layout version {LAYOUT_VERSION}")
+    results = run(item_counts, feature_sets, max(1, args.repeat))
+    report = {
+        "format": BASELINE_FORMAT,
+        "layout_version": LAYOUT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = baseline_path()
+        if os.path.exists(path):
+            # Keep baseline entries of scenarios that were not run this time
+            with open(path) as baseline_file:
+                previous = json.load(baseline_file)
+            report["results"] = {**previous["results"], **results}
+            if not args.notes and previous.get("notes"):
+                report["notes"] = previous["notes"]
+        if args.notes:
+            report["notes"] = args.notes
+        with open(path, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Baseline written to {path}")
+        for filename in remove_superseded_baselines():
+            print(f"Removed superseded baseline {filename}")
+        return 0
+
+    path = baseline_path()
+    if not os.path.exists(path):
+        print(f"No baseline for layout version {LAYOUT_VERSION}, record one with --update-baseline")
+        return 1
+
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("format") != BASELINE_FORMAT:
+        print(f"Baseline {path} has format {baseline.get('format')}, expected {BASELINE_FORMAT}")
+        return 1
+    if baseline["environment"] != environment():
+        print(f"Warning: baseline was recorded on {baseline['environment']}, timings may not be comparable")
+    for note in baseline.get("notes", []):
+        print(f"Baseline note: {note}")
+
+    regressions = compare(results, baseline, args.threshold_scale)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {path}:")
+        for name, metric, expected, actual in regressions:
+            print(f"  {name} {metric}: {expected} -> {actual} ({(actual / expected - 1) * 100 if expected else float('inf'):+.1f}%)")
+        return 1
+
+    print(f"\nNo regressions against {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
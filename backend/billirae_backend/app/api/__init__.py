@@ -4,7 +4,7 @@ from fastapi import APIRouter
 api_router = APIRouter()
 
 # Then import the modules
-from billirae_backend.app.api import auth, users, voice, profile, invoices, gdpr
+from billirae_backend.app.api import auth, users, voice, profile, invoices, gdpr, webhooks
 
 # Include routers
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -13,3 +13,4 @@ api_router.include_router(voice.router, prefix="/voice", tags=["voice"])
 api_router.include_router(profile.router, prefix="/profile", tags=["profile"])
 api_router.include_router(invoices.router, prefix="/invoices", tags=["invoices"])
 api_router.include_router(gdpr.router, prefix="/gdpr", tags=["gdpr"])
+api_router.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
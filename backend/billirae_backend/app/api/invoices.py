@@ -1,18 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Body
+import time
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Body, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, EmailStr, Field
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Literal, Optional
 from datetime import datetime
 
-from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.db.models.invoice import InvoiceInDB, InvoiceItem
 from billirae_backend.app.db.models.user import UserInDB
 from billirae_backend.app.db.models.client import ClientInDB
 from billirae_backend.app.services.pdf_service import PDFService
-from billirae_backend.app.services.email_service import EmailService
+from billirae_backend.app.services.email_service import build_invoice_email
+from billirae_backend.app.services.email_outbox import email_outbox
+from billirae_backend.app.services.bulk_send_service import bulk_send_service
+from billirae_backend.app.db.models.email_outbox import EmailJob
+from billirae_backend.app.services.export_service import ExportService
+from billirae_backend.app.services.einvoice_service import EInvoiceService
+from billirae_backend.app.services.pdf_storage import pdf_storage
+from billirae_backend.app.services.download_links import download_links, InvalidDownloadLink
 from billirae_backend.app.core.security import get_current_user
+from billirae_backend.app.core.config import settings
+from billirae_backend.app.core.conditional import (
+    conditional_response,
+    etag_matches,
+    is_not_modified,
+    not_modified_response,
+    validator_headers,
+)
 
 router = APIRouter()
 pdf_service = PDFService()
-email_service = EmailService()
+einvoice_service = EInvoiceService(pdf_service)
+export_service = ExportService(pdf_service, einvoice_service=einvoice_service)
 
 class InvoiceEmailRequest(BaseModel):
     """Request model for sending invoice email."""
@@ -20,6 +39,25 @@ class InvoiceEmailRequest(BaseModel):
     subject: Optional[str] = None
     message: Optional[str] = None
     cc_emails: Optional[List[EmailStr]] = None
+    pdf_delivery: Optional[Literal["attachment", "link"]] = None  # EMAIL_PDF_DELIVERY by default
+
+class BulkEmailRequest(BaseModel):
+    """Request model for sending the emails of many invoices."""
+    invoice_ids: List[str] = Field(..., min_length=1, max_length=1000)
+    subject: Optional[str] = None
+    message: Optional[str] = None
+    pdf_delivery: Optional[Literal["attachment", "link"]] = None  # EMAIL_PDF_DELIVERY by default
+
+class InvoicePreviewRequest(BaseModel):
+    """Request model for the layout preview of an invoice being edited."""
+    client_id: Optional[str] = None
+    client_name: Optional[str] = None  # Recipient without a client record yet, as named by a voice input
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[datetime] = None
+    due_date: Optional[datetime] = None
+    items: List[InvoiceItem] = []
+    status: str = "draft"
+    notes: Optional[str] = None
 
 class InvoiceResponse(BaseModel):
     """Response model for invoice operations."""
@@ -66,16 +104,204 @@ async def generate_pdf(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
 
+@router.post("/preview-layout")
+async def preview_layout(
+    preview_request: InvoicePreviewRequest,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Get the layout model of an invoice that is being edited.
+    
+    Returns the blocks of the invoice PDF with their formatted texts,
+    computed like the PDF renderer does but without rendering a PDF. The
+    invoice is not saved; totals are computed from the items. The recipient
+    is a saved client or, while none is picked, only a name.
+    
+    Args:
+        preview_request: Invoice data from the editor
+        current_user: Current authenticated user
+        
+    Returns:
+        Layout model, see `PDFService.build_layout_model`
+    """
+    try:
+        if preview_request.client_id:
+            client = await ClientInDB.get_by_id(preview_request.client_id)
+            if not client:
+                raise HTTPException(status_code=404, detail="Client not found")
+                
+            if client.user_id != str(current_user.id):
+                raise HTTPException(status_code=403, detail="Not authorized to access this client")
+        elif preview_request.client_name:
+            client = ClientInDB(user_id=str(current_user.id), name=preview_request.client_name)
+        else:
+            raise HTTPException(status_code=400, detail="Either client_id or client_name is required")
+        
+        subtotal = sum(item.quantity * item.unit_price for item in preview_request.items)
+        tax_amount = sum(item.quantity * item.unit_price * item.tax_rate for item in preview_request.items)
+        
+        invoice = InvoiceInDB(
+            user_id=str(current_user.id),
+            client_id=preview_request.client_id or "",
+            invoice_number=preview_request.invoice_number or "ENTWURF",
+            invoice_date=preview_request.invoice_date or datetime.now(),
+            due_date=preview_request.due_date,
+            items=preview_request.items,
+            subtotal=round(subtotal, 2),
+            tax_amount=round(tax_amount, 2),
+            total=round(subtotal + tax_amount, 2),
+            status=preview_request.status,
+            notes=preview_request.notes
+        )
+        
+        return pdf_service.build_layout_model(pdf_service.build_render_payload(invoice, current_user, client))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building invoice preview: {str(e)}")
+
+@router.post("/send-bulk", response_model=InvoiceResponse)
+async def send_bulk_email(
+    bulk_request: BulkEmailRequest,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Send the emails of many invoices, each to the address of its client.
+    
+    PDFs are rendered concurrently and their emails queued in the outbox as
+    they become ready. Follow the progress with the returned job ID.
+    
+    Args:
+        bulk_request: Invoice IDs and optional subject and message for all emails
+        current_user: Current authenticated user
+        
+    Returns:
+        InvoiceResponse with the job ID
+    """
+    try:
+        job = await bulk_send_service.start_job(
+            current_user,
+            bulk_request.invoice_ids,
+            bulk_request.subject,
+            bulk_request.message,
+            bulk_request.pdf_delivery
+        )
+        
+        return InvoiceResponse(
+            message="Bulk send started",
+            success=True,
+            data={"job_id": job.id, "total": len(job.invoice_ids)}
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting bulk send: {str(e)}")
+
+@router.get("/send-bulk/{job_id}", response_model=InvoiceResponse)
+async def get_bulk_send_progress(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Get the progress of a bulk send, per invoice.
+    
+    Args:
+        job_id: ID of the bulk send job
+        current_user: Current authenticated user
+        
+    Returns:
+        InvoiceResponse with counts by state and the state of each invoice
+    """
+    try:
+        job = await EmailJob.get_by_id(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Bulk send not found")
+        
+        if job.user_id != str(current_user.id):
+            raise HTTPException(status_code=403, detail="Not authorized to access this bulk send")
+        
+        return InvoiceResponse(
+            message="Bulk send progress",
+            success=True,
+            data=await bulk_send_service.get_progress(job)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting bulk send progress: {str(e)}")
+
+@router.get("/download/{sha256}")
+async def download_linked_pdf(
+    sha256: str,
+    request: Request,
+    filename: str,
+    expires: int,
+    signature: str
+):
+    """
+    Download an invoice PDF through a signed link from an email.
+    
+    No login is needed, the signature of the link authorizes the download
+    until the link expires.
+    
+    Args:
+        sha256: Content hash of the stored PDF
+        request: Incoming request
+        filename: Filename the PDF is downloaded as
+        expires: Expiry of the link as a Unix timestamp
+        signature: Signature of the link
+        
+    Returns:
+        PDF file
+    """
+    try:
+        download_links.verify(sha256, filename, expires, signature)
+    except InvalidDownloadLink as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    
+    try:
+        # Stored PDFs never change, the content hash is a strong validator
+        etag = f'"{sha256}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}, immutable",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        stored = await pdf_storage.get_blob(sha256)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        
+        if stored.path:
+            return FileResponse(stored.path, media_type="application/pdf", headers=headers)
+        return Response(await pdf_storage.read(stored), media_type="application/pdf", headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting PDF: {str(e)}")
+
 @router.get("/{invoice_id}/pdf")
 async def get_pdf(
     invoice_id: str,
+    request: Request,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Get the PDF for a specific invoice.
     
+    The response carries a strong ETag derived from the invoice content and
+    the time its PDF was stored as Last-Modified. A matching If-None-Match
+    is answered with 304 from the ETag alone, without looking up or
+    rendering the PDF. Single byte ranges are served as partial content.
+    PDFs kept in local storage are sent straight from the file.
+    
     Args:
         invoice_id: ID of the invoice to get PDF for
+        request: Incoming request with conditional and range headers
         current_user: Current authenticated user
         
     Returns:
@@ -93,32 +319,103 @@ async def get_pdf(
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
         
-        pdf_bytes = await pdf_service.generate_invoice_pdf(invoice, current_user, client)
+        etag = f'"{pdf_service.render_key(pdf_service.build_render_payload(invoice, current_user, client))}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified_response(etag)
         
-        from fastapi.responses import Response
-        return Response(
-            content=pdf_bytes,
+        # Stored under the ETag's render key, rendering only if it was never stored
+        stored = await pdf_service.get_stored_invoice_pdf(invoice, current_user, client)
+        last_modified = stored.created_at or invoice.created_at
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        disposition = {"Content-Disposition": f"attachment; filename=invoice_{invoice_id}.pdf"}
+        
+        if stored.path:
+            return FileResponse(
+                stored.path,
+                media_type="application/pdf",
+                headers={**validator_headers(etag, last_modified), **disposition}
+            )
+        
+        return conditional_response(
+            request,
+            await pdf_storage.read(stored),
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=invoice_{invoice_id}.pdf"}
+            etag=etag,
+            last_modified=last_modified,
+            headers=disposition
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting PDF: {str(e)}")
 
+@router.get("/{invoice_id}/einvoice")
+async def get_einvoice(
+    invoice_id: str,
+    syntax: Literal["cii", "ubl"] = "cii",
+    embed_pdf: bool = False,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Get the XRechnung e-invoice for a specific invoice.
+    
+    Args:
+        invoice_id: ID of the invoice
+        syntax: "cii" or "ubl" XML syntax
+        embed_pdf: Return the PDF with the CII XML embedded (ZUGFeRD) instead of the XML
+        current_user: Current authenticated user
+        
+    Returns:
+        XML file, or PDF/A-3 file with `embed_pdf`
+    """
+    try:
+        invoice = await InvoiceInDB.get_by_id(invoice_id)
+        if not invoice:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+            
+        if invoice.user_id != str(current_user.id):
+            raise HTTPException(status_code=403, detail="Not authorized to access this invoice")
+        
+        client = await ClientInDB.get_by_id(invoice.client_id)
+        if not client:
+            raise HTTPException(status_code=404, detail="Client not found")
+        
+        if embed_pdf:
+            pdf_bytes = await einvoice_service.generate_zugferd_pdf(invoice, current_user, client)
+            return Response(
+                content=pdf_bytes,
+                media_type="application/pdf",
+                headers={"Content-Disposition": f"attachment; filename=Rechnung_{invoice.invoice_number}.pdf"}
+            )
+        
+        xml_bytes = await asyncio.to_thread(einvoice_service.build_xml, invoice, current_user, client, syntax)
+        return Response(
+            content=xml_bytes,
+            media_type="application/xml",
+            headers={"Content-Disposition": f"attachment; filename=Rechnung_{invoice.invoice_number}.xml"}
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating e-invoice: {str(e)}")
+
 @router.post("/{invoice_id}/send-email", response_model=InvoiceResponse)
 async def send_invoice_email(
     invoice_id: str,
     email_request: InvoiceEmailRequest,
-    background_tasks: BackgroundTasks,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Send an invoice PDF via email.
     
+    The email is queued in the outbox and sent in the background, with
+    retries. The invoice is marked as sent once the email was delivered.
+    With link delivery the PDF is not attached, the email carries a signed
+    download link to it instead.
+    
     Args:
         invoice_id: ID of the invoice to send
         email_request: Email request data
-        background_tasks: FastAPI background tasks
         current_user: Current authenticated user
         
     Returns:
@@ -136,44 +433,101 @@ async def send_invoice_email(
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
         
-        pdf_bytes = await pdf_service.generate_invoice_pdf(invoice, current_user, client)
+        stored = await pdf_service.get_stored_invoice_pdf(invoice, current_user, client)
+        pdf_filename = f"Rechnung_{invoice.invoice_number}.pdf"
         
-        subject = email_request.subject or f"Rechnung {invoice.invoice_number} von {current_user.company_name or f'{current_user.first_name} {current_user.last_name}'}"
-        
-        body_html = f"""
-        <html>
-            <body>
-                <p>Sehr geehrte(r) {client.name},</p>
-                <p>anbei erhalten Sie die Rechnung {invoice.invoice_number} vom {invoice.invoice_date.strftime('%d.%m.%Y')}.</p>
-                {email_request.message or ''}
-                <p>Mit freundlichen Grüßen,<br>{current_user.company_name or f'{current_user.first_name} {current_user.last_name}'}</p>
-                <hr>
-                <p style="font-size: 12px; color: #666;">
-                    Diese E-Mail wurde über Billirae gesendet, eine Anwendung für Rechnungsstellung.
-                </p>
-            </body>
-        </html>
-        """
-        
-        background_tasks.add_task(
-            email_service.send_invoice_email,
+        pdf_delivery = email_request.pdf_delivery or settings.EMAIL_PDF_DELIVERY
+        download_url = download_links.create_url(stored.sha256, pdf_filename) if pdf_delivery == "link" else None
+        subject, body_html = build_invoice_email(
+            invoice, current_user, client, email_request.subject, email_request.message, download_url
+        )
+        
+        # Delivered by the outbox workers, which mark the invoice as sent afterwards
+        message = await email_outbox.enqueue(
+            user_id=current_user.id,
+            invoice_id=invoice.id,
             recipient_email=email_request.recipient_email,
             subject=subject,
             body_html=body_html,
-            pdf_data=pdf_bytes,
-            pdf_filename=f"Rechnung_{invoice.invoice_number}.pdf",
-            cc_emails=email_request.cc_emails
+            pdf=stored,
+            pdf_filename=pdf_filename,
+            cc_emails=email_request.cc_emails,
+            attach_pdf=download_url is None
         )
         
-        invoice.status = "sent"
-        invoice.sent_date = datetime.now()
-        await invoice.save()
-        
         return InvoiceResponse(
-            message="Email sent successfully",
+            message="Email queued for sending",
             success=True,
-            data={"recipient": email_request.recipient_email}
+            data={"recipient": email_request.recipient_email, "message_id": message.id}
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error sending email: {str(e)}")
+
+@router.get("/export")
+async def export_invoices(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    client_id: Optional[str] = None,
+    status: Optional[str] = None,
+    format: Literal["zip", "statement", "xrechnung", "zugferd"] = "zip",
+    syntax: Literal["cii", "ubl"] = "cii",
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Export the PDFs or e-invoices of all matching invoices in one download.
+    
+    Args:
+        start_date: Only invoices dated on or after this date
+        end_date: Only invoices dated on or before this date
+        client_id: Only invoices of this client
+        status: Only invoices with this status
+        format: "zip" for a ZIP of individual PDFs, "statement" for one merged PDF,
+            "xrechnung" for a ZIP of XRechnung XML files, "zugferd" for a ZIP of PDFs
+            with embedded XRechnung
+        syntax: XML syntax of "xrechnung" exports, "cii" or "ubl"
+        current_user: Current authenticated user
+        
+    Returns:
+        Streaming ZIP archive or PDF
+    """
+    query: Dict[str, Any] = {"user_id": str(current_user.id)}
+    if start_date or end_date:
+        query["invoice_date"] = {}
+        if start_date:
+            query["invoice_date"]["$gte"] = start_date
+        if end_date:
+            query["invoice_date"]["$lte"] = end_date
+    if client_id:
+        query["client_id"] = client_id
+    if status:
+        query["status"] = status
+    
+    invoices = InvoiceInDB.iter_find(query)
+    export_name = f"Rechnungen_{datetime.now().strftime('%Y-%m-%d')}"
+    
+    if format in ("xrechnung", "zugferd"):
+        return StreamingResponse(
+            export_service.stream_einvoice_zip(invoices, current_user, syntax, embed_pdf=format == "zugferd"),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={export_name}_{format}.zip"}
+        )
+    
+    if format == "statement":
+        if await InvoiceInDB.count(query) > settings.PDF_STATEMENT_MAX_INVOICES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"A statement can contain at most {settings.PDF_STATEMENT_MAX_INVOICES} invoices, "
+                       f"narrow the date range or export a ZIP"
+            )
+        return StreamingResponse(
+            export_service.stream_statement(invoices, current_user),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f"attachment; filename={export_name}.pdf"}
+        )
+    
+    return StreamingResponse(
+        export_service.stream_zip(invoices, current_user),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={export_name}.zip"}
+    )
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
 from pydantic import BaseModel
 from typing import Optional
 
 from billirae_backend.app.core.security import get_current_user
 from billirae_backend.app.db.models.user import UserInDB, UserUpdate
+from billirae_backend.app.services.letterhead import letterhead_cache
+from billirae_backend.app.services.logo_service import LogoService
 
 router = APIRouter()
+logo_service = LogoService()
 
 class ProfileResponse(BaseModel):
     """Response model for profile operations."""
@@ -26,7 +29,7 @@ class BusinessProfileUpdate(BaseModel):
     bank_account: Optional[str] = None
     bank_iban: Optional[str] = None
     bank_bic: Optional[str] = None
-    logo_url: Optional[str] = None
+    # The logo is only set by uploading it, see upload_business_logo
 
 @router.get("/business")
 async def get_business_profile(current_user: UserInDB = Depends(get_current_user)):
@@ -76,6 +79,9 @@ async def update_business_profile(
         # Update user fields
         for field, value in profile_update.dict(exclude_unset=True).items():
             setattr(current_user, field, value)
+        
+        # Precompile the invoice letterhead so renders can reuse it
+        letterhead_cache.refresh(current_user)
             
         # Save the updated user
         await current_user.save()
@@ -87,3 +93,49 @@ async def update_business_profile(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating business profile: {str(e)}")
+
+@router.post("/business/logo", response_model=ProfileResponse)
+async def upload_business_logo(
+    logo: UploadFile = File(...),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Upload the company logo shown on invoices.
+    
+    The image is validated, downsampled to the print resolution of the
+    invoice header and recompressed once, so every PDF embeds the small
+    prepared version.
+    
+    Args:
+        logo: Logo image upload
+        current_user: Current authenticated user
+        
+    Returns:
+        Success message
+    """
+    try:
+        data = await logo.read(logo_service.max_upload_bytes + 1)
+        logo_path = await logo_service.store_logo(str(current_user.id), data)
+        
+        previous_logo = current_user.logo_url
+        current_user.logo_url = logo_path
+        
+        # Precompile the invoice letterhead so renders can reuse it
+        letterhead_cache.refresh(current_user)
+        
+        # Save the updated user
+        await current_user.save()
+        
+        if previous_logo and previous_logo != logo_path:
+            logo_service.delete_logo(previous_logo)
+        
+        return ProfileResponse(
+            success=True,
+            message="Logo uploaded successfully"
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading logo: {str(e)}")
@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from billirae_backend.app.core.security import get_current_user
 from billirae_backend.app.db.models.user import UserInDB, UserUpdate
+from billirae_backend.app.services.letterhead import letterhead_cache
 
 router = APIRouter()
 
@@ -44,6 +45,9 @@ async def update_user(
         # Update user fields
         for field, value in user_update.dict(exclude_unset=True).items():
             setattr(current_user, field, value)
+        
+        # Precompile the invoice letterhead so renders can reuse it
+        letterhead_cache.refresh(current_user)
             
         # Save the updated user
         await current_user.save()
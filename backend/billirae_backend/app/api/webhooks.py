@@ -0,0 +1,89 @@
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+
+from billirae_backend.app.services.email_webhooks import (
+    DeliveryEvent,
+    InvalidWebhookSignature,
+    verify_mailgun_signature,
+    verify_resend_signature,
+    parse_mailgun_event,
+    parse_resend_event,
+)
+from billirae_backend.app.services.delivery_events import delivery_events
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/mailgun")
+async def mailgun_webhook(request: Request):
+    """
+    Receive a delivery event from Mailgun.
+
+    The event is buffered and written to its invoice with the next flush.
+
+    Args:
+        request: Webhook request with "signature" and "event-data"
+
+    Returns:
+        Success response
+    """
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    if not isinstance(payload, dict) or not isinstance(payload.get("signature"), dict):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+
+    try:
+        verify_mailgun_signature(payload["signature"])
+    except InvalidWebhookSignature as e:
+        logger.warning(f"Rejected Mailgun webhook: {str(e)}")
+        raise HTTPException(status_code=403, detail=str(e))
+
+    try:
+        event = parse_mailgun_event(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _buffer(event)
+
+@router.post("/resend")
+async def resend_webhook(request: Request):
+    """
+    Receive a delivery event from Resend.
+
+    The event is buffered and written to its invoice with the next flush.
+
+    Args:
+        request: Webhook request signed with the svix-* headers
+
+    Returns:
+        Success response
+    """
+    body = await request.body()
+    try:
+        verify_resend_signature(request.headers, body)
+    except InvalidWebhookSignature as e:
+        logger.warning(f"Rejected Resend webhook: {str(e)}")
+        raise HTTPException(status_code=403, detail=str(e))
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+
+    try:
+        event = parse_resend_event(payload, request.headers["svix-id"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _buffer(event)
+
+def _buffer(event: Optional[DeliveryEvent]) -> dict:
+    """Buffer a parsed event, asking the provider to retry while the buffer is full."""
+    if event is not None and not delivery_events.add(event):
+        raise HTTPException(status_code=503, detail="Too many buffered delivery events, retry later")
+    return {"success": True}
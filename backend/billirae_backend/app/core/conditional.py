@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+
+def http_date(value: datetime) -> str:
+    """
+    Format a datetime as an HTTP date.
+
+    Naive datetimes are taken as local time, like the `datetime.now()`
+    timestamps stored on the models.
+    """
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check whether an If-None-Match header lists an ETag, comparing weakly as RFC 9110 asks."""
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """
+    Evaluate If-None-Match and If-Modified-Since of a request.
+
+    If-Modified-Since is only used when the request has no If-None-Match,
+    as required by RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            # "-0000" dates parse as naive, HTTP dates are UTC
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+        return modified <= since
+
+    return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range of a Range header.
+
+    Args:
+        header: Range header value, e.g. "bytes=0-1023"
+        size: Size of the full representation
+
+    Returns:
+        Inclusive (start, end) byte positions, or None to send the full body
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_text, _, end_text = ranges.strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range, the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start_text and end_text and end < start:
+        # An invalid range, the header is ignored
+        return None
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """Build the ETag, Last-Modified and Cache-Control headers of a response."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def conditional_response(
+    request: Request,
+    content: bytes,
+    media_type: str,
+    etag: str,
+    last_modified: datetime,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Build a response honoring Range and If-Range.
+
+    Args:
+        request: Incoming request
+        content: Full response body
+        media_type: Content type of the body
+        etag: Strong ETag of the body, quoted
+        last_modified: Modification time of the body
+        headers: Additional response headers
+
+    Returns:
+        200 response with the full body, 206 with a part of it, or 416
+    """
+    response_headers = {
+        **validator_headers(etag, last_modified),
+        "Accept-Ranges": "bytes",
+        **(headers or {}),
+    }
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, len(content))
+        except ValueError:
+            response_headers["Content-Range"] = f"bytes */{len(content)}"
+            return Response(status_code=416, headers=response_headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return Response(
+                content=content[start:end + 1],
+                status_code=206,
+                media_type=media_type,
+                headers=response_headers
+            )
+
+    return Response(content=content, media_type=media_type, headers=response_headers)
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """Build a 304 response carrying the validators, Last-Modified only if it is known."""
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
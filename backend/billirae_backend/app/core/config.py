@@ -18,22 +18,83 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
     
+    # Signed download links
+    PUBLIC_API_URL: str = os.getenv("PUBLIC_API_URL", "http://localhost:8000")  # Base URL of links in emails
+    DOWNLOAD_LINK_SECRET: str = os.getenv("DOWNLOAD_LINK_SECRET", "")  # Derived from SECRET_KEY if empty
+    DOWNLOAD_LINK_TTL: float = float(os.getenv("DOWNLOAD_LINK_TTL", str(30 * 24 * 3600)))  # 30 days
+    
     # OpenAI settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    VOICE_CACHE_MAX_ENTRIES: int = int(os.getenv("VOICE_CACHE_MAX_ENTRIES", "1000"))  # In-process transcripts and parses, 0 disables it
+    VOICE_TRANSCRIPT_CACHE_TTL: float = float(os.getenv("VOICE_TRANSCRIPT_CACHE_TTL", str(7 * 24 * 3600)))  # 7 days
+    VOICE_PARSE_CACHE_TTL: float = float(os.getenv("VOICE_PARSE_CACHE_TTL", str(24 * 3600)))  # Parses are keyed by date anyway
+    VOICE_FAST_PARSE_MIN_CONFIDENCE: float = float(os.getenv("VOICE_FAST_PARSE_MIN_CONFIDENCE", "0.8"))  # Local parses below this ask GPT, above 1 always asks GPT
+    VOICE_CACHE_SHARED: bool = os.getenv("VOICE_CACHE_SHARED", "false").lower() in ("1", "true", "yes")  # Second level in MongoDB, shared by workers
+    
+    # PDF rendering settings
+    PDF_RENDER_WORKERS: int = int(os.getenv("PDF_RENDER_WORKERS", "2"))  # 0 renders in a thread
+    PDF_RENDER_TIMEOUT: float = float(os.getenv("PDF_RENDER_TIMEOUT", "30"))
+    PDF_CACHE_MAX_BYTES: int = int(os.getenv("PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PDF_EXPORT_CONCURRENCY: int = int(os.getenv("PDF_EXPORT_CONCURRENCY", "4"))
+    PDF_STATEMENT_MAX_INVOICES: int = int(os.getenv("PDF_STATEMENT_MAX_INVOICES", "500"))  # Invoices merged into one statement PDF
+    PDF_FAST_RENDERER: bool = os.getenv("PDF_FAST_RENDERER", "true").lower() in ("1", "true", "yes")  # Canvas renderer for one-page invoices
+    PDF_PRERENDER_CONCURRENCY: int = int(os.getenv("PDF_PRERENDER_CONCURRENCY", "1"))  # 0 disables pre-rendering
+    PDF_PRERENDER_QUEUE_SIZE: int = int(os.getenv("PDF_PRERENDER_QUEUE_SIZE", "1000"))
+    PDF_STORAGE_BACKEND: str = os.getenv("PDF_STORAGE_BACKEND", "local")  # local, gridfs
+    PDF_STORAGE_DIR: str = os.getenv("PDF_STORAGE_DIR", "storage/pdfs")
+    PDF_LARGE_INVOICE_ITEMS: int = int(os.getenv("PDF_LARGE_INVOICE_ITEMS", "200"))  # Paged item table from this many items on
+    # TrueType fonts for invoices; a missing bold or italic font falls back to the regular one, a missing regular font to Helvetica
+    PDF_FONT_REGULAR: str = os.getenv("PDF_FONT_REGULAR", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    PDF_FONT_BOLD: str = os.getenv("PDF_FONT_BOLD", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+    PDF_FONT_ITALIC: str = os.getenv("PDF_FONT_ITALIC", "")  # fonts-dejavu-core ships no DejaVuSans-Oblique.ttf
+    PDF_FONT_SUBSET_CACHE_SIZE: int = int(os.getenv("PDF_FONT_SUBSET_CACHE_SIZE", "256"))
+    LOGO_CACHE_MAX_BYTES: int = int(os.getenv("LOGO_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    LOGO_STORAGE_DIR: str = os.getenv("LOGO_STORAGE_DIR", "storage/logos")
+    LOGO_MAX_UPLOAD_BYTES: int = int(os.getenv("LOGO_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+    
+    # E-invoice settings
+    EINVOICE_SCHEMA_DIR: str = os.getenv("EINVOICE_SCHEMA_DIR", "")  # CII and UBL XSDs; empty skips validation with a warning
     
     # Email settings
     EMAIL_PROVIDER: str = os.getenv("EMAIL_PROVIDER", "smtp")  # smtp, resend, mailgun
     EMAIL_PROVIDER_API_KEY: str = os.getenv("EMAIL_PROVIDER_API_KEY", "")
     EMAIL_SENDER: str = os.getenv("EMAIL_SENDER", "noreply@billirae.com")
+    EMAIL_PDF_DELIVERY: str = os.getenv("EMAIL_PDF_DELIVERY", "attachment")  # attachment, link
+    EMAIL_HTTP_TIMEOUT: float = float(os.getenv("EMAIL_HTTP_TIMEOUT", "30"))  # Resend and Mailgun API requests
+    EMAIL_HTTP_MAX_CONNECTIONS: int = int(os.getenv("EMAIL_HTTP_MAX_CONNECTIONS", "20"))
+    EMAIL_HTTP_KEEPALIVE: float = float(os.getenv("EMAIL_HTTP_KEEPALIVE", "60"))
+    EMAIL_OUTBOX_WORKERS: int = int(os.getenv("EMAIL_OUTBOX_WORKERS", "2"))  # 0 keeps queued emails in the outbox
+    EMAIL_OUTBOX_POLL_INTERVAL: float = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", "5"))
+    EMAIL_OUTBOX_BATCH_SIZE: int = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "10"))  # Emails a worker claims and sends concurrently
+    EMAIL_BULK_CONCURRENCY: int = int(os.getenv("EMAIL_BULK_CONCURRENCY", "4"))  # PDFs rendered at once for a bulk send
+    EMAIL_OUTBOX_LEASE_SECONDS: float = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))  # A claimed email is sent again after this
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+    EMAIL_RETRY_BASE_DELAY: float = float(os.getenv("EMAIL_RETRY_BASE_DELAY", "30"))  # Doubled after every failed attempt
+    EMAIL_RETRY_MAX_DELAY: float = float(os.getenv("EMAIL_RETRY_MAX_DELAY", "3600"))
+    EMAIL_RATE_LIMITS: str = os.getenv("EMAIL_RATE_LIMITS", "smtp=5,resend=10,mailgun=50")  # Messages per second by provider, per process
+    EMAIL_EVENTS_FLUSH_INTERVAL: float = float(os.getenv("EMAIL_EVENTS_FLUSH_INTERVAL", "5"))  # Delivery events are written to invoices in batches
+    EMAIL_EVENTS_FLUSH_SIZE: int = int(os.getenv("EMAIL_EVENTS_FLUSH_SIZE", "1000"))  # Buffered emails that trigger an early write
+    EMAIL_EVENTS_MAX_BUFFER: int = int(os.getenv("EMAIL_EVENTS_MAX_BUFFER", "20000"))  # Webhooks are refused, and retried by the provider, above this
+    EMAIL_WEBHOOK_TOLERANCE: float = float(os.getenv("EMAIL_WEBHOOK_TOLERANCE", "300"))  # Maximum age of a signed webhook
     
     # SMTP settings (if using SMTP)
     SMTP_SERVER: str = os.getenv("SMTP_SERVER", "smtp.gmail.com")
     SMTP_PORT: int = int(os.getenv("SMTP_PORT", "465"))
     SMTP_USERNAME: str = os.getenv("SMTP_USERNAME", "")
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
+    SMTP_TIMEOUT: float = float(os.getenv("SMTP_TIMEOUT", "30"))
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "4"))  # Concurrent connections per server
+    SMTP_POOL_IDLE_TIMEOUT: float = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "60"))
+    SMTP_POOL_MAX_MESSAGES: int = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "100"))  # Messages per connection before it is renewed
     
     # Mailgun settings (if using Mailgun)
     MAILGUN_DOMAIN: str = os.getenv("MAILGUN_DOMAIN", "")
+    MAILGUN_API_URL: str = os.getenv("MAILGUN_API_URL", "https://api.mailgun.net")  # https://api.eu.mailgun.net for EU domains
+    MAILGUN_WEBHOOK_SIGNING_KEY: str = os.getenv("MAILGUN_WEBHOOK_SIGNING_KEY", "")
+    
+    # Resend settings (if using Resend)
+    RESEND_API_URL: str = os.getenv("RESEND_API_URL", "https://api.resend.com")
+    RESEND_WEBHOOK_SECRET: str = os.getenv("RESEND_WEBHOOK_SECRET", "")  # whsec_... signing secret of the webhook
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,206 @@
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+from pydantic import BaseModel, Field
+import uuid
+
+class OutboxMessage(BaseModel):
+    """Model for an email waiting in the outbox, or already delivered."""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    invoice_id: Optional[str] = None
+    job_id: Optional[str] = None  # Bulk send job the message belongs to
+    provider: str
+    recipient_email: str
+    cc_emails: Optional[List[str]] = None
+    subject: str
+    body_html: str
+    pdf_filename: str
+    pdf_sha256: str  # Blob of the attached PDF in the PDF storage
+    pdf_size: int
+    attach_pdf: bool = True  # False when the body links to the PDF instead
+    status: str = "pending"  # pending, sending, sent, failed
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.now)
+    locked_until: Optional[datetime] = None  # Lease of the worker sending the message
+    worker_id: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+    sent_at: Optional[datetime] = None
+
+    @classmethod
+    async def create_indexes(cls) -> None:
+        """Create the indexes used to claim messages."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        await MongoDB.db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+        await MongoDB.db.email_outbox.create_index([("status", 1), ("locked_until", 1)])
+        await MongoDB.db.email_outbox.create_index([("job_id", 1)], sparse=True)
+
+    @classmethod
+    async def claim(cls, worker_id: str, lease_seconds: float) -> Optional['OutboxMessage']:
+        """
+        Atomically take the next due message for sending.
+
+        Messages whose lease expired, because their worker stopped while
+        sending, are taken again.
+
+        Args:
+            worker_id: ID of the claiming worker
+            lease_seconds: Time the worker has to send the message
+
+        Returns:
+            Claimed message, or None if no message is due
+        """
+        from pymongo import ReturnDocument
+        from billirae_backend.app.db.mongodb import MongoDB
+        now = datetime.now()
+        message_data = await MongoDB.db.email_outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "sending",
+                    "locked_until": now + timedelta(seconds=lease_seconds),
+                    "worker_id": worker_id,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if message_data:
+            return cls(**message_data)
+        return None
+
+    @classmethod
+    async def find_by_job(cls, job_id: str) -> List[Dict[str, Any]]:
+        """Get the delivery state of the messages of a bulk send job."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        cursor = MongoDB.db.email_outbox.find(
+            {"job_id": job_id},
+            {"_id": 0, "id": 1, "invoice_id": 1, "status": 1, "attempts": 1, "last_error": 1, "sent_at": 1}
+        )
+        return [message async for message in cursor]
+
+    @classmethod
+    async def get_invoice_ids(cls, message_ids: List[str]) -> Dict[str, str]:
+        """Map messages to the invoices they were sent for, skipping messages without invoice."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        cursor = MongoDB.db.email_outbox.find(
+            {"id": {"$in": message_ids}, "invoice_id": {"$ne": None}},
+            {"_id": 0, "id": 1, "invoice_id": 1}
+        )
+        return {message["id"]: message["invoice_id"] async for message in cursor}
+
+    @classmethod
+    async def queue_stats(cls) -> Dict[str, Any]:
+        """Count the messages by status and find the oldest undelivered one."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        counts = {"pending": 0, "sending": 0, "failed": 0}
+        oldest = None
+        cursor = MongoDB.db.email_outbox.aggregate([
+            {"$match": {"status": {"$in": list(counts)}}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}, "oldest": {"$min": "$created_at"}}},
+        ])
+        async for group in cursor:
+            counts[group["_id"]] = group["count"]
+            if group["_id"] != "failed":
+                oldest = group["oldest"] if oldest is None else min(oldest, group["oldest"])
+        return {**counts, "oldest_created_at": oldest}
+
+    async def save(self) -> 'OutboxMessage':
+        """Save message to database."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        self.updated_at = datetime.now()
+        await MongoDB.db.email_outbox.update_one(
+            {"id": self.id},
+            {"$set": self.dict()},
+            upsert=True
+        )
+        return self
+
+    async def mark_sent(self) -> None:
+        """Record the delivery of a claimed message."""
+        self.status = "sent"
+        self.sent_at = datetime.now()
+        self.locked_until = None
+        self.last_error = None
+        await self._update_claimed()
+
+    async def mark_retry(self, error: str, delay_seconds: float) -> None:
+        """Return a claimed message to the queue, to be sent again after a delay."""
+        self.status = "pending"
+        self.next_attempt_at = datetime.now() + timedelta(seconds=delay_seconds)
+        self.locked_until = None
+        self.last_error = error
+        await self._update_claimed()
+
+    async def mark_failed(self, error: str) -> None:
+        """Give up on a claimed message."""
+        self.status = "failed"
+        self.locked_until = None
+        self.last_error = error
+        await self._update_claimed()
+
+    async def renew_lease(self, lease_seconds: float) -> bool:
+        """
+        Extend the lease of a claimed message.
+
+        Returns:
+            False if the lease expired and another worker took the message over
+        """
+        from billirae_backend.app.db.mongodb import MongoDB
+        now = datetime.now()
+        locked_until = now + timedelta(seconds=lease_seconds)
+        result = await MongoDB.db.email_outbox.update_one(
+            {"id": self.id, "status": "sending", "worker_id": self.worker_id, "attempts": self.attempts},
+            {"$set": {"locked_until": locked_until, "updated_at": now}}
+        )
+        if not result.matched_count:
+            return False
+        self.locked_until = locked_until
+        return True
+
+    async def _update_claimed(self) -> None:
+        """Save the message unless another worker took it over after the lease expired."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        self.updated_at = datetime.now()
+        fields = ("status", "next_attempt_at", "locked_until", "last_error", "sent_at", "updated_at")
+        await MongoDB.db.email_outbox.update_one(
+            {"id": self.id, "worker_id": self.worker_id, "attempts": self.attempts},
+            {"$set": {field: getattr(self, field) for field in fields}}
+        )
+
+class EmailJob(BaseModel):
+    """Model for a bulk send of invoice emails."""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    invoice_ids: List[str]
+    status: str = "preparing"  # preparing, queued
+    failures: Dict[str, str] = {}  # Invoice ID -> why its email was not queued
+    queued: int = 0
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+    @classmethod
+    async def get_by_id(cls, job_id: str) -> Optional['EmailJob']:
+        """Get job by ID."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        job_data = await MongoDB.db.email_jobs.find_one({"id": job_id})
+        if job_data:
+            return cls(**job_data)
+        return None
+
+    async def save(self) -> 'EmailJob':
+        """Save job to database."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        self.updated_at = datetime.now()
+        await MongoDB.db.email_jobs.update_one(
+            {"id": self.id},
+            {"$set": self.dict()},
+            upsert=True
+        )
+        return self
@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -9,6 +9,28 @@ class InvoiceItem(BaseModel):
     unit_price: float
     tax_rate: float = 0.19  # Default German VAT rate
 
+# Email delivery states reported by the provider; a later event never downgrades the state
+EMAIL_STATUS_RANK = {"delivered": 1, "bounced": 2, "complained": 3}
+EMAIL_DELIVERY_TIMESTAMPS = ("delivered_at", "bounced_at", "complained_at", "last_opened_at")
+
+def merge_email_delivery(state: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fold the delivery state of an email into another one, in place.
+
+    States hold the email status, the time of the latest event of each kind,
+    the number of opens and the reason of the latest bounce.
+    """
+    if EMAIL_STATUS_RANK.get(other.get("status"), 0) > EMAIL_STATUS_RANK.get(state.get("status"), 0):
+        state["status"] = other["status"]
+    if other.get("bounced_at") and (not state.get("bounced_at") or other["bounced_at"] >= state["bounced_at"]):
+        state["bounce_reason"] = other.get("bounce_reason")
+    for field in EMAIL_DELIVERY_TIMESTAMPS:
+        if other.get(field) and (not state.get(field) or other[field] > state[field]):
+            state[field] = other[field]
+    if other.get("opens"):
+        state["opens"] = state.get("opens", 0) + other["opens"]
+    return state
+
 class InvoiceInDB(BaseModel):
     """Model for an invoice stored in the database."""
     id: Optional[str] = None
@@ -27,6 +49,13 @@ class InvoiceInDB(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.now)
     sent_date: Optional[datetime] = None
     paid_date: Optional[datetime] = None
+    email_status: Optional[str] = None  # delivered, bounced, complained, as reported by the email provider
+    email_delivered_at: Optional[datetime] = None
+    email_bounced_at: Optional[datetime] = None
+    email_bounce_reason: Optional[str] = None
+    email_complained_at: Optional[datetime] = None
+    email_last_opened_at: Optional[datetime] = None
+    email_open_count: int = 0
 
     @classmethod
     async def get_by_id(cls, invoice_id: str) -> Optional['InvoiceInDB']:
@@ -51,8 +80,71 @@ class InvoiceInDB(BaseModel):
             total=285.6
         )
 
+    @classmethod
+    async def find(cls, query: Dict[str, Any]) -> List['InvoiceInDB']:
+        """Find all invoices matching a query."""
+        return [invoice async for invoice in cls.iter_find(query)]
+
+    @classmethod
+    async def count(cls, query: Dict[str, Any]) -> int:
+        """Count the invoices matching a query."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        return await MongoDB.db.invoices.count_documents(query)
+
+    @classmethod
+    async def iter_find(cls, query: Dict[str, Any]) -> AsyncIterator['InvoiceInDB']:
+        """Iterate over invoices matching a query, ordered by invoice date, without loading them all."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        cursor = MongoDB.db.invoices.find(query).sort("invoice_date", 1)
+        async for invoice_data in cursor:
+            yield cls(**invoice_data)
+
+    @classmethod
+    async def update_email_delivery(cls, updates: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Write the email delivery state of many invoices in one bulk write.
+
+        Timestamps only move forward and opens are added up, so states can
+        be written in any order and more than once per email.
+
+        Args:
+            updates: Invoice ID -> delivery state, see `merge_email_delivery`
+
+        Returns:
+            Number of invoices written
+        """
+        from pymongo import UpdateOne
+        from billirae_backend.app.db.mongodb import MongoDB
+        operations = []
+        now = datetime.now()
+        for invoice_id, state in updates.items():
+            update = {"$set": {"updated_at": now}}
+            timestamps = {f"email_{field}": state[field] for field in EMAIL_DELIVERY_TIMESTAMPS if state.get(field)}
+            if timestamps:
+                update["$max"] = timestamps
+            if state.get("opens"):
+                update["$inc"] = {"email_open_count": state["opens"]}
+            if state.get("bounced_at"):
+                update["$set"]["email_bounce_reason"] = state.get("bounce_reason")
+            operations.append(UpdateOne({"id": invoice_id}, update))
+
+            status = state.get("status")
+            if status in EMAIL_STATUS_RANK:
+                higher = [other for other, rank in EMAIL_STATUS_RANK.items() if rank > EMAIL_STATUS_RANK[status]]
+                operations.append(UpdateOne(
+                    {"id": invoice_id, "email_status": {"$nin": [status] + higher}},
+                    {"$set": {"email_status": status}}
+                ))
+        if operations:
+            await MongoDB.db.invoices.bulk_write(operations, ordered=False)
+        return len(updates)
+
     async def save(self) -> 'InvoiceInDB':
-        """Save invoice to database."""
+        """Save invoice to database and queue a re-render of final invoices."""
+        from billirae_backend.app.services.pdf_cache import pdf_cache
+        from billirae_backend.app.services.prerender_service import prerender_queue
         self.updated_at = datetime.now()
         # This would normally save to the database
+        pdf_cache.invalidate(invoice_id=self.id)
+        prerender_queue.invoice_changed(self)
         return self
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, PrivateAttr
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
@@ -52,8 +52,14 @@ class UserInDB(UserBase):
     """Model for user in database."""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     hashed_password: str
+    letterhead: Optional[Dict[str, Any]] = None  # Compiled invoice letterhead, see services.letterhead
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+    # Letterhead fingerprint as last loaded or saved, to notice letterhead changes
+    _saved_letterhead_fingerprint: Optional[str] = PrivateAttr(default=None)
+    
+    def model_post_init(self, __context: Any) -> None:
+        self._saved_letterhead_fingerprint = (self.letterhead or {}).get("fingerprint")
     
     @classmethod
     async def get_by_id(cls, user_id: str):
@@ -74,8 +80,10 @@ class UserInDB(UserBase):
         return None
     
     async def save(self):
-        """Save user to database."""
+        """Save user to database, re-rendering open invoices if the letterhead changed."""
         from billirae_backend.app.db.mongodb import MongoDB
+        from billirae_backend.app.services.pdf_cache import pdf_cache
+        from billirae_backend.app.services.prerender_service import prerender_queue
         self.updated_at = datetime.now()
         user_data = self.dict()
         await MongoDB.db.users.update_one(
@@ -83,6 +91,12 @@ class UserInDB(UserBase):
             {"$set": user_data},
             upsert=True
         )
+        pdf_cache.invalidate(user_id=self.id)
+        
+        fingerprint = (self.letterhead or {}).get("fingerprint")
+        if fingerprint != self._saved_letterhead_fingerprint:
+            self._saved_letterhead_fingerprint = fingerprint
+            prerender_queue.letterhead_changed(self)
         return self
     
     async def delete(self):
@@ -1,6 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from billirae_backend.app.services.render_executor import render_executor
+from billirae_backend.app.services.pdf_cache import pdf_cache
+from billirae_backend.app.services.pdf_storage import pdf_storage
+from billirae_backend.app.services.prerender_service import prerender_queue
+from billirae_backend.app.services.smtp_pool import smtp_pool
+from billirae_backend.app.services.http_client import http_client
+from billirae_backend.app.services.email_outbox import email_outbox
+from billirae_backend.app.services.bulk_send_service import bulk_send_service
+from billirae_backend.app.services.delivery_events import delivery_events
+from billirae_backend.app.services.voice_cache import voice_cache
+
 app = FastAPI(title="Billirae API")
 
 # Configure CORS
@@ -12,6 +23,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    """Start background resources."""
+    await render_executor.start()
+    prerender_queue.start()
+    await http_client.start()
+    await email_outbox.start()
+    delivery_events.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release background resources."""
+    await bulk_send_service.shutdown()
+    await email_outbox.shutdown()
+    await delivery_events.shutdown()
+    await prerender_queue.shutdown()
+    await render_executor.shutdown()
+    await smtp_pool.close()
+    await http_client.close()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Billirae API"}
+
+@app.get("/health")
+async def health():
+    """Health check with PDF rendering, pre-rendering, email, delivery event and voice cache metrics."""
+    return {
+        "status": "ok",
+        "pdf_render": render_executor.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "pdf_storage": pdf_storage.stats(),
+        "pdf_prerender": prerender_queue.stats(),
+        "email_smtp": smtp_pool.stats(),
+        "email_http": http_client.stats(),
+        "email_outbox": await email_outbox.stats(),
+        "email_events": delivery_events.stats(),
+        "voice_cache": voice_cache.stats()
+    }
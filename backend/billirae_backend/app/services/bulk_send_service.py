@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+from billirae_backend.app.db.models.email_outbox import EmailJob, OutboxMessage
+from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.db.models.client import ClientInDB
+from billirae_backend.app.services.pdf_service import PDFService
+from billirae_backend.app.services.email_service import build_invoice_email
+from billirae_backend.app.services.email_outbox import EmailOutbox, email_outbox
+from billirae_backend.app.services.download_links import download_links
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class BulkSendService:
+    """
+    Service for sending the emails of many invoices in one job.
+
+    A job renders and stores the PDFs of its invoices concurrently and
+    queues one email per invoice in the outbox as soon as its PDF is
+    ready, so delivery starts while later invoices are still rendering.
+    The outbox workers send the queued emails in batches. Progress is read
+    back per invoice from the job and its outbox messages.
+    """
+
+    def __init__(
+        self,
+        pdf_service: Optional[PDFService] = None,
+        outbox: Optional[EmailOutbox] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.pdf_service = pdf_service or PDFService()
+        self.outbox = outbox or email_outbox
+        self.concurrency = max(1, settings.EMAIL_BULK_CONCURRENCY if concurrency is None else concurrency)
+        self._tasks = set()
+
+    async def start_job(
+        self,
+        user: UserInDB,
+        invoice_ids: List[str],
+        subject: Optional[str] = None,
+        message: Optional[str] = None,
+        pdf_delivery: Optional[str] = None
+    ) -> EmailJob:
+        """
+        Start sending the emails of a list of invoices.
+
+        Each invoice is emailed to the address of its client.
+
+        Args:
+            user: User data (sender)
+            invoice_ids: IDs of the invoices to send, duplicates are sent once
+            subject: Subject overriding the default one of each invoice
+            message: Optional HTML message added to every email
+            pdf_delivery: "attachment" or "link", EMAIL_PDF_DELIVERY by default
+
+        Returns:
+            Job whose progress can be followed with `get_progress`
+        """
+        job = EmailJob(user_id=user.id, invoice_ids=list(dict.fromkeys(invoice_ids)))
+        await job.save()
+
+        attach_pdf = (pdf_delivery or settings.EMAIL_PDF_DELIVERY) != "link"
+        task = asyncio.create_task(self._prepare(job, user, subject, message, attach_pdf))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Started bulk send {job.id} of {len(job.invoice_ids)} invoices")
+        return job
+
+    async def get_progress(self, job: EmailJob) -> Dict[str, Any]:
+        """
+        Get the state of every invoice of a job.
+
+        Invoices are "preparing" until their email is queued, then follow the
+        outbox states pending, sending and sent; "failed" invoices carry the
+        reason.
+
+        Args:
+            job: Bulk send job
+
+        Returns:
+            Counts by state and the state of each invoice, in job order
+        """
+        messages = {message["invoice_id"]: message for message in await OutboxMessage.find_by_job(job.id)}
+        counts = {"preparing": 0, "pending": 0, "sending": 0, "sent": 0, "failed": 0}
+        invoices = []
+        for invoice_id in job.invoice_ids:
+            message = messages.get(invoice_id)
+            if message is not None:
+                entry = {
+                    "invoice_id": invoice_id,
+                    "status": message["status"],
+                    "attempts": message["attempts"],
+                    "error": message.get("last_error") if message["status"] != "sent" else None,
+                    "sent_at": message.get("sent_at"),
+                }
+            elif invoice_id in job.failures:
+                entry = {"invoice_id": invoice_id, "status": "failed", "attempts": 0, "error": job.failures[invoice_id]}
+            else:
+                entry = {"invoice_id": invoice_id, "status": "preparing", "attempts": 0, "error": None}
+            counts[entry["status"]] += 1
+            invoices.append(entry)
+
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "total": len(job.invoice_ids),
+            "done": counts["preparing"] + counts["pending"] + counts["sending"] == 0,
+            "counts": counts,
+            "invoices": invoices,
+            "created_at": job.created_at,
+        }
+
+    async def shutdown(self) -> None:
+        """Stop jobs that are still preparing emails."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _prepare(
+        self,
+        job: EmailJob,
+        user: UserInDB,
+        subject: Optional[str],
+        message: Optional[str],
+        attach_pdf: bool
+    ) -> None:
+        clients: Dict[str, ClientInDB] = {}
+        invoice_ids = iter(job.invoice_ids)
+
+        async def work() -> None:
+            for invoice_id in invoice_ids:
+                try:
+                    await self._queue_invoice(job, user, invoice_id, clients, subject, message, attach_pdf)
+                    job.queued += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Bulk send {job.id} skips invoice {invoice_id}: {str(e)}")
+                    job.failures[invoice_id] = str(e)
+
+        try:
+            await asyncio.gather(*[work() for _ in range(min(self.concurrency, len(job.invoice_ids)))])
+            job.status = "queued"
+            logger.info(f"Bulk send {job.id} queued {job.queued} emails, {len(job.failures)} invoices failed")
+        finally:
+            try:
+                await job.save()
+            except Exception as e:
+                logger.error(f"Could not save bulk send {job.id}: {str(e)}")
+
+    async def _queue_invoice(
+        self,
+        job: EmailJob,
+        user: UserInDB,
+        invoice_id: str,
+        clients: Dict[str, ClientInDB],
+        subject: Optional[str],
+        message: Optional[str],
+        attach_pdf: bool
+    ) -> None:
+        invoice = await InvoiceInDB.get_by_id(invoice_id)
+        if not invoice:
+            raise ValueError("Invoice not found")
+        if invoice.user_id != str(user.id):
+            raise ValueError("Not authorized to access this invoice")
+
+        client = clients.get(invoice.client_id)
+        if client is None:
+            client = await ClientInDB.get_by_id(invoice.client_id)
+            if not client:
+                raise ValueError("Client not found")
+            clients[invoice.client_id] = client
+        if not client.email:
+            raise ValueError("Client has no email address")
+
+        stored = await self.pdf_service.get_stored_invoice_pdf(invoice, user, client)
+        pdf_filename = f"Rechnung_{invoice.invoice_number}.pdf"
+        download_url = None if attach_pdf else download_links.create_url(stored.sha256, pdf_filename)
+        email_subject, body_html = build_invoice_email(invoice, user, client, subject, message, download_url)
+        await self.outbox.enqueue(
+            user_id=user.id,
+            invoice_id=invoice.id,
+            job_id=job.id,
+            recipient_email=client.email,
+            subject=email_subject,
+            body_html=body_html,
+            pdf=stored,
+            pdf_filename=pdf_filename,
+            attach_pdf=attach_pdf
+        )
+
+bulk_send_service = BulkSendService()
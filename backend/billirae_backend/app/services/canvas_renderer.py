@@ -0,0 +1,371 @@
+import io
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+from xml.sax.saxutils import escape, unescape
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from billirae_backend.app.services.logo_cache import logo_cache
+from billirae_backend.app.services.pdf_service import (
+    Watermark,
+    LogoFlowable,
+    QRCodeFlowable,
+    PageNumberFooter,
+    FONTS,
+    ITEMS_HEADER,
+    QR_HINT_TEXT,
+    build_epc_qr_data,
+    format_item_row,
+    format_totals_rows,
+    format_details_rows,
+    format_recipient_markup,
+)
+
+logger = logging.getLogger(__name__)
+
+# Page geometry of the platypus layout: SimpleDocTemplate with 72 pt margins
+# and a frame with 6 pt padding. Y coordinates below are measured from the
+# top of the page and only flipped when drawing.
+PAGE_WIDTH, PAGE_HEIGHT = A4
+DOC_WIDTH = PAGE_WIDTH - 2 * 72
+FRAME_X = 72 + 6
+FRAME_WIDTH = DOC_WIDTH - 2 * 6
+FRAME_TOP = 72 + 6
+FRAME_BOTTOM = PAGE_HEIGHT - 72 - 6
+
+# Table cell geometry, matching the TableStyles of pdf_service
+CELL_PADDING = 6
+ROW_LEADING = 12
+SENDER_PADDING = 6
+DETAILS_PADDING = 3
+ITEMS_PADDING = 3
+ITEMS_HEADER_BOTTOM_PADDING = 12
+QR_PADDING = 10
+QR_SIZE = 40 * mm
+
+ITEMS_COLUMNS = (0.4, 0.1, 0.15, 0.15, 0.2)
+
+@lru_cache(maxsize=8192)
+def _text_width(text: str, font_name: str, font_size: float) -> float:
+    return stringWidth(text, font_name, font_size)
+
+@lru_cache(maxsize=1024)
+def _wrap_lines(segments: Tuple[str, ...], font_name: str, font_size: float, max_width: float) -> Tuple[Tuple[str, float], ...]:
+    """
+    Break text into lines the way Paragraph does for plain text.
+
+    Every segment starts a new line (<br/>), and within a segment words are
+    filled greedily. Letterhead texts repeat across renders, so their line
+    breaks are computed once per process.
+
+    Returns:
+        Tuple of (line text, line width)
+    """
+    space_width = _text_width(" ", font_name, font_size)
+    lines = []
+    for segment in segments:
+        words = segment.split()
+        line: List[str] = []
+        line_width = 0.0
+        for word in words:
+            word_width = _text_width(word, font_name, font_size)
+            if word_width > max_width:
+                # Paragraph splits long words, leave those to platypus
+                raise _DoesNotFit()
+            if line and line_width + space_width + word_width > max_width:
+                lines.append((" ".join(line), line_width))
+                line, line_width = [], 0.0
+            line_width += word_width + (space_width if line else 0.0)
+            line.append(word)
+        lines.append((" ".join(line), line_width))
+    return tuple(lines)
+
+def _segments(markup: str) -> Tuple[str, ...]:
+    """
+    Split paragraph markup into lines of plain text, for markup that only uses <br/>.
+
+    Entities like "&amp;" are resolved as Paragraph does; any other tag
+    leaves the paragraph to platypus.
+    """
+    segments = tuple(str(markup).split("<br/>"))
+    for segment in segments:
+        if "<" in segment or ">" in segment:
+            raise _DoesNotFit()
+    if not any(segment.split() for segment in segments):
+        raise _DoesNotFit()
+    return tuple(unescape(segment) for segment in segments)
+
+class _DoesNotFit(Exception):
+    """Raised during layout when an invoice needs the platypus renderer."""
+
+class CanvasInvoiceRenderer:
+    """
+    Renderer for standard invoices that fit on one page.
+
+    Draws the same layout as `PDFService.render_invoice_pdf` straight onto a
+    canvas at fixed coordinates, without Paragraph markup parsing, Table
+    layout or frame flow. Invoices it cannot lay out exactly like platypus,
+    such as multi-page invoices or texts with markup, are left to platypus.
+    """
+
+    def __init__(self, styles):
+        self.styles = styles
+        self._renders = 0
+        self._fallbacks = 0
+
+    def render(self, payload: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Render a render payload if it fits on one page.
+
+        Args:
+            payload: Render payload from `PDFService.build_render_payload`
+
+        Returns:
+            PDF file as bytes, or None if the invoice needs the platypus renderer
+        """
+        try:
+            operations = self.layout(payload)
+        except _DoesNotFit:
+            self._fallbacks += 1
+            return None
+        self._renders += 1
+
+        invoice = payload["invoice"]
+        buffer = io.BytesIO()
+        canvas = Canvas(buffer, pagesize=A4, invariant=1)
+        canvas.setTitle(f"Rechnung {invoice['invoice_number']}")
+        canvas.setAuthor(payload["letterhead"]["sender_name"])
+        canvas.setSubject(f"Rechnung für {payload['client']['name']}")
+        self._draw(canvas, operations)
+        canvas.showPage()
+        canvas.save()
+        return buffer.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many invoices were drawn on the canvas and how many were left to platypus."""
+        return {"renders": self._renders, "fallbacks": self._fallbacks}
+
+    def layout(self, payload: Dict[str, Any]) -> List[tuple]:
+        """
+        Compute the drawing operations of an invoice.
+
+        Raises:
+            _DoesNotFit: If the invoice does not fit on one page or uses
+                something only platypus lays out
+        """
+        invoice = payload["invoice"]
+        letterhead = payload["letterhead"]
+        client = payload["client"]
+        if not invoice["items"]:
+            raise _DoesNotFit()
+
+        operations: List[tuple] = []
+        y = FRAME_TOP
+
+        if invoice["is_draft"]:
+            y += 100
+            operations.append(("flowable", Watermark("ENTWURF"), FRAME_X, y))
+
+        if letterhead["logo_path"]:
+            logo = logo_cache.get(letterhead["logo_path"])
+            if logo is not None:
+                y += 70
+                operations.append(("flowable", LogoFlowable(logo, width=150, height=70), FRAME_X + (FRAME_WIDTH - 150) / 2, y))
+                y += 12
+
+        y = self._paragraph(operations, escape(f"Rechnung Nr. {invoice['invoice_number']}"), 'InvoiceTitle', FRAME_X, y, FRAME_WIDTH)
+        y += 12
+
+        # Sender and recipient
+        column_width = DOC_WIDTH / 2.0
+        for left, right, style_name in (
+            ("Absender:", "Empfänger:", 'InvoiceSubtitle'),
+            (letterhead["sender_markup"], format_recipient_markup(client), 'InvoiceInfo'),
+        ):
+            top = y + SENDER_PADDING
+            bottom = max(
+                self._paragraph(operations, left, style_name, 72 + CELL_PADDING, top, column_width - 2 * CELL_PADDING, cell=True),
+                self._paragraph(operations, right, style_name, 72 + column_width + CELL_PADDING, top, column_width - 2 * CELL_PADDING, cell=True),
+            )
+            y = bottom + SENDER_PADDING
+        y += 24
+
+        # Invoice details
+        for label, value in format_details_rows(invoice, letterhead):
+            baseline = y + DETAILS_PADDING + 10
+            operations.append(("text", FONTS.regular, 10, 72 + CELL_PADDING, baseline, self._cell(label)))
+            operations.append(("text", FONTS.regular, 10, 72 + DOC_WIDTH / 4.0 + CELL_PADDING, baseline, self._cell(value)))
+            y += DETAILS_PADDING + ROW_LEADING + DETAILS_PADDING
+        y += 24
+
+        y = self._items_table(operations, invoice, y)
+        y += 24
+
+        if letterhead["payment_rows"]:
+            rows = [("Zahlungsinformationen:", 'InvoiceSubtitle')] + [(row, 'InvoiceInfo') for row in letterhead["payment_rows"]]
+            for text, style_name in rows:
+                y = self._paragraph(operations, text, style_name, 72 + CELL_PADDING, y + DETAILS_PADDING, DOC_WIDTH - 2 * CELL_PADDING, cell=True)
+                y += DETAILS_PADDING
+            y += 12
+
+            # QR code next to its hint, both centered vertically in the row
+            table_width = DOC_WIDTH - 10
+            table_x = FRAME_X + (FRAME_WIDTH - table_width) / 2
+            hint_width = table_width - QR_SIZE - 2 * CELL_PADDING
+            hint_style = self.styles['InvoiceInfo']
+            hint_lines = _wrap_lines(_segments(QR_HINT_TEXT), hint_style.fontName, hint_style.fontSize, hint_width)
+            hint_height = len(hint_lines) * hint_style.leading
+            inner_height = max(QR_SIZE, hint_height)
+
+            qr_top = y + QR_PADDING + (inner_height - QR_SIZE) / 2
+            operations.append(("flowable", QRCodeFlowable(build_epc_qr_data(letterhead, invoice)), table_x + CELL_PADDING, qr_top + QR_SIZE))
+            hint_top = y + QR_PADDING + (inner_height - hint_height) / 2
+            self._paragraph(operations, QR_HINT_TEXT, 'InvoiceInfo', table_x + QR_SIZE + CELL_PADDING, hint_top, hint_width, cell=True)
+            y += inner_height + 2 * QR_PADDING
+            y += 24
+
+        if invoice["notes"]:
+            y = self._paragraph(operations, "Anmerkungen:", 'InvoiceSubtitle', FRAME_X, y, FRAME_WIDTH)
+            y = self._paragraph(operations, escape(invoice["notes"]), 'InvoiceInfo', FRAME_X, y, FRAME_WIDTH)
+            y += 24
+
+        y = self._paragraph(operations, letterhead["legal_text"], 'Footer', FRAME_X, y, FRAME_WIDTH)
+
+        y += 20
+        operations.append(("flowable", PageNumberFooter(), FRAME_X, y))
+
+        if y > FRAME_BOTTOM:
+            raise _DoesNotFit()
+        return operations
+
+    def _items_table(self, operations: List[tuple], invoice: Dict[str, Any], y: float) -> float:
+        """Lay out the item table, drawn like ITEMS_TABLE_STYLE, and return its bottom."""
+        widths = [DOC_WIDTH * share for share in ITEMS_COLUMNS]
+        lefts = [72 + sum(widths[:index]) for index in range(len(widths))]
+        right = 72 + DOC_WIDTH
+        top = y
+
+        header_height = ITEMS_PADDING + ROW_LEADING + ITEMS_HEADER_BOTTOM_PADDING
+        operations.append(("rect", 72, y, DOC_WIDTH, header_height, colors.lightgrey))
+        for index, text in enumerate(ITEMS_HEADER):
+            text_width = _text_width(text, FONTS.bold, 10)
+            operations.append(("text", FONTS.bold, 10, lefts[index] + (widths[index] - text_width) / 2, y + ITEMS_PADDING + 10, text))
+        y += header_height
+        header_bottom = y
+
+        row_height = ITEMS_PADDING + ROW_LEADING + ITEMS_PADDING
+        body = []
+        for item in invoice["items"]:
+            if y + row_height * 4 > FRAME_BOTTOM:
+                # Not even the totals fit below this row any more
+                raise _DoesNotFit()
+            body.append((y, format_item_row(item)))
+            y += row_height
+        operations.append(("rect", 72, header_bottom, DOC_WIDTH, y - header_bottom, colors.white))
+
+        for row_top, row in body:
+            baseline = row_top + ITEMS_PADDING + 10
+            operations.append(("text", FONTS.regular, 10, lefts[0] + CELL_PADDING, baseline, self._cell(row[0])))
+            for index in range(1, len(row)):
+                text = self._cell(row[index])
+                operations.append(("text", FONTS.regular, 10, lefts[index] + widths[index] - CELL_PADDING - _text_width(text, FONTS.regular, 10), baseline, text))
+
+        totals_top = y
+        for label, amount in format_totals_rows(invoice):
+            baseline = y + ITEMS_PADDING + 10
+            for index, text in ((3, label), (4, amount)):
+                operations.append(("text", FONTS.bold, 10, lefts[index] + widths[index] - CELL_PADDING - _text_width(text, FONTS.bold, 10), baseline, text))
+            y += row_height
+
+        operations.append(("line", 72, right, header_bottom, 1, colors.black))
+        operations.append(("line", 72, right, totals_top, 1, colors.black))
+        operations.append(("line", 72, right, y, 1, colors.black))
+        if top >= y:
+            raise _DoesNotFit()
+        return y
+
+    def _paragraph(
+        self,
+        operations: List[tuple],
+        markup: str,
+        style_name: str,
+        x: float,
+        y: float,
+        width: float,
+        cell: bool = False
+    ) -> float:
+        """
+        Lay out a plain-text paragraph and return its bottom.
+
+        Outside of table cells the style's spaceAfter is added, like the
+        frame does for flowables.
+        """
+        style: ParagraphStyle = self.styles[style_name]
+        lines = _wrap_lines(_segments(markup), style.fontName, style.fontSize, width)
+        baseline = y + style.fontSize
+        for text, text_width in lines:
+            if text:
+                line_x = x + (width - text_width) / 2 if style.alignment == TA_CENTER else x
+                operations.append(("text", style.fontName, style.fontSize, line_x, baseline, text))
+            baseline += style.leading
+        y += len(lines) * style.leading
+        if not cell:
+            y += style.spaceAfter
+        return y
+
+    def _cell(self, value: Any) -> str:
+        """Return the text of a table cell, which must be a single line."""
+        text = str(value)
+        if "\n" in text:
+            raise _DoesNotFit()
+        return text
+
+    def _draw(self, canvas: Canvas, operations: List[tuple]) -> None:
+        """Execute layout operations, flipping y to canvas coordinates."""
+        canvas.setFillColor(colors.black)
+        # Consecutive strings share one text object instead of one each
+        text_object = None
+        font = None
+        for operation in operations:
+            kind = operation[0]
+            if kind == "text":
+                _, font_name, font_size, x, y, text = operation
+                if text_object is None:
+                    text_object = canvas.beginText()
+                    font = None
+                if font != (font_name, font_size):
+                    font = (font_name, font_size)
+                    text_object.setFont(font_name, font_size)
+                text_object.setTextOrigin(x, PAGE_HEIGHT - y)
+                text_object.textOut(text)
+                continue
+            
+            if text_object is not None:
+                canvas.drawText(text_object)
+                text_object = None
+            
+            if kind == "rect":
+                _, x, y, width, height, color = operation
+                canvas.saveState()
+                canvas.setFillColor(color)
+                canvas.rect(x, PAGE_HEIGHT - y - height, width, height, stroke=0, fill=1)
+                canvas.restoreState()
+            elif kind == "line":
+                _, x1, x2, y, line_width, color = operation
+                canvas.saveState()
+                canvas.setLineWidth(line_width)
+                canvas.setStrokeColor(color)
+                canvas.line(x1, PAGE_HEIGHT - y, x2, PAGE_HEIGHT - y)
+                canvas.restoreState()
+            elif kind == "flowable":
+                _, flowable, x, bottom = operation
+                flowable.wrapOn(canvas, FRAME_WIDTH, FRAME_BOTTOM - FRAME_TOP)
+                flowable.drawOn(canvas, x, PAGE_HEIGHT - bottom)
+        
+        if text_object is not None:
+            canvas.drawText(text_object)
@@ -0,0 +1,160 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from billirae_backend.app.db.models.email_outbox import OutboxMessage
+from billirae_backend.app.db.models.invoice import InvoiceInDB, merge_email_delivery
+from billirae_backend.app.services.email_webhooks import DeliveryEvent
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class DeliveryEventBuffer:
+    """
+    In-memory buffer of email delivery events, written to invoices in bulk.
+
+    Webhooks only add their event to the buffer, where the events of an
+    email are folded into its delivery state, so a burst of events costs
+    memory per email rather than per event. Every
+    EMAIL_EVENTS_FLUSH_INTERVAL seconds, or as soon as
+    EMAIL_EVENTS_FLUSH_SIZE emails are buffered, the buffered state is
+    mapped to invoices with one outbox query and written with one bulk
+    write. States that could not be written stay buffered for the next
+    flush; above EMAIL_EVENTS_MAX_BUFFER emails new events are refused so
+    the provider retries them later.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        flush_size: Optional[int] = None,
+        max_buffer: Optional[int] = None,
+        seen_size: int = 10000
+    ):
+        self.flush_interval = settings.EMAIL_EVENTS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.flush_size = settings.EMAIL_EVENTS_FLUSH_SIZE if flush_size is None else flush_size
+        self.max_buffer = settings.EMAIL_EVENTS_MAX_BUFFER if max_buffer is None else max_buffer
+        # Outbox message ID -> delivery state, see merge_email_delivery
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Recently buffered event IDs, to drop webhooks the provider retried
+        self._seen: OrderedDict = OrderedDict()
+        self._seen_size = seen_size
+        self._task: Optional[asyncio.Task] = None
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._lock = asyncio.Lock()
+        self._received = 0
+        self._duplicates = 0
+        self._refused = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._invoices_updated = 0
+        self._unmatched = 0
+        self._last_flush_ms = 0.0
+
+    def start(self) -> None:
+        """Start flushing periodically."""
+        if self._task is not None:
+            return
+        self._flush_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """Stop the periodic flush and write the events still buffered."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def add(self, event: DeliveryEvent) -> bool:
+        """
+        Buffer a delivery event.
+
+        Args:
+            event: Event parsed from a provider webhook
+
+        Returns:
+            False if the buffer is full and the webhook should be retried later
+        """
+        if event.id and event.id in self._seen:
+            self._duplicates += 1
+            return True
+        if event.outbox_id not in self._pending and len(self._pending) >= self.max_buffer:
+            self._refused += 1
+            return False
+
+        self.start()
+        state = {"status": "delivered"}
+        if event.event == "delivered":
+            state["delivered_at"] = event.timestamp
+        elif event.event == "opened":
+            state["last_opened_at"] = event.timestamp
+            state["opens"] = 1
+        elif event.event == "bounced":
+            state.update(status="bounced", bounced_at=event.timestamp, bounce_reason=event.reason)
+        elif event.event == "complained":
+            state.update(status="complained", complained_at=event.timestamp)
+        merge_email_delivery(self._pending.setdefault(event.outbox_id, {}), state)
+
+        if event.id:
+            self._seen[event.id] = None
+            if len(self._seen) > self._seen_size:
+                self._seen.popitem(last=False)
+        self._received += 1
+        if len(self._pending) >= self.flush_size:
+            self._flush_requested.set()
+        return True
+
+    async def flush(self) -> None:
+        """Write the buffered delivery state to the invoices."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        async with self._lock:
+            if not self._pending or MongoDB.db is None:
+                return
+            pending, self._pending = self._pending, {}
+            start = time.perf_counter()
+            try:
+                invoice_ids = await OutboxMessage.get_invoice_ids(list(pending))
+                updates: Dict[str, Dict[str, Any]] = {}
+                for outbox_id, state in pending.items():
+                    invoice_id = invoice_ids.get(outbox_id)
+                    if invoice_id is None:
+                        self._unmatched += 1
+                        continue
+                    merge_email_delivery(updates.setdefault(invoice_id, {}), state)
+                if updates:
+                    self._invoices_updated += await InvoiceInDB.update_email_delivery(updates)
+                self._flushes += 1
+            except Exception as e:
+                self._flush_errors += 1
+                logger.warning(f"Could not write {len(pending)} email delivery states, keeping them buffered: {str(e)}")
+                for outbox_id, state in pending.items():
+                    merge_email_delivery(self._pending.setdefault(outbox_id, {}), state)
+            finally:
+                self._last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def stats(self) -> Dict[str, Any]:
+        """Return buffer size and write counters."""
+        return {
+            "buffered": len(self._pending),
+            "received": self._received,
+            "duplicates": self._duplicates,
+            "refused": self._refused,
+            "flushes": self._flushes,
+            "flush_errors": self._flush_errors,
+            "invoices_updated": self._invoices_updated,
+            "unmatched": self._unmatched,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+delivery_events = DeliveryEventBuffer()
@@ -0,0 +1,681 @@
+import io
+import os
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Dict, Any, IO, Literal, Optional
+from xml.sax.saxutils import XMLGenerator, escape
+from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.db.models.client import ClientInDB
+from billirae_backend.app.services.pdf_service import PDFService
+from billirae_backend.app.services.font_registry import font_registry
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Syntax = Literal["cii", "ubl"]
+
+XRECHNUNG_GUIDELINE = "urn:cen.eu:en16931:2017#compliant#urn:xeinkauf.de:kosit:xrechnung_3.0"
+PEPPOL_PROCESS = "urn:fdc:peppol.eu:2017:poacc:billing:01:1.0"
+
+# Schema files in EINVOICE_SCHEMA_DIR
+SCHEMA_FILES = {
+    "cii": "CrossIndustryInvoice_100pD16B.xsd",
+    "ubl": os.path.join("maindoc", "UBL-Invoice-2.1.xsd"),
+}
+
+CII_NAMESPACES = {
+    "xmlns:rsm": "urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100",
+    "xmlns:ram": "urn:un:unece:uncefact:data:standard:ReusableAggregateBusinessInformationEntity:100",
+    "xmlns:qdt": "urn:un:unece:uncefact:data:standard:QualifiedDataType:100",
+    "xmlns:udt": "urn:un:unece:uncefact:data:standard:UnqualifiedDataType:100",
+}
+
+UBL_NAMESPACES = {
+    "xmlns": "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
+    "xmlns:cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    "xmlns:cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+}
+
+# Name of the XML inside a ZUGFeRD PDF with the XRechnung profile
+ZUGFERD_FILENAME = "xrechnung.xml"
+
+# XMP declaring PDF/A-3b, only written when all fonts are embedded
+PDFA_IDENTIFICATION = """<rdf:Description rdf:about="" xmlns:pdfaid="http://www.aiim.org/pdfa/ns/id/">
+<pdfaid:part>3</pdfaid:part>
+<pdfaid:conformance>B</pdfaid:conformance>
+</rdf:Description>
+"""
+
+SMALL_BUSINESS_EXEMPTION = "Kleinunternehmer gemäß § 19 UStG"
+DEFAULT_PAYMENT_TERMS = "Zahlbar innerhalb von 14 Tagen nach Erhalt"
+
+COUNTRY_CODES = {
+    "deutschland": "DE", "germany": "DE",
+    "österreich": "AT", "austria": "AT",
+    "schweiz": "CH", "switzerland": "CH",
+}
+
+CENT = Decimal("0.01")
+
+def _amount(value: Any) -> Decimal:
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def _country_code(country: Optional[str]) -> str:
+    """Map a country name or code to its ISO 3166-1 alpha-2 code, Germany by default."""
+    if not country:
+        return "DE"
+    country = country.strip()
+    if len(country) == 2:
+        return country.upper()
+    return COUNTRY_CODES.get(country.lower(), "DE")
+
+def _xmp_date(pdf_date: str) -> str:
+    """Convert a PDF date (D:YYYYMMDDHHmmSS+HH'mm') to the XMP date format."""
+    value = pdf_date[2:] if pdf_date.startswith("D:") else pdf_date
+    if len(value) < 14:
+        return ""
+    result = f"{value[0:4]}-{value[4:6]}-{value[6:8]}T{value[8:10]}:{value[10:12]}:{value[12:14]}"
+    zone = value[14:].replace("'", "")
+    if zone in ("", "Z"):
+        return result + "Z"
+    return f"{result}{zone[0]}{zone[1:3]}:{zone[3:5] or '00'}"
+
+@lru_cache(maxsize=1)
+def _srgb_profile() -> bytes:
+    """Return the sRGB ICC profile for the PDF/A output intent."""
+    from PIL import ImageCms
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+class EInvoiceValidationError(ValueError):
+    """Raised when a generated e-invoice does not match its schema."""
+
+@lru_cache(maxsize=None)
+def _schema(path: str):
+    """Parse and compile an XSD, once per process and file."""
+    from lxml import etree
+    logger.info(f"Compiling e-invoice schema {path}")
+    return etree.XMLSchema(etree.parse(path))
+
+class _XMLWriter:
+    """Streaming XML writer, elements are written out as they are produced."""
+
+    def __init__(self, stream: IO[bytes]):
+        self._generator = XMLGenerator(stream, encoding="utf-8", short_empty_elements=True)
+        self._generator.startDocument()
+
+    @contextmanager
+    def element(self, name: str, attrs: Optional[Dict[str, str]] = None):
+        self._generator.startElement(name, attrs or {})
+        yield
+        self._generator.endElement(name)
+
+    def text(self, name: str, value: Any, attrs: Optional[Dict[str, str]] = None) -> None:
+        """Write an element with text content, skipped when the value is empty."""
+        if value is None or value == "":
+            return
+        self._generator.startElement(name, attrs or {})
+        self._generator.characters(str(value))
+        self._generator.endElement(name)
+
+    def close(self) -> None:
+        self._generator.endDocument()
+
+class EInvoiceService:
+    """
+    Service for generating XRechnung e-invoices.
+
+    Builds the structured invoice in UN/CEFACT CII or OASIS UBL syntax from
+    the same models the PDF is rendered from, and embeds CII invoices into
+    the rendered PDF as a ZUGFeRD PDF/A-3.
+    """
+
+    def __init__(self, pdf_service: PDFService):
+        self.pdf_service = pdf_service
+        self._validation_lock = threading.Lock()
+        self._validation_skipped = False
+
+    def build_xml(
+        self,
+        invoice: InvoiceInDB,
+        user: UserInDB,
+        client: ClientInDB,
+        syntax: Syntax = "cii"
+    ) -> bytes:
+        """
+        Build and validate the XRechnung XML of an invoice.
+
+        Args:
+            invoice: Invoice data
+            user: User data (seller)
+            client: Client data (buyer)
+            syntax: "cii" or "ubl"
+
+        Returns:
+            XML document as UTF-8 bytes
+
+        Raises:
+            EInvoiceValidationError: If the document does not match the configured schema
+        """
+        buffer = io.BytesIO()
+        self.write_xml(buffer, invoice, user, client, syntax)
+        xml_bytes = buffer.getvalue()
+        self.validate(xml_bytes, syntax)
+        return xml_bytes
+
+    def write_xml(
+        self,
+        stream: IO[bytes],
+        invoice: InvoiceInDB,
+        user: UserInDB,
+        client: ClientInDB,
+        syntax: Syntax = "cii"
+    ) -> None:
+        """
+        Write the XRechnung XML of an invoice to a binary stream, without validating it.
+
+        Args:
+            stream: Binary stream, e.g. a file or ZIP entry
+            invoice: Invoice data
+            user: User data (seller)
+            client: Client data (buyer)
+            syntax: "cii" or "ubl"
+        """
+        document = self._document(invoice, user, client)
+        writer = _XMLWriter(stream)
+        if syntax == "cii":
+            self._write_cii(writer, document)
+        elif syntax == "ubl":
+            self._write_ubl(writer, document)
+        else:
+            raise ValueError(f"Unsupported e-invoice syntax: {syntax}")
+        writer.close()
+
+    def validate(self, xml_bytes: bytes, syntax: Syntax = "cii") -> None:
+        """
+        Validate an e-invoice against the schema in EINVOICE_SCHEMA_DIR.
+
+        Skipped with a warning, once per process, if no schema directory is
+        configured. The schema is compiled on first use and kept for the
+        lifetime of the process.
+
+        Raises:
+            EInvoiceValidationError: If the document does not match the schema
+        """
+        if not settings.EINVOICE_SCHEMA_DIR:
+            if not self._validation_skipped:
+                self._validation_skipped = True
+                logger.warning("EINVOICE_SCHEMA_DIR is not set, e-invoices are not validated against their schema")
+            return
+        from lxml import etree
+        schema = _schema(os.path.join(settings.EINVOICE_SCHEMA_DIR, SCHEMA_FILES[syntax]))
+        document = etree.fromstring(xml_bytes)
+        with self._validation_lock:
+            if not schema.validate(document):
+                errors = "; ".join(str(error.message) for error in list(schema.error_log)[:5])
+                raise EInvoiceValidationError(f"E-invoice does not match the {syntax.upper()} schema: {errors}")
+
+    async def generate_zugferd_pdf(
+        self,
+        invoice: InvoiceInDB,
+        user: UserInDB,
+        client: ClientInDB
+    ) -> bytes:
+        """
+        Generate the invoice PDF with its XRechnung CII XML embedded (ZUGFeRD).
+
+        Args:
+            invoice: Invoice data
+            user: User data (seller)
+            client: Client data (buyer)
+
+        Returns:
+            PDF/A-3 file as bytes
+        """
+        pdf_bytes = await self.pdf_service.generate_invoice_pdf(invoice, user, client)
+        return await asyncio.to_thread(self.build_zugferd_pdf, pdf_bytes, invoice, user, client)
+
+    def build_zugferd_pdf(
+        self,
+        pdf_bytes: bytes,
+        invoice: InvoiceInDB,
+        user: UserInDB,
+        client: ClientInDB
+    ) -> bytes:
+        """Embed the XRechnung CII XML of an invoice into its rendered PDF."""
+        return self.embed_xml(pdf_bytes, self.build_xml(invoice, user, client, "cii"))
+
+    def embed_xml(self, pdf_bytes: bytes, xml_bytes: bytes) -> bytes:
+        """
+        Turn a rendered invoice into a PDF/A-3b with the CII XML attached.
+
+        Adds the XML as associated file, an sRGB output intent and the XMP
+        metadata with the PDF/A and Factur-X/ZUGFeRD schemas. PDF/A requires
+        all fonts to be embedded; if the renderer fell back to a standard
+        font, the XML is still attached but the PDF does not claim PDF/A.
+
+        Args:
+            pdf_bytes: PDF from the renderer
+            xml_bytes: XRechnung XML in CII syntax
+
+        Returns:
+            PDF/A-3 file as bytes, a plain PDF with the XML if fonts are not embedded
+        """
+        from pypdf import PdfReader, PdfWriter
+        from pypdf.generic import (
+            ArrayObject,
+            DecodedStreamObject,
+            DictionaryObject,
+            NameObject,
+            NumberObject,
+            TextStringObject,
+        )
+
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        writer = PdfWriter(clone_from=reader)
+        writer.pdf_header = b"%PDF-1.7"
+        info = reader.metadata or {}
+        modified = str(info.get("/ModDate") or info.get("/CreationDate") or "")
+
+        embedded_file = DecodedStreamObject()
+        embedded_file.set_data(xml_bytes)
+        embedded_file.update({
+            NameObject("/Type"): NameObject("/EmbeddedFile"),
+            NameObject("/Subtype"): NameObject("/text/xml"),
+            NameObject("/Params"): DictionaryObject({
+                NameObject("/ModDate"): TextStringObject(modified),
+                NameObject("/Size"): NumberObject(len(xml_bytes)),
+            }),
+        })
+        embedded_file_ref = writer._add_object(embedded_file.flate_encode())
+
+        filespec = DictionaryObject({
+            NameObject("/Type"): NameObject("/Filespec"),
+            NameObject("/F"): TextStringObject(ZUGFERD_FILENAME),
+            NameObject("/UF"): TextStringObject(ZUGFERD_FILENAME),
+            NameObject("/Desc"): TextStringObject("XRechnung"),
+            NameObject("/AFRelationship"): NameObject("/Alternative"),
+            NameObject("/EF"): DictionaryObject({
+                NameObject("/F"): embedded_file_ref,
+                NameObject("/UF"): embedded_file_ref,
+            }),
+        })
+        filespec_ref = writer._add_object(filespec)
+
+        icc_profile = DecodedStreamObject()
+        icc_profile.set_data(_srgb_profile())
+        icc_profile[NameObject("/N")] = NumberObject(3)
+        output_intent = DictionaryObject({
+            NameObject("/Type"): NameObject("/OutputIntent"),
+            NameObject("/S"): NameObject("/GTS_PDFA1"),
+            NameObject("/OutputConditionIdentifier"): TextStringObject("sRGB IEC61966-2.1"),
+            NameObject("/Info"): TextStringObject("sRGB IEC61966-2.1"),
+            NameObject("/DestOutputProfile"): writer._add_object(icc_profile.flate_encode()),
+        })
+
+        metadata = DecodedStreamObject()
+        pdfa = font_registry.register().embedded
+        if not pdfa:
+            logger.warning("Invoice fonts are not embedded, the ZUGFeRD PDF does not declare PDF/A-3b")
+        metadata.set_data(self._xmp_metadata(info, pdfa).encode("utf-8"))
+        metadata.update({
+            NameObject("/Type"): NameObject("/Metadata"),
+            NameObject("/Subtype"): NameObject("/XML"),
+        })
+
+        root = writer.root_object
+        root[NameObject("/Names")] = DictionaryObject({
+            NameObject("/EmbeddedFiles"): DictionaryObject({
+                NameObject("/Names"): ArrayObject([TextStringObject(ZUGFERD_FILENAME), filespec_ref]),
+            }),
+        })
+        root[NameObject("/AF")] = ArrayObject([filespec_ref])
+        root[NameObject("/OutputIntents")] = ArrayObject([writer._add_object(output_intent)])
+        root[NameObject("/Metadata")] = writer._add_object(metadata)
+
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def _document(self, invoice: InvoiceInDB, user: UserInDB, client: ClientInDB) -> Dict[str, Any]:
+        """Collect the fields of an e-invoice, with amounts computed per EN 16931."""
+        is_small_business = getattr(user, "is_small_business", False)
+
+        lines = []
+        taxes: Dict[tuple, Dict[str, Any]] = {}
+        for index, item in enumerate(invoice.items, start=1):
+            net = _amount(Decimal(str(item.quantity)) * Decimal(str(item.unit_price)))
+            rate = Decimal(str(item.tax_rate)) * 100
+            if is_small_business:
+                category, rate = "E", Decimal("0")
+            else:
+                category = "S" if rate else "Z"
+            lines.append({
+                "id": index,
+                "name": item.service,
+                "quantity": item.quantity,
+                "price": _amount(item.unit_price),
+                "net": net,
+                "category": category,
+                "percent": _amount(rate),
+            })
+            group = taxes.setdefault((category, rate), {
+                "category": category,
+                "percent": _amount(rate),
+                "basis": Decimal("0"),
+                "reason": SMALL_BUSINESS_EXEMPTION if category == "E" else None,
+            })
+            group["basis"] += net
+
+        for group in taxes.values():
+            group["tax"] = _amount(group["basis"] * group["percent"] / 100)
+
+        line_total = sum((line["net"] for line in lines), Decimal("0.00"))
+        tax_total = sum((group["tax"] for group in taxes.values()), Decimal("0.00"))
+
+        issue_date = (invoice.invoice_date or datetime.now()).date()
+        seller_name = user.company_name or f"{user.first_name or ''} {user.last_name or ''}".strip()
+        address = client.address
+
+        return {
+            "number": invoice.invoice_number,
+            "issue_date": issue_date,
+            "due_date": invoice.due_date.date() if invoice.due_date else None,
+            "payment_terms": None if invoice.due_date else DEFAULT_PAYMENT_TERMS,
+            "notes": invoice.notes,
+            "seller": {
+                "name": seller_name,
+                "contact": f"{user.first_name or ''} {user.last_name or ''}".strip() or seller_name,
+                "street": user.address,
+                "postcode": user.postal_code,
+                "city": user.city,
+                "country": _country_code(user.country),
+                "email": user.email,
+                "phone": user.phone,
+                "vat_id": user.vat_id,
+                "tax_id": user.tax_id,
+            },
+            "buyer": {
+                "name": client.name,
+                "reference": client.id or invoice.invoice_number,
+                "street": address.street if address else None,
+                "postcode": address.zip if address else None,
+                "city": address.city if address else None,
+                "country": _country_code(address.country if address else None),
+                "email": client.email,
+            },
+            "payment": {
+                "iban": user.bank_iban.replace(" ", ""),
+                "bic": user.bank_bic,
+                "account_name": seller_name,
+            } if user.bank_iban else None,
+            "lines": lines,
+            "taxes": list(taxes.values()),
+            "line_total": line_total,
+            "tax_total": tax_total,
+            "grand_total": line_total + tax_total,
+        }
+
+    def _write_cii(self, writer: _XMLWriter, document: Dict[str, Any]) -> None:
+        """Write a CII CrossIndustryInvoice (XRechnung CII syntax)."""
+        w = writer
+        with w.element("rsm:CrossIndustryInvoice", CII_NAMESPACES):
+            with w.element("rsm:ExchangedDocumentContext"):
+                with w.element("ram:BusinessProcessSpecifiedDocumentContextParameter"):
+                    w.text("ram:ID", PEPPOL_PROCESS)
+                with w.element("ram:GuidelineSpecifiedDocumentContextParameter"):
+                    w.text("ram:ID", XRECHNUNG_GUIDELINE)
+
+            with w.element("rsm:ExchangedDocument"):
+                w.text("ram:ID", document["number"])
+                w.text("ram:TypeCode", "380")
+                with w.element("ram:IssueDateTime"):
+                    w.text("udt:DateTimeString", document["issue_date"].strftime("%Y%m%d"), {"format": "102"})
+                if document["notes"]:
+                    with w.element("ram:IncludedNote"):
+                        w.text("ram:Content", document["notes"])
+
+            with w.element("rsm:SupplyChainTradeTransaction"):
+                for line in document["lines"]:
+                    with w.element("ram:IncludedSupplyChainTradeLineItem"):
+                        with w.element("ram:AssociatedDocumentLineDocument"):
+                            w.text("ram:LineID", line["id"])
+                        with w.element("ram:SpecifiedTradeProduct"):
+                            w.text("ram:Name", line["name"])
+                        with w.element("ram:SpecifiedLineTradeAgreement"):
+                            with w.element("ram:NetPriceProductTradePrice"):
+                                w.text("ram:ChargeAmount", line["price"])
+                        with w.element("ram:SpecifiedLineTradeDelivery"):
+                            w.text("ram:BilledQuantity", line["quantity"], {"unitCode": "C62"})
+                        with w.element("ram:SpecifiedLineTradeSettlement"):
+                            with w.element("ram:ApplicableTradeTax"):
+                                w.text("ram:TypeCode", "VAT")
+                                w.text("ram:CategoryCode", line["category"])
+                                w.text("ram:RateApplicablePercent", line["percent"])
+                            with w.element("ram:SpecifiedTradeSettlementLineMonetarySummation"):
+                                w.text("ram:LineTotalAmount", line["net"])
+
+                with w.element("ram:ApplicableHeaderTradeAgreement"):
+                    w.text("ram:BuyerReference", document["buyer"]["reference"])
+                    seller = document["seller"]
+                    with w.element("ram:SellerTradeParty"):
+                        w.text("ram:Name", seller["name"])
+                        with w.element("ram:DefinedTradeContact"):
+                            w.text("ram:PersonName", seller["contact"])
+                            if seller["phone"]:
+                                with w.element("ram:TelephoneUniversalCommunication"):
+                                    w.text("ram:CompleteNumber", seller["phone"])
+                            with w.element("ram:EmailURIUniversalCommunication"):
+                                w.text("ram:URIID", seller["email"])
+                        self._write_cii_address(w, seller)
+                        with w.element("ram:URIUniversalCommunication"):
+                            w.text("ram:URIID", seller["email"], {"schemeID": "EM"})
+                        for scheme, tax_id in (("VA", seller["vat_id"]), ("FC", seller["tax_id"])):
+                            if tax_id:
+                                with w.element("ram:SpecifiedTaxRegistration"):
+                                    w.text("ram:ID", tax_id, {"schemeID": scheme})
+                    buyer = document["buyer"]
+                    with w.element("ram:BuyerTradeParty"):
+                        w.text("ram:Name", buyer["name"])
+                        self._write_cii_address(w, buyer)
+                        if buyer["email"]:
+                            with w.element("ram:URIUniversalCommunication"):
+                                w.text("ram:URIID", buyer["email"], {"schemeID": "EM"})
+
+                with w.element("ram:ApplicableHeaderTradeDelivery"):
+                    pass
+
+                with w.element("ram:ApplicableHeaderTradeSettlement"):
+                    w.text("ram:PaymentReference", document["number"])
+                    w.text("ram:InvoiceCurrencyCode", "EUR")
+                    payment = document["payment"]
+                    with w.element("ram:SpecifiedTradeSettlementPaymentMeans"):
+                        w.text("ram:TypeCode", "58" if payment else "1")
+                        if payment:
+                            with w.element("ram:PayeePartyCreditorFinancialAccount"):
+                                w.text("ram:IBANID", payment["iban"])
+                                w.text("ram:AccountName", payment["account_name"])
+                            if payment["bic"]:
+                                with w.element("ram:PayeeSpecifiedCreditorFinancialInstitution"):
+                                    w.text("ram:BICID", payment["bic"])
+                    for tax in document["taxes"]:
+                        with w.element("ram:ApplicableTradeTax"):
+                            w.text("ram:CalculatedAmount", tax["tax"])
+                            w.text("ram:TypeCode", "VAT")
+                            w.text("ram:ExemptionReason", tax["reason"])
+                            w.text("ram:BasisAmount", tax["basis"])
+                            w.text("ram:CategoryCode", tax["category"])
+                            w.text("ram:RateApplicablePercent", tax["percent"])
+                    with w.element("ram:SpecifiedTradePaymentTerms"):
+                        w.text("ram:Description", document["payment_terms"])
+                        if document["due_date"]:
+                            with w.element("ram:DueDateDateTime"):
+                                w.text("udt:DateTimeString", document["due_date"].strftime("%Y%m%d"), {"format": "102"})
+                    with w.element("ram:SpecifiedTradeSettlementHeaderMonetarySummation"):
+                        w.text("ram:LineTotalAmount", document["line_total"])
+                        w.text("ram:TaxBasisTotalAmount", document["line_total"])
+                        w.text("ram:TaxTotalAmount", document["tax_total"], {"currencyID": "EUR"})
+                        w.text("ram:GrandTotalAmount", document["grand_total"])
+                        w.text("ram:DuePayableAmount", document["grand_total"])
+
+    def _write_cii_address(self, w: _XMLWriter, party: Dict[str, Any]) -> None:
+        with w.element("ram:PostalTradeAddress"):
+            w.text("ram:PostcodeCode", party["postcode"])
+            w.text("ram:LineOne", party["street"])
+            w.text("ram:CityName", party["city"])
+            w.text("ram:CountryID", party["country"])
+
+    def _write_ubl(self, writer: _XMLWriter, document: Dict[str, Any]) -> None:
+        """Write a UBL Invoice (XRechnung UBL syntax)."""
+        w = writer
+        eur = {"currencyID": "EUR"}
+        with w.element("Invoice", UBL_NAMESPACES):
+            w.text("cbc:CustomizationID", XRECHNUNG_GUIDELINE)
+            w.text("cbc:ProfileID", PEPPOL_PROCESS)
+            w.text("cbc:ID", document["number"])
+            w.text("cbc:IssueDate", document["issue_date"].isoformat())
+            if document["due_date"]:
+                w.text("cbc:DueDate", document["due_date"].isoformat())
+            w.text("cbc:InvoiceTypeCode", "380")
+            w.text("cbc:Note", document["notes"])
+            w.text("cbc:DocumentCurrencyCode", "EUR")
+            w.text("cbc:BuyerReference", document["buyer"]["reference"])
+
+            seller = document["seller"]
+            with w.element("cac:AccountingSupplierParty"):
+                with w.element("cac:Party"):
+                    w.text("cbc:EndpointID", seller["email"], {"schemeID": "EM"})
+                    self._write_ubl_address(w, seller)
+                    for scheme, tax_id in (("VAT", seller["vat_id"]), ("FC", seller["tax_id"])):
+                        if tax_id:
+                            with w.element("cac:PartyTaxScheme"):
+                                w.text("cbc:CompanyID", tax_id)
+                                with w.element("cac:TaxScheme"):
+                                    w.text("cbc:ID", scheme)
+                    with w.element("cac:PartyLegalEntity"):
+                        w.text("cbc:RegistrationName", seller["name"])
+                    with w.element("cac:Contact"):
+                        w.text("cbc:Name", seller["contact"])
+                        w.text("cbc:Telephone", seller["phone"])
+                        w.text("cbc:ElectronicMail", seller["email"])
+
+            buyer = document["buyer"]
+            with w.element("cac:AccountingCustomerParty"):
+                with w.element("cac:Party"):
+                    w.text("cbc:EndpointID", buyer["email"], {"schemeID": "EM"})
+                    self._write_ubl_address(w, buyer)
+                    with w.element("cac:PartyLegalEntity"):
+                        w.text("cbc:RegistrationName", buyer["name"])
+
+            payment = document["payment"]
+            with w.element("cac:PaymentMeans"):
+                w.text("cbc:PaymentMeansCode", "58" if payment else "1")
+                w.text("cbc:PaymentID", document["number"])
+                if payment:
+                    with w.element("cac:PayeeFinancialAccount"):
+                        w.text("cbc:ID", payment["iban"])
+                        w.text("cbc:Name", payment["account_name"])
+                        if payment["bic"]:
+                            with w.element("cac:FinancialInstitutionBranch"):
+                                w.text("cbc:ID", payment["bic"])
+            if document["payment_terms"]:
+                with w.element("cac:PaymentTerms"):
+                    w.text("cbc:Note", document["payment_terms"])
+
+            with w.element("cac:TaxTotal"):
+                w.text("cbc:TaxAmount", document["tax_total"], eur)
+                for tax in document["taxes"]:
+                    with w.element("cac:TaxSubtotal"):
+                        w.text("cbc:TaxableAmount", tax["basis"], eur)
+                        w.text("cbc:TaxAmount", tax["tax"], eur)
+                        with w.element("cac:TaxCategory"):
+                            w.text("cbc:ID", tax["category"])
+                            w.text("cbc:Percent", tax["percent"])
+                            w.text("cbc:TaxExemptionReason", tax["reason"])
+                            with w.element("cac:TaxScheme"):
+                                w.text("cbc:ID", "VAT")
+
+            with w.element("cac:LegalMonetaryTotal"):
+                w.text("cbc:LineExtensionAmount", document["line_total"], eur)
+                w.text("cbc:TaxExclusiveAmount", document["line_total"], eur)
+                w.text("cbc:TaxInclusiveAmount", document["grand_total"], eur)
+                w.text("cbc:PayableAmount", document["grand_total"], eur)
+
+            for line in document["lines"]:
+                with w.element("cac:InvoiceLine"):
+                    w.text("cbc:ID", line["id"])
+                    w.text("cbc:InvoicedQuantity", line["quantity"], {"unitCode": "C62"})
+                    w.text("cbc:LineExtensionAmount", line["net"], eur)
+                    with w.element("cac:Item"):
+                        w.text("cbc:Name", line["name"])
+                        with w.element("cac:ClassifiedTaxCategory"):
+                            w.text("cbc:ID", line["category"])
+                            w.text("cbc:Percent", line["percent"])
+                            with w.element("cac:TaxScheme"):
+                                w.text("cbc:ID", "VAT")
+                    with w.element("cac:Price"):
+                        w.text("cbc:PriceAmount", line["price"], eur)
+
+    def _write_ubl_address(self, w: _XMLWriter, party: Dict[str, Any]) -> None:
+        with w.element("cac:PostalAddress"):
+            w.text("cbc:StreetName", party["street"])
+            w.text("cbc:CityName", party["city"])
+            w.text("cbc:PostalZone", party["postcode"])
+            with w.element("cac:Country"):
+                w.text("cbc:IdentificationCode", party["country"])
+
+    def _xmp_metadata(self, info: Dict[str, Any], pdfa: bool = True) -> str:
+        """Build the XMP packet declaring the ZUGFeRD XRechnung profile, and PDF/A-3b if `pdfa`."""
+        created = _xmp_date(str(info.get("/CreationDate") or ""))
+        modified = _xmp_date(str(info.get("/ModDate") or "")) or created
+        title = escape(str(info.get("/Title") or ""))
+        author = escape(str(info.get("/Author") or ""))
+        subject = escape(str(info.get("/Subject") or ""))
+        keywords = escape(str(info.get("/Keywords") or ""))
+        creator = escape(str(info.get("/Creator") or ""))
+        producer = escape(str(info.get("/Producer") or ""))
+        pdfa_id = PDFA_IDENTIFICATION if pdfa else ""
+        return f"""<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+{pdfa_id}<rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:title><rdf:Alt><rdf:li xml:lang="x-default">{title}</rdf:li></rdf:Alt></dc:title>
+<dc:creator><rdf:Seq><rdf:li>{author}</rdf:li></rdf:Seq></dc:creator>
+<dc:description><rdf:Alt><rdf:li xml:lang="x-default">{subject}</rdf:li></rdf:Alt></dc:description>
+</rdf:Description>
+<rdf:Description rdf:about="" xmlns:pdf="http://ns.adobe.com/pdf/1.3/">
+<pdf:Producer>{producer}</pdf:Producer>
+<pdf:Keywords>{keywords}</pdf:Keywords>
+</rdf:Description>
+<rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/">
+<xmp:CreatorTool>{creator}</xmp:CreatorTool>
+<xmp:CreateDate>{created}</xmp:CreateDate>
+<xmp:ModifyDate>{modified}</xmp:ModifyDate>
+</rdf:Description>
+<rdf:Description rdf:about="" xmlns:fx="urn:factur-x:pdfa:CrossIndustryDocument:invoice:1p0#">
+<fx:DocumentType>INVOICE</fx:DocumentType>
+<fx:DocumentFileName>{ZUGFERD_FILENAME}</fx:DocumentFileName>
+<fx:Version>1.0</fx:Version>
+<fx:ConformanceLevel>XRECHNUNG</fx:ConformanceLevel>
+</rdf:Description>
+<rdf:Description rdf:about="" xmlns:pdfaExtension="http://www.aiim.org/pdfa/ns/extension/" xmlns:pdfaSchema="http://www.aiim.org/pdfa/ns/schema#" xmlns:pdfaProperty="http://www.aiim.org/pdfa/ns/property#">
+<pdfaExtension:schemas><rdf:Bag><rdf:li rdf:parseType="Resource">
+<pdfaSchema:schema>Factur-X PDFA Extension Schema</pdfaSchema:schema>
+<pdfaSchema:namespaceURI>urn:factur-x:pdfa:CrossIndustryDocument:invoice:1p0#</pdfaSchema:namespaceURI>
+<pdfaSchema:prefix>fx</pdfaSchema:prefix>
+<pdfaSchema:property><rdf:Seq>
+<rdf:li rdf:parseType="Resource"><pdfaProperty:name>DocumentFileName</pdfaProperty:name><pdfaProperty:valueType>Text</pdfaProperty:valueType><pdfaProperty:category>external</pdfaProperty:category><pdfaProperty:description>Name of the embedded XML invoice file</pdfaProperty:description></rdf:li>
+<rdf:li rdf:parseType="Resource"><pdfaProperty:name>DocumentType</pdfaProperty:name><pdfaProperty:valueType>Text</pdfaProperty:valueType><pdfaProperty:category>external</pdfaProperty:category><pdfaProperty:description>INVOICE</pdfaProperty:description></rdf:li>
+<rdf:li rdf:parseType="Resource"><pdfaProperty:name>Version</pdfaProperty:name><pdfaProperty:valueType>Text</pdfaProperty:valueType><pdfaProperty:category>external</pdfaProperty:category><pdfaProperty:description>Version of the Factur-X XML schema</pdfaProperty:description></rdf:li>
+<rdf:li rdf:parseType="Resource"><pdfaProperty:name>ConformanceLevel</pdfaProperty:name><pdfaProperty:valueType>Text</pdfaProperty:valueType><pdfaProperty:category>external</pdfaProperty:category><pdfaProperty:description>Conformance level of the embedded XML invoice</pdfaProperty:description></rdf:li>
+</rdf:Seq></pdfaSchema:property>
+</rdf:li></rdf:Bag></pdfaExtension:schemas>
+</rdf:Description>
+</rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
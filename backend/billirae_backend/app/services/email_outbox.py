@@ -0,0 +1,322 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from billirae_backend.app.db.models.email_outbox import OutboxMessage
+from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.services.email_service import EmailService
+from billirae_backend.app.services.pdf_storage import pdf_storage, StoredPDF
+from billirae_backend.app.services.email_webhooks import OUTBOX_TAG
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def parse_rate_limits(value: str) -> Dict[str, float]:
+    """Parse EMAIL_RATE_LIMITS, e.g. "smtp=5,resend=10", into messages per second by provider."""
+    limits = {}
+    for entry in value.split(","):
+        if "=" in entry:
+            provider, rate = entry.split("=", 1)
+            limits[provider.strip().lower()] = float(rate)
+    return limits
+
+class _RateLimiter:
+    """Token bucket per provider, allowing short bursts of up to one second of sends."""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = rates
+        # provider -> (tokens, time of the last refill)
+        self._buckets: Dict[str, List[float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.wait_seconds = 0.0
+
+    async def acquire(self, provider: str) -> None:
+        """Wait until a message may be sent with a provider."""
+        rate = self.rates.get(provider)
+        if not rate or rate <= 0:
+            return
+        lock = self._locks.setdefault(provider, asyncio.Lock())
+        async with lock:
+            capacity = max(rate, 1.0)
+            bucket = self._buckets.setdefault(provider, [capacity, time.monotonic()])
+            while True:
+                now = time.monotonic()
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                if bucket[0] >= 1.0:
+                    bucket[0] -= 1.0
+                    return
+                delay = (1.0 - bucket[0]) / rate
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+
+class EmailOutbox:
+    """
+    Durable outbox for invoice emails, delivered by background workers.
+
+    Messages are stored in MongoDB with a reference to their PDF in the
+    PDF storage, so queued mail survives restarts and the PDF is not
+    kept in memory. Workers claim messages atomically with a lease, up to
+    EMAIL_OUTBOX_BATCH_SIZE at a time which they send concurrently over the
+    pooled SMTP sessions or HTTP connections; a message whose worker
+    stopped is claimed again after the lease expired.
+    Sends are throttled to EMAIL_RATE_LIMITS per provider: a worker waits
+    for the rate limit of a claimed message before claiming the next one,
+    and renews the lease right before sending, so a message is never sent
+    by a worker that lost it. Failed sends are retried with exponential
+    backoff until EMAIL_MAX_ATTEMPTS, and the invoice is marked as sent
+    once its email went out.
+    Emails are tagged with their message ID, which the delivery webhooks
+    use to find the invoice, see DeliveryEventBuffer.
+    """
+
+    def __init__(
+        self,
+        email_service: Optional[EmailService] = None,
+        workers: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        rate_limits: Optional[Dict[str, float]] = None
+    ):
+        self.email_service = email_service or EmailService()
+        self.workers = settings.EMAIL_OUTBOX_WORKERS if workers is None else workers
+        self.poll_interval = settings.EMAIL_OUTBOX_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.lease_seconds = settings.EMAIL_OUTBOX_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.max_attempts = settings.EMAIL_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.batch_size = max(1, settings.EMAIL_OUTBOX_BATCH_SIZE if batch_size is None else batch_size)
+        self.base_delay = settings.EMAIL_RETRY_BASE_DELAY
+        self.max_delay = settings.EMAIL_RETRY_MAX_DELAY
+        self._rate_limiter = _RateLimiter(
+            parse_rate_limits(settings.EMAIL_RATE_LIMITS) if rate_limits is None else rate_limits
+        )
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._in_flight = 0
+        self._enqueued = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        self._leases_lost = 0
+        self._last_lag_seconds = 0.0
+        self._max_lag_seconds = 0.0
+
+    async def start(self) -> None:
+        """Start the workers once MongoDB is connected."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        if self._tasks or self.workers <= 0:
+            return
+        if MongoDB.db is None:
+            logger.info("MongoDB is not connected, the email outbox starts with the first queued message")
+            return
+
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(f"{os.getpid()}-{index}"))
+            for index in range(self.workers)
+        ]
+        try:
+            await OutboxMessage.create_indexes()
+        except Exception as e:
+            logger.warning(f"Could not create email outbox indexes: {str(e)}")
+        logger.info(f"Started email outbox with {self.workers} workers")
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """Stop the workers, letting messages being sent finish within the timeout."""
+        tasks, self._tasks = self._tasks, []
+        if not tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def enqueue(
+        self,
+        user_id: str,
+        recipient_email: str,
+        subject: str,
+        body_html: str,
+        pdf: StoredPDF,
+        pdf_filename: str,
+        cc_emails: Optional[List[str]] = None,
+        invoice_id: Optional[str] = None,
+        provider: Optional[str] = None,
+        job_id: Optional[str] = None,
+        attach_pdf: bool = True
+    ) -> OutboxMessage:
+        """
+        Queue an email with a stored PDF attachment.
+
+        Args:
+            user_id: ID of the sending user
+            recipient_email: Email address of the recipient
+            subject: Email subject
+            body_html: HTML body of the email
+            pdf: Stored PDF of the email, see `PDFService.get_stored_invoice_pdf`
+            pdf_filename: Filename for the PDF attachment
+            cc_emails: Optional list of CC email addresses
+            invoice_id: Invoice marked as sent once the email was delivered
+            provider: Email provider, EMAIL_PROVIDER by default
+            job_id: Bulk send job the email belongs to
+            attach_pdf: False if the body links to the PDF, which is then not attached
+
+        Returns:
+            Queued message
+        """
+        message = OutboxMessage(
+            user_id=user_id,
+            invoice_id=invoice_id,
+            job_id=job_id,
+            provider=(provider or self.email_service.provider).lower(),
+            recipient_email=recipient_email,
+            cc_emails=cc_emails,
+            subject=subject,
+            body_html=body_html,
+            pdf_filename=pdf_filename,
+            pdf_sha256=pdf.sha256,
+            pdf_size=pdf.size,
+            attach_pdf=attach_pdf
+        )
+        await message.save()
+        self._enqueued += 1
+        await self.start()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return message
+
+    async def stats(self) -> Dict[str, Any]:
+        """Return queue depth and age of the oldest queued message along with delivery counters."""
+        stats = {
+            "workers": len(self._tasks),
+            "in_flight": self._in_flight,
+            "enqueued": self._enqueued,
+            "sent": self._sent,
+            "retried": self._retried,
+            "failed": self._failed,
+            "leases_lost": self._leases_lost,
+            "rate_limit_wait_ms": round(self._rate_limiter.wait_seconds * 1000, 2),
+            "last_lag_ms": round(self._last_lag_seconds * 1000, 2),
+            "max_lag_ms": round(self._max_lag_seconds * 1000, 2),
+        }
+        try:
+            queue = await OutboxMessage.queue_stats()
+        except Exception:
+            return stats
+        oldest = queue.pop("oldest_created_at")
+        stats["queue"] = queue
+        stats["oldest_queued_seconds"] = round((datetime.now() - oldest).total_seconds(), 1) if oldest else 0.0
+        return stats
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter after a failed attempt."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _work(self, worker_id: str) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            sending = []
+            try:
+                while len(sending) < self.batch_size:
+                    message = await OutboxMessage.claim(worker_id, self.lease_seconds)
+                    if message is None:
+                        break
+                    # Wait for the rate limit before claiming more, so claimed
+                    # messages do not queue for it while their lease runs out
+                    await self._rate_limiter.acquire(message.provider)
+                    sending.append(asyncio.create_task(self._deliver_claimed(message)))
+            except asyncio.CancelledError:
+                for task in sending:
+                    task.cancel()
+                raise
+            except Exception as e:
+                logger.warning(f"Could not claim email outbox message: {str(e)}")
+
+            if not sending:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await asyncio.gather(*sending)
+
+    async def _deliver_claimed(self, message: OutboxMessage) -> None:
+        self._in_flight += 1
+        try:
+            await self._deliver(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not update email outbox message {message.id}: {str(e)}")
+        finally:
+            self._in_flight -= 1
+
+    async def _deliver(self, message: OutboxMessage) -> None:
+        if not await message.renew_lease(self.lease_seconds):
+            self._leases_lost += 1
+            logger.warning(f"Lease of email {message.id} expired before it was sent, leaving it to the worker that took it over")
+            return
+
+        try:
+            stored = await pdf_storage.get_blob(message.pdf_sha256)
+            if stored is None:
+                await self._fail(message, "Attached PDF is no longer stored")
+                return
+            pdf_data = await pdf_storage.read(stored) if message.attach_pdf else None
+            sent = await self.email_service.send_invoice_email(
+                recipient_email=message.recipient_email,
+                subject=message.subject,
+                body_html=message.body_html,
+                pdf_data=pdf_data,
+                pdf_filename=message.pdf_filename,
+                cc_emails=message.cc_emails,
+                provider=message.provider,
+                tags={OUTBOX_TAG: message.id}
+            )
+            error = None if sent else f"{message.provider} did not accept the message"
+        except Exception as e:
+            error = str(e)
+
+        if error is None:
+            await message.mark_sent()
+            self._sent += 1
+            lag = (message.sent_at - message.created_at).total_seconds()
+            self._last_lag_seconds = lag
+            self._max_lag_seconds = max(self._max_lag_seconds, lag)
+            await self._mark_invoice_sent(message)
+        elif message.attempts >= self.max_attempts:
+            await self._fail(message, error)
+        else:
+            delay = self.retry_delay(message.attempts)
+            self._retried += 1
+            logger.info(f"Email {message.id} failed on attempt {message.attempts}, retrying in {delay:.0f}s: {error}")
+            await message.mark_retry(error, delay)
+
+    async def _fail(self, message: OutboxMessage, error: str) -> None:
+        self._failed += 1
+        logger.error(f"Giving up on email {message.id} after {message.attempts} attempts: {error}")
+        await message.mark_failed(error)
+
+    async def _mark_invoice_sent(self, message: OutboxMessage) -> None:
+        if not message.invoice_id:
+            return
+        try:
+            invoice = await InvoiceInDB.get_by_id(message.invoice_id)
+            if invoice:
+                invoice.status = "sent"
+                invoice.sent_date = message.sent_at
+                await invoice.save()
+        except Exception as e:
+            logger.warning(f"Email {message.id} was sent, but invoice {message.invoice_id} was not updated: {str(e)}")
+
+email_outbox = EmailOutbox()
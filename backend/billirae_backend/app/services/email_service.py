@@ -1,15 +1,68 @@
 import os
+import html
+import base64
 import logging
-import smtplib
-import ssl
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.db.models.client import ClientInDB
 from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.http_client import http_client
+from billirae_backend.app.services.smtp_pool import smtp_pool
 
 logger = logging.getLogger(__name__)
 
+def build_invoice_email(
+    invoice: InvoiceInDB,
+    user: UserInDB,
+    client: ClientInDB,
+    subject: Optional[str] = None,
+    message: Optional[str] = None,
+    download_url: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Build the subject and HTML body of an invoice email.
+    
+    Args:
+        invoice: Invoice data
+        user: User data (sender)
+        client: Client data (recipient)
+        subject: Subject overriding the default one
+        message: Optional HTML message added to the body
+        download_url: Link to the PDF, for emails sent without attachment
+        
+    Returns:
+        Tuple of (subject, HTML body)
+    """
+    sender_name = user.company_name or f'{user.first_name} {user.last_name}'
+    subject = subject or f"Rechnung {invoice.invoice_number} von {sender_name}"
+    invoice_date = invoice.invoice_date.strftime('%d.%m.%Y')
+    
+    if download_url:
+        delivery_html = f"""<p>Ihre Rechnung {invoice.invoice_number} vom {invoice_date} steht für Sie zum Download bereit:</p>
+                <p><a href="{html.escape(download_url)}">Rechnung {invoice.invoice_number} herunterladen (PDF)</a></p>"""
+    else:
+        delivery_html = f"<p>anbei erhalten Sie die Rechnung {invoice.invoice_number} vom {invoice_date}.</p>"
+    
+    body_html = f"""
+        <html>
+            <body>
+                <p>Sehr geehrte(r) {client.name},</p>
+                {delivery_html}
+                {message or ''}
+                <p>Mit freundlichen Grüßen,<br>{sender_name}</p>
+                <hr>
+                <p style="font-size: 12px; color: #666;">
+                    Diese E-Mail wurde über Billirae gesendet, eine Anwendung für Rechnungsstellung.
+                </p>
+            </body>
+        </html>
+        """
+    return subject, body_html
+
 class EmailService:
     """Service for sending emails with invoice PDFs."""
     
@@ -23,9 +76,11 @@ class EmailService:
         recipient_email: str,
         subject: str,
         body_html: str,
-        pdf_data: bytes,
+        pdf_data: Optional[bytes],
         pdf_filename: str,
-        cc_emails: Optional[List[str]] = None
+        cc_emails: Optional[List[str]] = None,
+        provider: Optional[str] = None,
+        tags: Optional[Dict[str, str]] = None
     ) -> bool:
         """
         Send an email with an invoice PDF attachment.
@@ -34,30 +89,33 @@ class EmailService:
             recipient_email: Email address of the recipient
             subject: Email subject
             body_html: HTML body of the email
-            pdf_data: PDF file as bytes
+            pdf_data: PDF file as bytes, None to send the email without attachment
             pdf_filename: Filename for the PDF attachment
             cc_emails: Optional list of CC email addresses
+            provider: Email provider to send with, EMAIL_PROVIDER by default
+            tags: Values the provider returns with the delivery events of the email (Resend and Mailgun)
             
         Returns:
             True if email was sent successfully, False otherwise
         """
+        provider = (provider or self.provider).lower()
         try:
             logger.info(f"Sending invoice email to {self._redact_email(recipient_email)}")
             
-            if self.provider == "smtp":
+            if provider == "smtp":
                 return await self._send_via_smtp(
                     recipient_email, subject, body_html, pdf_data, pdf_filename, cc_emails
                 )
-            elif self.provider == "resend":
+            elif provider == "resend":
                 return await self._send_via_resend(
-                    recipient_email, subject, body_html, pdf_data, pdf_filename, cc_emails
+                    recipient_email, subject, body_html, pdf_data, pdf_filename, cc_emails, tags
                 )
-            elif self.provider == "mailgun":
+            elif provider == "mailgun":
                 return await self._send_via_mailgun(
-                    recipient_email, subject, body_html, pdf_data, pdf_filename, cc_emails
+                    recipient_email, subject, body_html, pdf_data, pdf_filename, cc_emails, tags
                 )
             else:
-                logger.error(f"Unsupported email provider: {self.provider}")
+                logger.error(f"Unsupported email provider: {provider}")
                 return False
                 
         except Exception as e:
@@ -69,11 +127,11 @@ class EmailService:
         recipient_email: str,
         subject: str,
         body_html: str,
-        pdf_data: bytes,
+        pdf_data: Optional[bytes],
         pdf_filename: str,
         cc_emails: Optional[List[str]] = None
     ) -> bool:
-        """Send email using SMTP."""
+        """Send email using SMTP, over a pooled connection."""
         try:
             message = MIMEMultipart()
             message["From"] = self.sender_email
@@ -85,17 +143,15 @@ class EmailService:
             
             message.attach(MIMEText(body_html, "html"))
             
-            attachment = MIMEApplication(pdf_data, Name=pdf_filename)
-            attachment["Content-Disposition"] = f'attachment; filename="{pdf_filename}"'
-            message.attach(attachment)
+            if pdf_data is not None:
+                attachment = MIMEApplication(pdf_data, Name=pdf_filename)
+                attachment["Content-Disposition"] = f'attachment; filename="{pdf_filename}"'
+                message.attach(attachment)
             
-            context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(settings.SMTP_SERVER, settings.SMTP_PORT, context=context) as server:
-                server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-                recipients = [recipient_email]
-                if cc_emails:
-                    recipients.extend(cc_emails)
-                server.sendmail(self.sender_email, recipients, message.as_string())
+            recipients = [recipient_email]
+            if cc_emails:
+                recipients.extend(cc_emails)
+            await smtp_pool.send(message, self.sender_email, recipients)
             
             logger.info(f"Email sent successfully via SMTP to {self._redact_email(recipient_email)}")
             return True
@@ -109,39 +165,43 @@ class EmailService:
         recipient_email: str,
         subject: str,
         body_html: str,
-        pdf_data: bytes,
+        pdf_data: Optional[bytes],
         pdf_filename: str,
-        cc_emails: Optional[List[str]] = None
+        cc_emails: Optional[List[str]] = None,
+        tags: Optional[Dict[str, str]] = None
     ) -> bool:
         """Send email using Resend API."""
         try:
-            import resend
-            
-            resend.api_key = self.api_key
-            
-            attachments = [{
-                "content": pdf_data,
-                "filename": pdf_filename
-            }]
-            
             email_data = {
                 "from": self.sender_email,
-                "to": recipient_email,
+                "to": [recipient_email],
                 "subject": subject,
-                "html": body_html,
-                "attachments": attachments
+                "html": body_html
             }
             
+            if pdf_data is not None:
+                email_data["attachments"] = [{
+                    "content": base64.b64encode(pdf_data).decode("ascii"),
+                    "filename": pdf_filename
+                }]
+            
             if cc_emails:
                 email_data["cc"] = cc_emails
             
-            response = resend.Emails.send(email_data)
+            if tags:
+                email_data["tags"] = [{"name": name, "value": value} for name, value in tags.items()]
             
-            if response and "id" in response:
+            response = await http_client.get().post(
+                f"{settings.RESEND_API_URL}/emails",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json=email_data
+            )
+            
+            if response.status_code == 200 and "id" in response.json():
                 logger.info(f"Email sent successfully via Resend to {self._redact_email(recipient_email)}")
                 return True
             else:
-                logger.error(f"Resend API error: {response}")
+                logger.error(f"Resend API error: {response.status_code} {response.text}")
                 return False
                 
         except Exception as e:
@@ -153,14 +213,13 @@ class EmailService:
         recipient_email: str,
         subject: str,
         body_html: str,
-        pdf_data: bytes,
+        pdf_data: Optional[bytes],
         pdf_filename: str,
-        cc_emails: Optional[List[str]] = None
+        cc_emails: Optional[List[str]] = None,
+        tags: Optional[Dict[str, str]] = None
     ) -> bool:
         """Send email using Mailgun API."""
         try:
-            import requests
-            
             mailgun_domain = settings.MAILGUN_DOMAIN
             
             data = {
@@ -173,10 +232,13 @@ class EmailService:
             if cc_emails:
                 data["cc"] = ", ".join(cc_emails)
             
-            files = [("attachment", (pdf_filename, pdf_data, "application/pdf"))]
+            for name, value in (tags or {}).items():
+                data[f"v:{name}"] = value
+            
+            files = [("attachment", (pdf_filename, pdf_data, "application/pdf"))] if pdf_data is not None else None
             
-            response = requests.post(
-                f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
+            response = await http_client.get().post(
+                f"{settings.MAILGUN_API_URL}/v3/{mailgun_domain}/messages",
                 auth=("api", self.api_key),
                 data=data,
                 files=files
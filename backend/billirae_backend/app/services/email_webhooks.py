@@ -0,0 +1,170 @@
+import hmac
+import time
+import base64
+import hashlib
+import binascii
+from datetime import datetime
+from typing import Dict, Any, NamedTuple, Optional
+from billirae_backend.app.core.config import settings
+
+# Tag carrying the outbox message ID through the provider, see EmailOutbox
+OUTBOX_TAG = "outbox_id"
+
+class InvalidWebhookSignature(ValueError):
+    """Raised when a webhook was not signed by the email provider, or is too old."""
+
+class DeliveryEvent(NamedTuple):
+    """Delivery event of an email, reported by the email provider."""
+    id: str  # Provider event ID, repeated when the provider retries a webhook
+    outbox_id: str
+    event: str  # delivered, bounced, complained, opened
+    timestamp: datetime
+    reason: Optional[str] = None  # Why a bounced email was rejected
+
+def verify_mailgun_signature(signature: Dict[str, Any], signing_key: Optional[str] = None) -> None:
+    """
+    Check the signature of a Mailgun webhook.
+
+    Mailgun signs the timestamp and a random token of every webhook with an
+    HMAC-SHA256 of the webhook signing key.
+
+    Args:
+        signature: "signature" object of the webhook payload
+        signing_key: Webhook signing key, MAILGUN_WEBHOOK_SIGNING_KEY by default
+
+    Raises:
+        InvalidWebhookSignature: If the signature does not match or the webhook is too old
+    """
+    signing_key = signing_key or settings.MAILGUN_WEBHOOK_SIGNING_KEY
+    if not signing_key:
+        raise InvalidWebhookSignature("Mailgun webhook signing key is not configured")
+    timestamp = str(signature.get("timestamp", ""))
+    token = str(signature.get("token", ""))
+    expected = hmac.new(signing_key.encode("utf-8"), f"{timestamp}{token}".encode("utf-8"), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, str(signature.get("signature", ""))):
+        raise InvalidWebhookSignature("Invalid Mailgun webhook signature")
+    _check_timestamp(timestamp)
+
+def verify_resend_signature(headers: Dict[str, str], body: bytes, secret: Optional[str] = None) -> None:
+    """
+    Check the signature of a Resend webhook.
+
+    Resend signs webhooks the Svix way: an HMAC-SHA256 of the message ID,
+    timestamp and raw body, keyed with the base64 part of the "whsec_" secret.
+
+    Args:
+        headers: Request headers with svix-id, svix-timestamp and svix-signature
+        body: Raw request body
+        secret: Webhook signing secret, RESEND_WEBHOOK_SECRET by default
+
+    Raises:
+        InvalidWebhookSignature: If no signature matches or the webhook is too old
+    """
+    secret = secret or settings.RESEND_WEBHOOK_SECRET
+    if not secret:
+        raise InvalidWebhookSignature("Resend webhook secret is not configured")
+    message_id = headers.get("svix-id", "")
+    timestamp = headers.get("svix-timestamp", "")
+    try:
+        key = base64.b64decode(secret[len("whsec_"):] if secret.startswith("whsec_") else secret)
+    except (binascii.Error, ValueError):
+        raise InvalidWebhookSignature("Resend webhook secret is malformed")
+
+    signed = f"{message_id}.{timestamp}.".encode("utf-8") + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode("ascii")
+    # Space separated "v1,<signature>" entries, several while the secret is rotated
+    signatures = [entry.split(",", 1)[1] for entry in headers.get("svix-signature", "").split() if entry.startswith("v1,")]
+    if not message_id or not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise InvalidWebhookSignature("Invalid Resend webhook signature")
+    _check_timestamp(timestamp)
+
+def parse_mailgun_event(payload: Dict[str, Any]) -> Optional[DeliveryEvent]:
+    """
+    Extract the delivery event of a Mailgun webhook.
+
+    Returns:
+        Delivery event, or None for events that do not change the delivery
+        state (temporary failures, clicks) and emails not sent from the outbox
+
+    Raises:
+        ValueError: If the payload has no event data or a malformed timestamp
+    """
+    data = payload.get("event-data")
+    if not isinstance(data, dict):
+        raise ValueError("Mailgun webhook has no event data")
+    variables = data.get("user-variables")
+    outbox_id = variables.get(OUTBOX_TAG) if isinstance(variables, dict) else None
+    event = data.get("event")
+    if event == "failed":
+        if data.get("severity") != "permanent":
+            return None
+        event = "bounced"
+    if not outbox_id or event not in ("delivered", "bounced", "complained", "opened"):
+        return None
+
+    reason = None
+    if event == "bounced":
+        status = data.get("delivery-status")
+        status = status if isinstance(status, dict) else {}
+        reason = status.get("description") or status.get("message") or data.get("reason")
+    try:
+        timestamp = datetime.fromtimestamp(float(data.get("timestamp") or time.time()))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError("Mailgun webhook timestamp is malformed")
+    return DeliveryEvent(
+        id=str(data.get("id") or payload["signature"].get("token", "")),
+        outbox_id=str(outbox_id),
+        event=event,
+        timestamp=timestamp,
+        reason=reason
+    )
+
+def parse_resend_event(payload: Dict[str, Any], event_id: str) -> Optional[DeliveryEvent]:
+    """
+    Extract the delivery event of a Resend webhook.
+
+    Args:
+        payload: Webhook payload
+        event_id: svix-id header of the webhook
+
+    Returns:
+        Delivery event, or None for events that do not change the delivery
+        state (sent, delayed, clicked) and emails not sent from the outbox
+
+    Raises:
+        ValueError: If the payload has no event data
+    """
+    event = {
+        "email.delivered": "delivered",
+        "email.bounced": "bounced",
+        "email.complained": "complained",
+        "email.opened": "opened",
+    }.get(str(payload.get("type")))
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        raise ValueError("Resend webhook has no event data")
+    tags = data.get("tags") or {}
+    if isinstance(tags, list):
+        tags = {tag.get("name"): tag.get("value") for tag in tags if isinstance(tag, dict)}
+    outbox_id = tags.get(OUTBOX_TAG) if isinstance(tags, dict) else None
+    if not outbox_id or event is None:
+        return None
+
+    bounce = data.get("bounce")
+    reason = bounce.get("message") if event == "bounced" and isinstance(bounce, dict) else None
+    try:
+        # ISO 8601 in UTC, stored like every other timestamp in local time
+        timestamp = datetime.fromisoformat(str(payload.get("created_at")).replace("Z", "+00:00"))
+        timestamp = timestamp.astimezone().replace(tzinfo=None) if timestamp.tzinfo else timestamp
+    except ValueError:
+        timestamp = datetime.now()
+    return DeliveryEvent(id=event_id, outbox_id=str(outbox_id), event=event, timestamp=timestamp, reason=reason)
+
+def _check_timestamp(timestamp: str) -> None:
+    """Refuse webhooks signed too long ago, so captured requests cannot be replayed later."""
+    try:
+        age = abs(time.time() - float(timestamp))
+    except ValueError:
+        raise InvalidWebhookSignature("Webhook timestamp is malformed")
+    if age > settings.EMAIL_WEBHOOK_TOLERANCE:
+        raise InvalidWebhookSignature("Webhook timestamp is outside the tolerance")
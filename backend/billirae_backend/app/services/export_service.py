@@ -0,0 +1,245 @@
+import io
+import re
+import asyncio
+import logging
+import tempfile
+import zipfile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.db.models.client import ClientInDB
+from billirae_backend.app.services.pdf_service import PDFService
+from billirae_backend.app.services.einvoice_service import EInvoiceService, Syntax
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile streams an archive into."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Return and forget everything written since the last call."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class ExportService:
+    """Service for exporting many invoice PDFs or e-invoices in one response."""
+
+    def __init__(
+        self,
+        pdf_service: PDFService,
+        concurrency: Optional[int] = None,
+        einvoice_service: Optional[EInvoiceService] = None
+    ):
+        self.pdf_service = pdf_service
+        self.concurrency = settings.PDF_EXPORT_CONCURRENCY if concurrency is None else concurrency
+        self.einvoice_service = einvoice_service or EInvoiceService(pdf_service)
+
+    async def iter_rendered(
+        self,
+        invoices: AsyncIterator[InvoiceInDB],
+        user: UserInDB,
+        ordered: bool = False
+    ) -> AsyncIterator[Tuple[int, InvoiceInDB, ClientInDB, bytes]]:
+        """
+        Render invoices in parallel and yield them as they finish.
+
+        At most `concurrency` renders are in flight or finished but not yet
+        yielded at any time, so memory stays bounded by the window and not
+        by the number of invoices.
+
+        Args:
+            invoices: Invoices to render
+            user: User data (sender)
+            ordered: Yield in input order instead of as renders finish
+
+        Yields:
+            Tuples of (position in the input, invoice, client, PDF bytes)
+        """
+        clients: Dict[str, ClientInDB] = {}
+
+        async def render(position: int, invoice: InvoiceInDB) -> Tuple[int, InvoiceInDB, ClientInDB, bytes]:
+            client = await self._get_client(invoice, clients)
+            pdf_bytes = await self.pdf_service.generate_invoice_pdf(invoice, user, client)
+            return position, invoice, client, pdf_bytes
+
+        # Tasks in input order; unordered iteration waits for any of them
+        pending: List[asyncio.Future] = []
+        position = 0
+
+        async def next_done() -> Tuple[int, InvoiceInDB, ClientInDB, bytes]:
+            if ordered:
+                task = pending.pop(0)
+                return await task
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            task = done.pop()
+            pending.remove(task)
+            return task.result()
+
+        try:
+            async for invoice in invoices:
+                pending.append(asyncio.ensure_future(render(position, invoice)))
+                position += 1
+                if len(pending) >= self.concurrency:
+                    yield await next_done()
+
+            while pending:
+                yield await next_done()
+
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream_zip(
+        self,
+        invoices: AsyncIterator[InvoiceInDB],
+        user: UserInDB
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream a ZIP archive with one PDF per invoice.
+
+        Each PDF is written to the archive and sent as soon as it has been
+        rendered. PDFs are stored uncompressed, they are compressed already.
+
+        Args:
+            invoices: Invoices to export
+            user: User data (sender)
+
+        Yields:
+            Chunks of the ZIP archive
+        """
+        stream = _ZipStream()
+        names = set()
+        with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            async for _, invoice, _, pdf_bytes in self.iter_rendered(invoices, user):
+                name = self._unique_name(f"Rechnung_{invoice.invoice_number}.pdf", names)
+                archive.writestr(name, pdf_bytes)
+                yield stream.drain()
+        yield stream.drain()
+
+    async def stream_statement(
+        self,
+        invoices: AsyncIterator[InvoiceInDB],
+        user: UserInDB,
+        max_invoices: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream one PDF containing all invoices in invoice date order.
+
+        Invoices are rendered in parallel and appended to the statement in
+        input order as soon as their turn comes, so only the render window is
+        held as PDF bytes. A PDF can only be written once all pages are known,
+        so the merged document is spooled to a temporary file before it is
+        sent. Statements are limited to PDF_STATEMENT_MAX_INVOICES invoices,
+        since the pages of the statement are kept until it is written.
+
+        Args:
+            invoices: Invoices to export
+            user: User data (sender)
+            max_invoices: Maximum number of invoices, PDF_STATEMENT_MAX_INVOICES by default
+
+        Yields:
+            Chunks of the merged PDF
+
+        Raises:
+            ValueError: If there are more invoices than allowed
+        """
+        from pypdf import PdfReader, PdfWriter
+
+        max_invoices = settings.PDF_STATEMENT_MAX_INVOICES if max_invoices is None else max_invoices
+        writer = PdfWriter()
+        async for position, _, _, pdf_bytes in self.iter_rendered(invoices, user, ordered=True):
+            if position >= max_invoices:
+                raise ValueError(f"A statement can contain at most {max_invoices} invoices")
+            await asyncio.to_thread(writer.append, PdfReader(io.BytesIO(pdf_bytes)))
+
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+            await asyncio.to_thread(writer.write, output)
+            writer = None
+            output.seek(0)
+            while True:
+                chunk = output.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def stream_einvoice_zip(
+        self,
+        invoices: AsyncIterator[InvoiceInDB],
+        user: UserInDB,
+        syntax: Syntax = "cii",
+        embed_pdf: bool = False
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream a ZIP archive with the XRechnung e-invoice of every invoice.
+
+        Documents are generated one at a time and written to the archive as
+        they are ready, so memory stays bounded for exports of thousands of
+        invoices. With `embed_pdf` each entry is the rendered PDF with the
+        CII XML embedded (ZUGFeRD), rendered in parallel like `stream_zip`.
+
+        Args:
+            invoices: Invoices to export
+            user: User data (seller)
+            syntax: "cii" or "ubl" for XML entries, PDF entries always embed CII
+            embed_pdf: Export ZUGFeRD PDFs instead of XML files
+
+        Yields:
+            Chunks of the ZIP archive
+        """
+        stream = _ZipStream()
+        names = set()
+        with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            if embed_pdf:
+                async for _, invoice, client, pdf_bytes in self.iter_rendered(invoices, user):
+                    document = await asyncio.to_thread(
+                        self.einvoice_service.build_zugferd_pdf, pdf_bytes, invoice, user, client
+                    )
+                    name = self._unique_name(f"Rechnung_{invoice.invoice_number}.pdf", names)
+                    archive.writestr(name, document, compress_type=zipfile.ZIP_STORED)
+                    yield stream.drain()
+            else:
+                clients: Dict[str, ClientInDB] = {}
+                async for invoice in invoices:
+                    client = await self._get_client(invoice, clients)
+                    document = await asyncio.to_thread(
+                        self.einvoice_service.build_xml, invoice, user, client, syntax
+                    )
+                    name = self._unique_name(f"Rechnung_{invoice.invoice_number}.xml", names)
+                    archive.writestr(name, document)
+                    yield stream.drain()
+        yield stream.drain()
+
+    async def _get_client(self, invoice: InvoiceInDB, clients: Dict[str, ClientInDB]) -> ClientInDB:
+        """Load the client of an invoice, once per export."""
+        client = clients.get(invoice.client_id)
+        if client is None:
+            client = await ClientInDB.get_by_id(invoice.client_id)
+            if not client:
+                raise ValueError(f"Client {invoice.client_id} of invoice {invoice.invoice_number} not found")
+            clients[invoice.client_id] = client
+        return client
+
+    def _unique_name(self, name: str, names: set) -> str:
+        name = re.sub(r"[^\w.\-]", "_", name)
+        base, extension = name.rsplit(".", 1)
+        candidate = name
+        counter = 2
+        while candidate in names:
+            candidate = f"{base}_{counter}.{extension}"
+            counter += 1
+        names.add(candidate)
+        return candidate
@@ -0,0 +1,312 @@
+import os
+import zlib
+import hashlib
+import logging
+import threading
+from struct import pack, unpack_from
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Tuple, Union
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFName, PDFTrueTypeFont, PDFZCompress
+from reportlab.pdfbase.ttfonts import TTFont, TTFError, TTFontMaker
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FONT_FAMILY = "InvoiceSans"
+
+# Tables of the TrueType hinting program. Hints only snap outlines to the
+# pixel grid at small sizes on screen; viewers and printers render the
+# invoice text the same without them
+HINTING_TABLES = {"cvt ", "fpgm", "prep"}
+
+# Records of the name table kept in embedded subsets: copyright, family,
+# subfamily, unique ID, full name, version and PostScript name. The rest,
+# mostly the license text, is the largest table of a small subset
+NAME_IDS = range(7)
+
+# Changes when the embedded font programs are built differently, so cached
+# PDFs are rendered again
+FONT_PROGRAM_VERSION = "2"
+
+# Flags of composite glyph components
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+WE_HAVE_INSTRUCTIONS = 0x0100
+
+def strip_font_program(program: bytes) -> bytes:
+    """
+    Remove the hinting and the long name records from a TrueType font program.
+
+    Drops the cvt, fpgm and prep tables and the instructions of every glyph,
+    rebuilding glyf and loca, and keeps only the identifying records of the
+    name table. The outlines and metrics, and so the rendered text, are
+    unchanged.
+
+    Args:
+        program: TrueType font program, as ReportLab builds it for a subset
+
+    Returns:
+        The smaller font program
+    """
+    tables = {}
+    for index in range(unpack_from(">H", program, 4)[0]):
+        tag, _, offset, length = unpack_from(">4sLLL", program, 12 + 16 * index)
+        tables[tag.decode("latin-1")] = program[offset:offset + length]
+
+    long_offsets = unpack_from(">h", tables["head"], 50)[0] == 1
+    glyph_count = unpack_from(">H", tables["maxp"], 4)[0]
+    offsets = unpack_from(f">{glyph_count + 1}{'L' if long_offsets else 'H'}", tables["loca"])
+    if not long_offsets:
+        offsets = [offset * 2 for offset in offsets]
+
+    glyphs = []
+    new_offsets = [0]
+    for start, end in zip(offsets, offsets[1:]):
+        glyph = _strip_glyph(tables["glyf"][start:end])
+        glyph += b"\0" * (-len(glyph) % 4)
+        glyphs.append(glyph)
+        new_offsets.append(new_offsets[-1] + len(glyph))
+    long_offsets = new_offsets[-1] // 2 > 0xFFFF
+    if long_offsets:
+        loca = pack(f">{len(new_offsets)}L", *new_offsets)
+    else:
+        loca = pack(f">{len(new_offsets)}H", *(offset // 2 for offset in new_offsets))
+
+    maker = TTFontMaker()
+    for tag, data in tables.items():
+        if tag in HINTING_TABLES:
+            continue
+        if tag == "glyf":
+            data = b"".join(glyphs)
+        elif tag == "loca":
+            data = loca
+        elif tag == "head":
+            data = data[:50] + pack(">h", int(long_offsets)) + data[52:]
+        elif tag == "maxp" and len(data) >= 28:
+            # No function or instruction definitions, stack or instructions
+            data = data[:20] + bytes(8) + data[28:]
+        elif tag == "name":
+            data = _strip_names(data)
+        maker.add(tag, data)
+    return maker.makeStream()
+
+def _strip_glyph(glyph: bytes) -> bytes:
+    """Remove the instructions of one glyph."""
+    if not glyph:
+        return glyph
+    contours = unpack_from(">h", glyph)[0]
+    if contours >= 0:
+        position = 10 + 2 * contours
+        length = unpack_from(">H", glyph, position)[0]
+        return glyph[:position] + b"\0\0" + glyph[position + 2 + length:]
+
+    position = 10
+    flags = MORE_COMPONENTS
+    while flags & MORE_COMPONENTS:
+        flags_position = position
+        flags = unpack_from(">H", glyph, position)[0]
+        position += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+        if flags & WE_HAVE_A_SCALE:
+            position += 2
+        elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+            position += 4
+        elif flags & WE_HAVE_A_TWO_BY_TWO:
+            position += 8
+    if not flags & WE_HAVE_INSTRUCTIONS:
+        return glyph
+    # Instructions follow the last component, named by its flags
+    return (glyph[:flags_position] + pack(">H", flags & ~WE_HAVE_INSTRUCTIONS)
+            + glyph[flags_position + 2:position])
+
+def _strip_names(table: bytes) -> bytes:
+    """Keep the identifying records of a name table, which must be in format 0."""
+    table_format, count, storage = unpack_from(">HHH", table)
+    if table_format != 0:
+        return table
+    records = []
+    strings = b""
+    for index in range(count):
+        platform, encoding, language, name_id, length, offset = unpack_from(">6H", table, 6 + 12 * index)
+        if name_id in NAME_IDS:
+            records.append(pack(">6H", platform, encoding, language, name_id, length, len(strings)))
+            strings += table[storage + offset:storage + offset + length]
+    return pack(">HHH", 0, len(records), 6 + 12 * len(records)) + b"".join(records) + strings
+
+def _entry_size(entry: Union[bytes, Tuple[bytes, ...]]) -> int:
+    return len(entry) if isinstance(entry, bytes) else sum(len(part) for part in entry)
+
+class FontSet(NamedTuple):
+    """Names of the registered invoice fonts."""
+    regular: str
+    bold: str
+    italic: str
+    fingerprint: str  # Changes when other font files are configured
+    embedded: bool  # False if a style fell back to a standard font, which PDF/A does not allow
+
+class SubsetCachingTTFont(TTFont):
+    """
+    TrueType font whose subset objects are built once per character set.
+
+    Besides the font program, the glyph widths array and the compressed
+    ToUnicode map of a subset are serialized once and reused, as formatting
+    them took over a quarter of a one-page render.
+    """
+
+    def __init__(self, name: str, filename: str, registry: "FontRegistry"):
+        super().__init__(name, filename)
+        self._registry = registry
+        self._make_subset = self.face.makeSubset
+        self._add_subset_objects = self.face.addSubsetObjects
+        self.face.makeSubset = self._cached_subset
+        self.face.addSubsetObjects = self._add_cached_subset_objects
+
+    def _cached_subset(self, subset: List[int]) -> bytes:
+        return self._registry.subset(self.fontName, subset, self._make_subset)[0]
+
+    def _add_cached_subset_objects(self, doc, fontname, subset):
+        descriptor = self._add_subset_objects(doc, fontname, subset)
+        font_file = doc.idToObject.get(f"fontFile:{self.face.filename}({fontname})")
+        if font_file is not None and font_file.filters:
+            # Embed the program compressed once instead of compressing it per document
+            font_file.content = self._registry.subset(self.fontName, subset, self._make_subset)[1]
+            font_file.dictionary["Filter"] = PDFArray([PDFName("FlateDecode")])
+        to_unicode = doc.idToObject.get(f"toUnicodeCMap:{fontname}")
+        if to_unicode is not None and to_unicode.filters:
+            content = to_unicode.content
+            to_unicode.content = self._registry.pdf_object(
+                ("to_unicode", fontname, tuple(subset)), lambda: PDFZCompress.encode(content)
+            )
+            to_unicode.dictionary["Filter"] = PDFArray([PDFName("FlateDecode")])
+        return descriptor
+
+    def addObjects(self, doc):
+        super().addObjects(doc)
+        for font in doc.idToObject["BasicFonts"].dict.values():
+            if isinstance(font, PDFTrueTypeFont) and isinstance(getattr(font, "Widths", None), PDFArray):
+                widths = font.Widths
+                # Bytes are written to the PDF as they are
+                font.Widths = self._registry.pdf_object(
+                    ("widths", tuple(widths.sequence)), lambda: widths.format(doc)
+                )
+
+class FontRegistry:
+    """
+    Process-wide registration of the invoice fonts.
+
+    The configured TrueType files are parsed once, with their glyph metrics
+    kept in memory for the lifetime of the process. The font programs of
+    embedded subsets are cached by their characters, so a render only builds
+    a subset, stripped of its hinting, the first time its character set
+    occurs; the serialized widths and ToUnicode maps of subsets are cached
+    alongside. A bold or italic
+    font that is not configured or cannot be loaded falls back to the
+    regular TrueType font, so every font stays embedded; without a regular
+    TrueType font all styles fall back to the non-embedded Helvetica.
+    """
+
+    def __init__(self, max_subsets: Optional[int] = None):
+        self.max_subsets = settings.PDF_FONT_SUBSET_CACHE_SIZE if max_subsets is None else max_subsets
+        self._fonts: Optional[FontSet] = None
+        self._register_lock = threading.Lock()
+        # (font name, characters) -> (subset font program, compressed program)
+        self._subsets: "OrderedDict[tuple, Tuple[bytes, bytes]]" = OrderedDict()
+        # (kind, source) -> serialized PDF object of a subset
+        self._objects: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def register(self) -> FontSet:
+        """
+        Register the invoice fonts, once per process.
+
+        Returns:
+            Names of the regular, bold and italic fonts
+        """
+        with self._register_lock:
+            if self._fonts is None:
+                self._fonts = self._register()
+            return self._fonts
+
+    def subset(self, font_name: str, subset: List[int], make_subset) -> Tuple[bytes, bytes]:
+        """Return the font program of a subset and its compressed form, building them on first use."""
+        def build() -> Tuple[bytes, bytes]:
+            data = strip_font_program(make_subset(subset))
+            return data, zlib.compress(data)
+        return self._cached(self._subsets, (font_name, tuple(subset)), build)
+
+    def pdf_object(self, key: tuple, build: Callable[[], bytes]) -> bytes:
+        """Return a serialized PDF object of a subset, building it on first use."""
+        return self._cached(self._objects, key, build)
+
+    def _cached(self, entries: OrderedDict, key: tuple, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                self._hits += 1
+                return entry
+            self._misses += 1
+
+        entry = build()
+
+        with self._lock:
+            if key not in entries:
+                entries[key] = entry
+                self._size += _entry_size(entry)
+            while len(entries) > self.max_subsets:
+                _, evicted = entries.popitem(last=False)
+                self._size -= _entry_size(evicted)
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit statistics of the subset cache."""
+        return {
+            "entries": len(self._subsets) + len(self._objects),
+            "size_bytes": self._size,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    def _register(self) -> FontSet:
+        regular = self._load(FONT_FAMILY, settings.PDF_FONT_REGULAR)
+        names = [regular or "Helvetica"]
+        sources = [FONT_PROGRAM_VERSION, f"{names[0]}:{os.path.getsize(settings.PDF_FONT_REGULAR) if regular else ''}"]
+        for suffix, path, fallback in (
+            ("-Bold", settings.PDF_FONT_BOLD, "Helvetica-Bold"),
+            ("-Italic", settings.PDF_FONT_ITALIC, "Helvetica-Oblique"),
+        ):
+            name = self._load(f"{FONT_FAMILY}{suffix}", path)
+            sources.append(f"{name or regular or fallback}:{os.path.getsize(path) if name else ''}")
+            if name is None and regular and path:
+                logger.warning(f"No {FONT_FAMILY}{suffix} font, using the regular font {regular} instead")
+            names.append(name or regular or fallback)
+
+        regular, bold, italic = names
+        embedded = regular != "Helvetica"
+        if embedded:
+            pdfmetrics.registerFontFamily(FONT_FAMILY, normal=regular, bold=bold, italic=italic, boldItalic=bold)
+        else:
+            logger.warning("Invoice fonts are not embedded, e-invoice PDFs will not be PDF/A")
+        logger.info(f"Registered invoice fonts {regular}, {bold}, {italic}")
+
+        fingerprint = hashlib.sha256("|".join(sources).encode("utf-8")).hexdigest()[:16]
+        return FontSet(regular, bold, italic, fingerprint, embedded)
+
+    def _load(self, name: str, path: str) -> Optional[str]:
+        """Register a TrueType font, returning its name or None if it is not available."""
+        if not path:
+            return None
+        try:
+            pdfmetrics.registerFont(SubsetCachingTTFont(name, path, self))
+        except (OSError, TTFError) as e:
+            logger.warning(f"Could not load font {path}: {str(e)}")
+            return None
+        return name
+
+font_registry = FontRegistry()
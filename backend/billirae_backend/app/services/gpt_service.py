@@ -1,18 +1,22 @@
 import logging
 import json
 import tempfile
-from typing import Dict, Any, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
 import openai
 from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.voice_cache import VoiceCache, voice_cache
+from billirae_backend.app.services.voice_parser import parse_invoice_utterance
 
 logger = logging.getLogger(__name__)
 
 class GPTService:
-    """Service for processing voice input with GPT."""
+    """Service for processing voice input with GPT, caching transcripts and parses."""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[VoiceCache] = None):
         self.api_key = settings.OPENAI_API_KEY
+        self.cache = cache or voice_cache
+        self.fast_parse_min_confidence = settings.VOICE_FAST_PARSE_MIN_CONFIDENCE
         self.system_message = """
         Du bist ein Parsing-Assistent. Deine Aufgabe ist es, deutsche Spracheingaben für Rechnungen in saubere JSON-Daten umzuwandeln. 
         Gib ausschließlich ein valides JSON-Objekt zurück mit folgenden Feldern: 
@@ -25,12 +29,33 @@ class GPTService:
         """
         Parse German voice input into structured invoice data using GPT.
         
+        Common utterances are parsed locally, see `parse_invoice_utterance`;
+        GPT is only asked when the local parse is not confident enough.
+        Repeated inputs on the same day are answered from the voice cache.
+        If GPT fails, a less confident local parse is returned instead.
+        
         Args:
             text: German voice input text
             
         Returns:
             Structured invoice data as dictionary
         """
+        today = date.today()
+        local_data = parse_invoice_utterance(text, today)
+        if local_data is not None and local_data["confidence"] >= self.fast_parse_min_confidence:
+            logger.info(f"Parsed voice input locally with confidence {local_data['confidence']}")
+            return local_data
+        
+        try:
+            return await self.cache.get_parse(text, lambda: self._parse_with_gpt(text), today)
+        except Exception as e:
+            if local_data is None:
+                raise
+            logger.warning(f"Using the local parse with confidence {local_data['confidence']}: {str(e)}")
+            return local_data
+    
+    async def _parse_with_gpt(self, text: str) -> Dict[str, Any]:
+        """Call GPT to parse voice input, see `parse_invoice_text`."""
         try:
             logger.info("Processing voice input with GPT")
             
@@ -64,7 +89,7 @@ class GPTService:
             invoice_data["invoice_date"] = datetime.strptime(invoice_data["invoice_date"], "%Y-%m-%d")
             
             # Set default due date (30 days from invoice date)
-            invoice_data["due_date"] = invoice_data["invoice_date"] + datetime.timedelta(days=30)
+            invoice_data["due_date"] = invoice_data["invoice_date"] + timedelta(days=30)
             
             return invoice_data
             
@@ -80,6 +105,8 @@ class GPTService:
         """
         Transcribe audio file using OpenAI Whisper API and parse the transcript.
         
+        A retried upload of the same audio is answered from the voice cache.
+        
         Args:
             audio_file_path: Path to the audio file
             
@@ -87,20 +114,9 @@ class GPTService:
             Tuple of (transcript, parsed_invoice_data)
         """
         try:
-            logger.info("Transcribing audio with OpenAI Whisper")
-            
-            # Set OpenAI API key
-            openai.api_key = self.api_key
-            
-            with open(audio_file_path, "rb") as audio_file:
-                response = await openai.Audio.atranscribe(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="de",
-                    response_format="text"
-                )
-            
-            transcript = response.text
+            transcript = await self.cache.get_transcript(
+                audio_file_path, lambda: self._transcribe_with_whisper(audio_file_path)
+            )
             
             logger.info(f"Transcription result: {transcript}")
             
@@ -112,6 +128,23 @@ class GPTService:
             logger.error(f"Error transcribing audio with Whisper: {str(e)}")
             raise ValueError(f"Error transcribing audio: {str(e)}")
     
+    async def _transcribe_with_whisper(self, audio_file_path: str) -> str:
+        """Call Whisper to transcribe an audio file, see `transcribe_audio`."""
+        logger.info("Transcribing audio with OpenAI Whisper")
+        
+        # Set OpenAI API key
+        openai.api_key = self.api_key
+        
+        with open(audio_file_path, "rb") as audio_file:
+            response = await openai.Audio.atranscribe(
+                model="whisper-1",
+                file=audio_file,
+                language="de",
+                response_format="text"
+            )
+        
+        return response.text
+    
     def _mock_parse_invoice(self, text: str) -> Dict[str, Any]:
         """
         Mock implementation for testing without OpenAI API.
@@ -0,0 +1,84 @@
+import logging
+from typing import Dict, Any, Optional
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class SharedHTTPClient:
+    """
+    One async HTTP client shared by the email provider APIs.
+
+    Connections are kept alive and reused across requests, and HTTP/2 is
+    negotiated when the h2 package is installed. The client is opened on
+    app startup, or on first use outside the app, and closed on shutdown.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None
+    ):
+        self.timeout = settings.EMAIL_HTTP_TIMEOUT if timeout is None else timeout
+        self.max_connections = settings.EMAIL_HTTP_MAX_CONNECTIONS if max_connections is None else max_connections
+        self.keepalive_expiry = settings.EMAIL_HTTP_KEEPALIVE if keepalive_expiry is None else keepalive_expiry
+        self._client = None
+        self._http2 = False
+        self._requests = 0
+        self._failures = 0
+
+    async def start(self) -> None:
+        """Open the client."""
+        self.get()
+
+    async def close(self) -> None:
+        """Close the client and its connections."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def get(self):
+        """
+        Return the shared client, opening it on first use.
+
+        Returns:
+            httpx.AsyncClient with keep-alive connection pooling
+        """
+        if self._client is None:
+            import httpx
+
+            try:
+                import h2  # noqa: F401
+                self._http2 = True
+            except ImportError:
+                self._http2 = False
+
+            self._client = httpx.AsyncClient(
+                http2=self._http2,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 10.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                event_hooks={"response": [self._count_response]}
+            )
+            logger.info(f"Opened HTTP client for email providers (HTTP/2: {self._http2})")
+        return self._client
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request statistics of the client."""
+        return {
+            "open": self._client is not None,
+            "http2": self._http2,
+            "max_connections": self.max_connections,
+            "requests": self._requests,
+            "error_responses": self._failures,
+        }
+
+    async def _count_response(self, response) -> None:
+        self._requests += 1
+        if response.status_code >= 400:
+            self._failures += 1
+
+http_client = SharedHTTPClient()
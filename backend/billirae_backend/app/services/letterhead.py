@@ -0,0 +1,164 @@
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+from typing import Dict, Any
+from billirae_backend.app.db.models.user import UserInDB
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever compile_letterhead changes its output
+LETTERHEAD_VERSION = "2"
+
+# User fields that end up in the letterhead
+LETTERHEAD_FIELDS = (
+    "company_name", "first_name", "last_name", "address", "postal_code", "city",
+    "country", "tax_id", "vat_id", "bank_name", "bank_iban", "bank_bic", "logo_url",
+)
+
+LEGAL_TEXT = (
+    "Gemäß § 19 UStG enthält der ausgewiesene Betrag keine Umsatzsteuer. "
+    "Bitte überweisen Sie den Gesamtbetrag bis zum Fälligkeitsdatum. "
+    "Vielen Dank für Ihr Vertrauen."
+)
+
+def letterhead_fingerprint(user: UserInDB) -> str:
+    """
+    Hash the user fields a letterhead is compiled from.
+
+    Args:
+        user: User data (sender)
+
+    Returns:
+        Hex SHA-256 digest of the letterhead source fields
+    """
+    source = {field: getattr(user, field, None) for field in LETTERHEAD_FIELDS}
+    source["is_small_business"] = getattr(user, "is_small_business", False)
+    data = json.dumps(source, sort_keys=True, default=str)
+    return hashlib.sha256(f"{LETTERHEAD_VERSION}:{data}".encode("utf-8")).hexdigest()
+
+def compile_letterhead(user: UserInDB) -> Dict[str, Any]:
+    """
+    Compile the per-user parts of an invoice into plain data.
+
+    The sender block, tax ID rows, payment rows, the invoice-independent
+    part of the EPC QR payload and the legal footer only depend on the
+    business profile, so they are built once here instead of on every
+    render.
+
+    Args:
+        user: User data (sender)
+
+    Returns:
+        Letterhead dictionary, part of the render payload
+    """
+    sender_name = user.company_name or f"{user.first_name} {user.last_name}"
+
+    # Profile texts are escaped, the renderers treat these as paragraph markup
+    sender_markup = escape(sender_name)
+    if user.address:
+        sender_markup = "<br/>".join(escape(line) for line in (
+            sender_name,
+            user.address,
+            f"{user.postal_code or ''} {user.city or ''}",
+            user.country or "",
+        ))
+
+    tax_rows = []
+    if user.tax_id:
+        tax_rows.append(["Steuernummer:", user.tax_id])
+    if user.vat_id:
+        tax_rows.append(["USt-IdNr.:", user.vat_id])
+
+    payment_rows = []
+    epc_prefix = None
+    if user.bank_iban:
+        payment_rows.append(escape(f"Kontoinhaber: {sender_name}"))
+        payment_rows.append(escape(f"IBAN: {user.bank_iban}"))
+        if user.bank_bic:
+            payment_rows.append(escape(f"BIC: {user.bank_bic}"))
+        if user.bank_name:
+            payment_rows.append(escape(f"Bank: {user.bank_name}"))
+        epc_prefix = f"BCD\n001\n1\nSCT\n{user.bank_bic or ''}\n{sender_name}\n{user.bank_iban}\n"
+
+    return {
+        "fingerprint": letterhead_fingerprint(user),
+        "sender_name": sender_name,
+        "sender_markup": sender_markup,
+        "tax_rows": tax_rows,
+        "payment_rows": payment_rows,
+        "epc_prefix": epc_prefix,
+        "legal_text": LEGAL_TEXT,
+        "logo_path": user.logo_url,
+    }
+
+class LetterheadCache:
+    """Process-local cache of compiled letterheads keyed by user ID."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user: UserInDB) -> Dict[str, Any]:
+        """
+        Return the compiled letterhead of a user, compiling it if needed.
+
+        A letterhead stored with the user is reused as long as its
+        fingerprint still matches the profile fields.
+
+        Args:
+            user: User data (sender)
+
+        Returns:
+            Letterhead dictionary
+        """
+        fingerprint = letterhead_fingerprint(user)
+
+        letterhead = self._entries.get(user.id)
+        if letterhead is None or letterhead["fingerprint"] != fingerprint:
+            letterhead = user.letterhead
+        if letterhead is not None and letterhead.get("fingerprint") == fingerprint:
+            self._hits += 1
+        else:
+            self._misses += 1
+            letterhead = compile_letterhead(user)
+
+        self._store(user.id, letterhead)
+        return letterhead
+
+    def refresh(self, user: UserInDB) -> Dict[str, Any]:
+        """
+        Recompile the letterhead of a user and attach it to the user.
+
+        Call this before saving a changed profile, so the compiled
+        letterhead is persisted together with the user.
+
+        Args:
+            user: User data (sender)
+
+        Returns:
+            Letterhead dictionary
+        """
+        letterhead = compile_letterhead(user)
+        user.letterhead = letterhead
+        self._store(user.id, letterhead)
+        return letterhead
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit statistics of the cache."""
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    def _store(self, user_id: str, letterhead: Dict[str, Any]) -> None:
+        self._entries[user_id] = letterhead
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+letterhead_cache = LetterheadCache()
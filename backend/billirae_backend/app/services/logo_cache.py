@@ -0,0 +1,144 @@
+import io
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Logos are drawn into a 150 x 70 pt box, keep enough pixels for 300 dpi print
+LOGO_MAX_PIXELS = (625, 292)
+
+class LogoCache:
+    """
+    Process-wide cache of decoded, pre-scaled company logos.
+
+    Only logos uploaded through LogoService are rendered, that is files in
+    LOGO_STORAGE_DIR. Remote URLs are never fetched while rendering, since
+    the logo location is set by users and fetching it would let them make
+    the server request internal addresses.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, storage_dir: Optional[str] = None):
+        self.max_bytes = settings.LOGO_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.storage_dir = os.path.realpath(settings.LOGO_STORAGE_DIR if storage_dir is None else storage_dir)
+        # location -> (modification time, image reader or None, JPEG data or None, size in bytes)
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[ImageReader], Optional[bytes], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, location: str) -> Optional[ImageReader]:
+        """
+        Return the decoded logo for a file path.
+
+        Files are keyed by path and modification time, so a replaced logo is
+        decoded again.
+
+        Args:
+            location: Path of a logo stored by LogoService
+
+        Returns:
+            Image reader with the pre-scaled logo, or None if it is unavailable
+            or not an uploaded logo
+        """
+        if not self._is_uploaded_logo(location):
+            logger.warning("Company logo is not an uploaded logo and is not rendered")
+            return None
+        try:
+            version = os.stat(location).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(location)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(location)
+                self._hits += 1
+                return self._reader(entry[1], entry[2])
+            self._misses += 1
+
+        reader, jpeg_data, size = self._load(location)
+
+        with self._lock:
+            self._remove(location)
+            self._entries[location] = (version, reader, jpeg_data, size)
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+        return self._reader(reader, jpeg_data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit statistics of the cache."""
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+        }
+
+    def _is_uploaded_logo(self, location: str) -> bool:
+        """Check that a location is a file in the logo storage, after resolving links and ".."."""
+        if "://" in location:
+            return False
+        path = os.path.realpath(location)
+        return os.path.commonpath([path, self.storage_dir]) == self.storage_dir and path != self.storage_dir
+
+    def _reader(self, reader: Optional[ImageReader], jpeg_data: Optional[bytes]) -> Optional[ImageReader]:
+        # JPEG readers hand out their file handle, so each render gets its own
+        if jpeg_data is not None:
+            return ImageReader(io.BytesIO(jpeg_data))
+        return reader
+
+    def _load(self, location: str) -> Tuple[Optional[ImageReader], Optional[bytes], int]:
+        """
+        Decode and downscale a logo.
+
+        JPEGs that are already small enough, such as logos prepared by
+        LogoService, are kept as they are and embedded without re-encoding.
+
+        Returns:
+            Tuple of (image reader, JPEG data, size in bytes)
+        """
+        try:
+            with open(location, "rb") as logo_file:
+                data = logo_file.read()
+
+            with PILImage.open(io.BytesIO(data)) as image:
+                if (
+                    image.format == "JPEG"
+                    and image.mode in ("RGB", "L")
+                    and image.width <= LOGO_MAX_PIXELS[0]
+                    and image.height <= LOGO_MAX_PIXELS[1]
+                ):
+                    return None, data, len(data)
+
+                image.load()
+                if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                    image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+                image.thumbnail(LOGO_MAX_PIXELS)
+                scaled = image.copy()
+
+            size = scaled.width * scaled.height * len(scaled.getbands())
+            return ImageReader(scaled), None, size
+
+        except Exception as e:
+            logger.warning(f"Could not load company logo from {location}: {str(e)}")
+            return None, None, 0
+
+    def _remove(self, location: str) -> None:
+        entry = self._entries.pop(location, None)
+        if entry is not None:
+            self._size -= entry[3]
+
+logo_cache = LogoCache()
@@ -0,0 +1,110 @@
+import io
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Tuple
+from PIL import Image as PILImage, UnidentifiedImageError
+from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.logo_cache import LOGO_MAX_PIXELS
+
+logger = logging.getLogger(__name__)
+
+class LogoService:
+    """Service for validating, normalizing and storing uploaded company logos."""
+
+    ALLOWED_FORMATS = {"PNG", "JPEG", "GIF", "WEBP"}
+    MAX_SOURCE_PIXELS = 40_000_000
+
+    def __init__(self):
+        self.storage_dir = settings.LOGO_STORAGE_DIR
+        self.max_upload_bytes = settings.LOGO_MAX_UPLOAD_BYTES
+
+    def normalize_logo(self, data: bytes) -> Tuple[bytes, str]:
+        """
+        Downsample and recompress a logo for embedding in invoices.
+
+        The logo is scaled to fit the print resolution of the invoice header.
+        Opaque logos become JPEGs, which are embedded into PDFs without
+        re-encoding. Logos with transparency stay PNGs.
+
+        Args:
+            data: Uploaded image file
+
+        Returns:
+            Tuple of (normalized image bytes, file extension)
+
+        Raises:
+            ValueError: If the upload is not a supported image
+        """
+        try:
+            with PILImage.open(io.BytesIO(data)) as image:
+                if image.format not in self.ALLOWED_FORMATS:
+                    raise ValueError(f"Unsupported image format: {image.format}")
+                if image.width * image.height > self.MAX_SOURCE_PIXELS:
+                    raise ValueError("Image dimensions are too large")
+
+                image.load()
+                has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+
+        except (UnidentifiedImageError, PILImage.DecompressionBombError, OSError) as e:
+            raise ValueError(f"Invalid image file: {str(e)}")
+
+        image.thumbnail(LOGO_MAX_PIXELS, PILImage.LANCZOS)
+
+        # Drop an alpha channel that does not make anything transparent
+        if has_alpha and image.getchannel("A").getextrema()[0] == 255:
+            image = image.convert("RGB")
+            has_alpha = False
+
+        output = io.BytesIO()
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            return output.getvalue(), "png"
+
+        image.save(output, format="JPEG", quality=85, optimize=True)
+        return output.getvalue(), "jpg"
+
+    async def store_logo(self, user_id: str, data: bytes) -> str:
+        """
+        Normalize an uploaded logo and store it for a user.
+
+        The file name contains a hash of the normalized image, so a new logo
+        never reuses the path, and with it the cached PDFs, of an old one.
+
+        Args:
+            user_id: ID of the user the logo belongs to
+            data: Uploaded image file
+
+        Returns:
+            Path of the stored logo
+
+        Raises:
+            ValueError: If the upload is too large or not a supported image
+        """
+        if len(data) > self.max_upload_bytes:
+            raise ValueError(f"Logo must not be larger than {self.max_upload_bytes // (1024 * 1024)} MB")
+
+        normalized, extension = await asyncio.to_thread(self.normalize_logo, data)
+        digest = hashlib.sha256(normalized).hexdigest()[:16]
+        logo_path = os.path.join(self.storage_dir, f"{user_id}-{digest}.{extension}")
+
+        os.makedirs(self.storage_dir, exist_ok=True)
+        temp_path = f"{logo_path}.tmp"
+        with open(temp_path, "wb") as logo_file:
+            logo_file.write(normalized)
+        os.replace(temp_path, logo_path)
+
+        logger.info(f"Stored logo for user {user_id} ({len(data)} -> {len(normalized)} bytes)")
+        return logo_path
+
+    def delete_logo(self, logo_path: str) -> None:
+        """Delete a previously stored logo, ignoring files outside the logo storage."""
+        storage_dir = os.path.abspath(self.storage_dir)
+        if os.path.dirname(os.path.abspath(logo_path)) != storage_dir:
+            return
+        try:
+            os.remove(logo_path)
+        except OSError as e:
+            logger.warning(f"Could not delete logo {logo_path}: {str(e)}")
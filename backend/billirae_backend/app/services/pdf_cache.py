@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class PDFCache:
+    """Size-bounded LRU cache of rendered PDFs keyed by a hash of their content."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = settings.PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        # key -> (invoice_id, user_id), used for invalidation on save
+        self._tags: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return a cached PDF and mark it as recently used."""
+        pdf_bytes = self._entries.get(key)
+        if pdf_bytes is not None:
+            self._entries.move_to_end(key)
+        return pdf_bytes
+
+    def put(
+        self,
+        key: str,
+        pdf_bytes: bytes,
+        invoice_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> None:
+        """Store a PDF, evicting least recently used entries above the size limit."""
+        if len(pdf_bytes) > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = pdf_bytes
+        self._tags[key] = (invoice_id, user_id)
+        self._size += len(pdf_bytes)
+
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    async def get_or_render(
+        self,
+        key: str,
+        render: Callable[[], Awaitable[bytes]],
+        invoice_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> bytes:
+        """
+        Return the cached PDF for a key or render it once.
+
+        Concurrent callers asking for a key that is already being rendered
+        wait for that render instead of starting their own.
+
+        Args:
+            key: Content hash of the render payload
+            render: Coroutine function producing the PDF bytes
+            invoice_id: Invoice the PDF belongs to, for invalidation
+            user_id: User the PDF belongs to, for invalidation
+
+        Returns:
+            PDF file as bytes
+        """
+        pdf_bytes = self.get(key)
+        if pdf_bytes is not None:
+            self._hits += 1
+            return pdf_bytes
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+
+            async def render_and_store() -> bytes:
+                pdf_bytes = await render()
+                self.put(key, pdf_bytes, invoice_id=invoice_id, user_id=user_id)
+                return pdf_bytes
+
+            # The render runs as its own task, so a cancelled caller does
+            # not cancel it for everyone else waiting on the same key
+            task = asyncio.ensure_future(render_and_store())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    def invalidate(self, invoice_id: Optional[str] = None, user_id: Optional[str] = None) -> int:
+        """
+        Drop all cached PDFs of an invoice or of a user.
+
+        Args:
+            invoice_id: Invoice whose PDFs should be dropped
+            user_id: User whose PDFs should be dropped
+
+        Returns:
+            Number of dropped entries
+        """
+        keys = [
+            key for key, (tag_invoice_id, tag_user_id) in self._tags.items()
+            if (invoice_id is not None and tag_invoice_id == invoice_id)
+            or (user_id is not None and tag_user_id == user_id)
+        ]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop all cached PDFs."""
+        self._entries.clear()
+        self._tags.clear()
+        self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit statistics of the cache."""
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "evictions": self._evictions,
+            "in_flight": len(self._in_flight),
+        }
+
+    def _remove(self, key: str) -> None:
+        pdf_bytes = self._entries.pop(key, None)
+        if pdf_bytes is not None:
+            self._size -= len(pdf_bytes)
+        self._tags.pop(key, None)
+
+pdf_cache = PDFCache()
@@ -1,25 +1,98 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import io
 import os
+import json
+import hashlib
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
 import logging
 import qrcode
 from datetime import datetime
+from xml.sax.saxutils import escape, unescape
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 from reportlab.platypus.flowables import Flowable
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 from billirae_backend.app.db.models.invoice import InvoiceInDB
 from billirae_backend.app.db.models.user import UserInDB
 from billirae_backend.app.db.models.client import ClientInDB
 from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.render_executor import render_executor
+from billirae_backend.app.services.pdf_cache import pdf_cache
+from billirae_backend.app.services.pdf_storage import pdf_storage, StoredPDF
+from billirae_backend.app.services.letterhead import letterhead_cache
+from billirae_backend.app.services.logo_cache import logo_cache
+from billirae_backend.app.services.font_registry import font_registry
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the rendered layout changes, so cached PDFs are not reused
+LAYOUT_VERSION = "5"
+
+# Registered once per process, the styles below refer to these names
+FONTS = font_registry.register()
+
+# Table styles shared by every render
+SENDER_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+DETAILS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), FONTS.regular),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+ITEMS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), FONTS.regular),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), FONTS.bold),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -4), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, -3), (-1, -1), FONTS.bold),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+    ('LINEABOVE', (0, -3), (-1, -3), 1, colors.black),
+    ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+# Base style of the paged item table of large invoices, the carry-over and
+# totals rows are styled per page by _paged_items_style
+PAGED_ITEMS_STYLE_COMMANDS = [
+    ('FONTNAME', (0, 0), (-1, -1), FONTS.regular),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), FONTS.bold),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+]
+
+ITEMS_HEADER = ["Leistung", "Menge", "Einzelpreis", "MwSt.", "Gesamt"]
+
+QR_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+])
+
+QR_HINT_TEXT = "Scannen Sie diesen QR-Code mit Ihrer Banking-App, um die Zahlung zu tätigen."
+
 class Watermark(Flowable):
     """Custom flowable for adding a watermark to the invoice."""
     
@@ -31,7 +104,7 @@ class Watermark(Flowable):
         
     def draw(self):
         self.canv.saveState()
-        self.canv.setFont("Helvetica-Bold", 72)
+        self.canv.setFont(FONTS.bold, 72)
         self.canv.setFillColor(colors.lightgrey)
         self.canv.setFillAlpha(0.3)  # Transparency
         self.canv.translate(A4[0]/2, A4[1]/2)
@@ -52,11 +125,42 @@ class PageNumberFooter(Flowable):
         page_num = self.canv.getPageNumber()
         text = f"Seite {page_num}"
         self.canv.saveState()
-        self.canv.setFont("Helvetica", 8)
+        self.canv.setFont(FONTS.regular, 8)
         self.canv.setFillColor(colors.black)
         self.canv.drawRightString(self.page_size[0] - 20, 20, text)
         self.canv.restoreState()
 
+class LogoFlowable(Flowable):
+    """Custom flowable for drawing an already decoded company logo."""
+    
+    def __init__(self, image, width=150, height=70):
+        Flowable.__init__(self)
+        self.image = image
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+        
+    def draw(self):
+        self.canv.drawImage(self.image, 0, 0, self.width, self.height, mask='auto')
+
+@lru_cache(maxsize=256)
+def _qr_matrix(data: str) -> Tuple[Tuple[bool, ...], ...]:
+    """
+    Encode a QR payload and return its module matrix, border included.
+    
+    Cached on the payload string, so re-rendering an invoice or a reminder
+    with the same EPC data reuses the encoded matrix.
+    """
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
 class QRCodeFlowable(Flowable):
     """Custom flowable for adding QR codes to the invoice."""
     
@@ -68,21 +172,191 @@ class QRCodeFlowable(Flowable):
         self.height = size
         
     def draw(self):
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+        # Drawn as vector rectangles straight onto the canvas, one per run
+        # of dark modules in a row, so no image file is written or decoded
+        matrix = _qr_matrix(self.data)
+        module = self.size / len(matrix)
+        
+        path = self.canv.beginPath()
+        for row_index, row in enumerate(matrix):
+            y = self.size - (row_index + 1) * module
+            run_start = None
+            for col_index, dark in enumerate(row + (False,)):
+                if dark and run_start is None:
+                    run_start = col_index
+                elif not dark and run_start is not None:
+                    path.rect(run_start * module, y, (col_index - run_start) * module, module)
+                    run_start = None
+        
+        self.canv.saveState()
+        self.canv.setFillColor(colors.black)
+        self.canv.drawPath(path, stroke=0, fill=1)
+        self.canv.restoreState()
+
+def build_epc_qr_data(letterhead: Dict[str, Any], invoice: Dict[str, Any]) -> str:
+    """Build the EPC payment QR payload of an invoice from the render payload."""
+    return (
+        f"{letterhead['epc_prefix']}EUR{invoice['total']}\n\n\n"
+        f"Rechnung {invoice['invoice_number']}"
+    )
+
+def format_item_row(item: Dict[str, Any]) -> List[str]:
+    """Format one invoice item as a row of the item table."""
+    return [
+        item['service'],
+        str(item['quantity']),
+        f"{item['unit_price']:.2f} €",
+        f"{item['tax_rate'] * 100:.0f}%",
+        f"{item['quantity'] * item['unit_price']:.2f} €"
+    ]
+
+def format_totals_rows(invoice: Dict[str, Any]) -> List[List[str]]:
+    """Format the subtotal, tax and total rows below the items as label and amount."""
+    return [
+        ["Zwischensumme:", f"{invoice['subtotal']:.2f} €"],
+        ["MwSt.:", f"{invoice['tax_amount']:.2f} €"],
+        ["Gesamtbetrag:", f"{invoice['total']:.2f} €"],
+    ]
+
+def format_details_rows(invoice: Dict[str, Any], letterhead: Dict[str, Any]) -> List[List[str]]:
+    """Format the invoice date, due date and tax ID rows as label and value."""
+    invoice_date = datetime.fromisoformat(invoice["invoice_date"]).strftime("%d.%m.%Y") if invoice["invoice_date"] else datetime.now().strftime("%d.%m.%Y")
+    due_date = datetime.fromisoformat(invoice["due_date"]).strftime("%d.%m.%Y") if invoice["due_date"] else None
+    
+    return [
+        ["Rechnungsdatum:", invoice_date],
+        ["Fälligkeitsdatum:", due_date or "14 Tage nach Erhalt"],
+    ] + letterhead["tax_rows"]
+
+def format_recipient_markup(client: Dict[str, Any]) -> str:
+    """Format the recipient block as paragraph markup, with the client's texts escaped."""
+    if not client["address"]:
+        return escape(client["name"])
+    return "<br/>".join(escape(str(line)) for line in (
+        client["name"],
+        client["address"]["street"],
+        f"{client['address']['zip']} {client['address']['city']}",
+        client["address"]["country"],
+    ))
+
+def markup_lines(markup: str) -> List[str]:
+    """Split paragraph markup into its lines of plain text."""
+    return [unescape(line) for line in markup.split("<br/>")]
+
+@lru_cache(maxsize=4)
+def _paged_items_style(carried: bool, last: bool) -> TableStyle:
+    """Return the style of one page of the paged item table."""
+    commands = list(PAGED_ITEMS_STYLE_COMMANDS)
+    if carried:
+        commands += [
+            ('FONTNAME', (0, 1), (-1, 1), FONTS.italic),
+            ('LINEBELOW', (0, 1), (-1, 1), 0.5, colors.grey),
+        ]
+    if last:
+        commands += [
+            ('FONTNAME', (0, -3), (-1, -1), FONTS.bold),
+            ('LINEABOVE', (0, -3), (-1, -3), 1, colors.black),
+            ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
+        ]
+    else:
+        commands += [
+            ('FONTNAME', (0, -1), (-1, -1), FONTS.italic),
+            ('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.grey),
+        ]
+    return TableStyle(commands)
+
+class PagedItemTable(Flowable):
+    """
+    Item table for large invoices, built one page at a time.
+    
+    Every page repeats the header row and ends with the running subtotal
+    (Übertrag), which the next page starts with. The last page ends with
+    the invoice totals. Row heights are measured once and summed up front,
+    so the table can be split arithmetically and only the rows of the page
+    being drawn are turned into a ReportLab Table.
+    """
+    
+    def __init__(self, items, totals, col_widths, start=0, carried=0.0, layout=None):
+        Flowable.__init__(self)
+        self.items = items
+        self.totals = totals
+        self.col_widths = col_widths
+        self.start = start
+        self.carried = carried
+        self.width = sum(col_widths)
+        self.height = 0
+        # (header height, single row height, cumulative item row heights),
+        # shared by all pages of the table
+        self._layout = layout
+        
+    def _measure(self):
+        if self._layout is None:
+            sample = Table(
+                [ITEMS_HEADER, ["", "", "", "Übertrag:", "0.00 €"], ["\n", "", "", "", ""]],
+                colWidths=self.col_widths
+            )
+            sample.setStyle(_paged_items_style(False, False))
+            sample.wrap(self.width, 1e6)
+            header_height, row_height, two_line_height = sample._rowHeights
+            leading = two_line_height - row_height
+            
+            offsets = [0.0]
+            for item in self.items:
+                lines = str(item['service']).count("\n")
+                offsets.append(offsets[-1] + row_height + lines * leading)
+            self._layout = (header_height, row_height, offsets)
+        return self._layout
+    
+    def _fixed_height(self, last: bool) -> float:
+        header_height, row_height, _ = self._measure()
+        carried_rows = 1 if self.start else 0
+        closing_rows = 3 if last else 1
+        return header_height + (carried_rows + closing_rows) * row_height
+    
+    def wrap(self, availWidth, availHeight):
+        offsets = self._measure()[2]
+        self.height = self._fixed_height(True) + offsets[-1] - offsets[self.start]
+        return self.width, self.height
+    
+    def split(self, availWidth, availHeight):
+        offsets = self._measure()[2]
+        budget = offsets[self.start] + availHeight - self._fixed_height(False)
+        # The last page needs room for the totals, so never move all rows here
+        end = min(bisect_right(offsets, budget) - 1, len(self.items) - 1)
+        if end <= self.start:
+            return []
+        
+        page, carried = self._page(end, last=False)
+        remainder = PagedItemTable(
+            self.items, self.totals, self.col_widths,
+            start=end, carried=carried, layout=self._layout
         )
-        qr.add_data(self.data)
-        qr.make(fit=True)
+        return [page, remainder]
+    
+    def draw(self):
+        page, _ = self._page(len(self.items), last=True)
+        page.wrapOn(self.canv, self.width, self.height)
+        page.drawOn(self.canv, 0, 0)
+    
+    def _page(self, end: int, last: bool) -> Tuple[Table, float]:
+        """Build the table of rows start to end and return it with the running subtotal."""
+        rows = [ITEMS_HEADER]
+        if self.start:
+            rows.append(["", "", "", "Übertrag:", f"{self.carried:.2f} €"])
         
-        img = qr.make_image(fill_color="black", back_color="white")
-        img_path = "/tmp/qrcode_temp.png"
-        img.save(img_path)
+        carried = self.carried
+        for item in self.items[self.start:end]:
+            rows.append(format_item_row(item))
+            carried += item['quantity'] * item['unit_price']
         
-        self.canv.drawImage(img_path, 0, 0, self.size, self.size)
-        os.remove(img_path)  # Clean up temporary file
+        if last:
+            rows.extend(["", "", "", label, amount] for label, amount in self.totals)
+        else:
+            rows.append(["", "", "", "Übertrag:", f"{carried:.2f} €"])
+        
+        page = Table(rows, colWidths=self.col_widths)
+        page.setStyle(_paged_items_style(bool(self.start), last))
+        return page, carried
 
 class PDFService:
     """Service for generating PDF invoices."""
@@ -91,35 +365,45 @@ class PDFService:
         self.styles = getSampleStyleSheet()
         self.styles.add(ParagraphStyle(
             name='InvoiceTitle',
-            fontName='Helvetica-Bold',
+            fontName=FONTS.bold,
             fontSize=16,
             alignment=1,  # Center
             spaceAfter=12
         ))
         self.styles.add(ParagraphStyle(
             name='InvoiceSubtitle',
-            fontName='Helvetica-Bold',
+            fontName=FONTS.bold,
             fontSize=12,
             spaceAfter=6
         ))
         self.styles.add(ParagraphStyle(
             name='InvoiceInfo',
-            fontName='Helvetica',
+            fontName=FONTS.regular,
             fontSize=10,
             spaceAfter=3
         ))
         self.styles.add(ParagraphStyle(
             name='Footer',
-            fontName='Helvetica',
+            fontName=FONTS.regular,
             fontSize=8,
             alignment=TA_CENTER
         ))
         self.styles.add(ParagraphStyle(
             name='RightAlign',
-            fontName='Helvetica',
+            fontName=FONTS.regular,
             fontSize=10,
             alignment=TA_RIGHT
         ))
+        # Parsed paragraph markup of letterhead texts, which repeat across renders
+        self._fragments: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        
+        # Imported here, the canvas renderer reuses the flowables of this module
+        from billirae_backend.app.services.canvas_renderer import CanvasInvoiceRenderer
+        self._canvas_renderer = CanvasInvoiceRenderer(self.styles)
+    
+    def renderer_stats(self) -> Dict[str, Any]:
+        """Return how often invoices were drawn by the canvas renderer and how often by platypus."""
+        return self._canvas_renderer.stats()
     
     async def generate_invoice_pdf(
         self,
@@ -130,6 +414,11 @@ class PDFService:
         """
         Generate a PDF invoice.
         
+        The ReportLab work runs in the render executor's worker processes,
+        so the event loop stays free while the document is built. Rendered
+        PDFs are cached in memory and kept in the PDF storage by content,
+        so unchanged invoices are rendered once.
+        
         Args:
             invoice: Invoice data
             user: User data (sender)
@@ -140,214 +429,321 @@ class PDFService:
         """
         try:
             logger.info(f"Generating PDF for invoice {invoice.invoice_number}")
-            
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=A4,
-                rightMargin=72,
-                leftMargin=72,
-                topMargin=72,
-                bottomMargin=72,
-                title=f"Rechnung {invoice.invoice_number}",
-                author=user.company_name or f"{user.first_name} {user.last_name}",
-                subject=f"Rechnung für {client.name}"
+            payload = self.build_render_payload(invoice, user, client)
+            render_key = self.render_key(payload)
+            return await pdf_cache.get_or_render(
+                render_key,
+                lambda: self._load_or_render(render_key, payload),
+                invoice_id=invoice.id,
+                user_id=user.id
             )
             
-            content = []
-            
-            if invoice.status == "draft":
-                content.append(Watermark("ENTWURF"))
-                
-            if hasattr(user, 'logo_url') and user.logo_url:
-                try:
-                    logo_path = user.logo_url
-                    if os.path.exists(logo_path):
-                        logo = Image(logo_path, width=150, height=70)
-                        content.append(logo)
-                        content.append(Spacer(1, 12))
-                except Exception as e:
-                    logger.warning(f"Could not load company logo: {str(e)}")
-            
-            content.append(Paragraph(f"Rechnung Nr. {invoice.invoice_number}", self.styles['InvoiceTitle']))
-            content.append(Spacer(1, 12))
-            
-            sender_info = [
-                [Paragraph("Absender:", self.styles['InvoiceSubtitle']), Paragraph("Empfänger:", self.styles['InvoiceSubtitle'])],
-                [
-                    Paragraph(f"{user.company_name or f'{user.first_name} {user.last_name}'}", self.styles['InvoiceInfo']),
-                    Paragraph(f"{client.name}", self.styles['InvoiceInfo'])
-                ]
-            ]
+        except Exception as e:
+            logger.error(f"Error generating PDF for invoice {invoice.invoice_number}: {str(e)}")
+            raise
+    
+    async def get_stored_invoice_pdf(
+        self,
+        invoice: InvoiceInDB,
+        user: UserInDB,
+        client: ClientInDB
+    ) -> StoredPDF:
+        """
+        Get the stored PDF of an invoice, rendering and storing it if needed.
+        
+        Args:
+            invoice: Invoice data
+            user: User data (sender)
+            client: Client data (recipient)
             
-            if hasattr(user, 'address') and user.address:
-                sender_info[1][0] = Paragraph(
-                    f"{user.company_name or f'{user.first_name} {user.last_name}'}<br/>"
-                    f"{user.address.street}<br/>"
-                    f"{user.address.zip} {user.address.city}<br/>"
-                    f"{user.address.country}",
-                    self.styles['InvoiceInfo']
-                )
+        Returns:
+            Handle of the stored PDF
+        """
+        render_key = self.render_key(self.build_render_payload(invoice, user, client))
+        stored = await pdf_storage.get(render_key)
+        if stored is None:
+            pdf_bytes = await self.generate_invoice_pdf(invoice, user, client)
+            # Rendered now, or found in the memory cache and not stored yet
+            stored = await pdf_storage.get(render_key) or await pdf_storage.put(render_key, pdf_bytes)
+        return stored
+    
+    async def _load_or_render(self, render_key: str, payload: Dict[str, Any]) -> bytes:
+        """Read a stored PDF, or render and store it."""
+        stored = await pdf_storage.get(render_key)
+        if stored is not None:
+            try:
+                return await pdf_storage.read(stored)
+            except Exception as e:
+                logger.warning(f"Could not read stored PDF {stored.sha256}, rendering again: {str(e)}")
+        
+        pdf_bytes = await render_executor.render(payload)
+        try:
+            await pdf_storage.put(render_key, pdf_bytes)
+        except Exception as e:
+            logger.warning(f"Could not store rendered PDF: {str(e)}")
+        return pdf_bytes
+    
+    def build_render_payload(
+        self,
+        invoice: InvoiceInDB,
+        user: UserInDB,
+        client: ClientInDB
+    ) -> Dict[str, Any]:
+        """
+        Build the plain render payload for an invoice.
+        
+        The payload only holds built-in types, so it can be pickled and sent
+        to a render worker process.
+        
+        Args:
+            invoice: Invoice data
+            user: User data (sender)
+            client: Client data (recipient)
             
-            if hasattr(client, 'address') and client.address:
-                sender_info[1][1] = Paragraph(
-                    f"{client.name}<br/>"
-                    f"{client.address.street}<br/>"
-                    f"{client.address.zip} {client.address.city}<br/>"
-                    f"{client.address.country}",
-                    self.styles['InvoiceInfo']
-                )
+        Returns:
+            Dictionary with invoice, letterhead and client data
+        """
+        return {
+            "invoice": {
+                "invoice_number": invoice.invoice_number,
+                "invoice_date": invoice.invoice_date.isoformat() if invoice.invoice_date else None,
+                "due_date": invoice.due_date.isoformat() if invoice.due_date else None,
+                # Only drafts look different, sent and paid invoices share their PDF
+                "is_draft": invoice.status == "draft",
+                "items": [item.dict() for item in invoice.items],
+                "subtotal": invoice.subtotal,
+                "tax_amount": invoice.tax_amount,
+                "total": invoice.total,
+                "notes": invoice.notes,
+            },
+            "letterhead": letterhead_cache.get(user),
+            "client": {
+                "name": client.name,
+                "address": client.address.dict() if client.address else None,
+            },
+        }
+    
+    def render_key(self, payload: Dict[str, Any]) -> str:
+        """
+        Compute the content hash of a render payload.
+        
+        Args:
+            payload: Render payload from `build_render_payload`
             
-            sender_recipient_table = Table(sender_info, colWidths=[doc.width/2.0]*2)
-            sender_recipient_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            content.append(sender_recipient_table)
-            content.append(Spacer(1, 24))
+        Returns:
+            Hex SHA-256 digest identifying the rendered document
+        """
+        data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(f"{LAYOUT_VERSION}:{FONTS.fingerprint}:{data}".encode("utf-8")).hexdigest()
+    
+    def build_layout_model(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the layout model of an invoice for previews.
+
+        Lists the blocks of the PDF in order, with the same formatted texts
+        the renderers draw, so the frontend can show the invoice without a
+        PDF being rendered. Nothing is laid out, which keeps this cheap
+        enough to call on every edit.
+
+        Args:
+            payload: Render payload from `build_render_payload`
+
+        Returns:
+            Dictionary with the layout version and the list of blocks
+        """
+        invoice = payload["invoice"]
+        letterhead = payload["letterhead"]
+        client = payload["client"]
+
+        blocks: List[Dict[str, Any]] = []
+        if invoice["is_draft"]:
+            blocks.append({"type": "watermark", "text": "ENTWURF"})
+        if letterhead["logo_path"]:
+            # Only where the logo goes; its path is a file of the server
+            blocks.append({"type": "logo"})
+
+        blocks.append({"type": "title", "text": f"Rechnung Nr. {invoice['invoice_number']}"})
+        blocks.append({
+            "type": "parties",
+            "sender": {"label": "Absender:", "lines": markup_lines(letterhead["sender_markup"])},
+            "recipient": {"label": "Empfänger:", "lines": markup_lines(format_recipient_markup(client))},
+        })
+        blocks.append({"type": "details", "rows": format_details_rows(invoice, letterhead)})
+        blocks.append({
+            "type": "items",
+            "columns": ITEMS_HEADER,
+            "rows": [format_item_row(item) for item in invoice["items"]],
+            "totals": format_totals_rows(invoice),
+            # Paged tables repeat the header and carry subtotals across pages
+            "paged": len(invoice["items"]) >= settings.PDF_LARGE_INVOICE_ITEMS,
+        })
+
+        if letterhead["payment_rows"]:
+            blocks.append({
+                "type": "payment",
+                "label": "Zahlungsinformationen:",
+                "lines": [unescape(row) for row in letterhead["payment_rows"]],
+                "qr_data": build_epc_qr_data(letterhead, invoice),
+                "qr_hint": QR_HINT_TEXT,
+            })
+
+        if invoice["notes"]:
+            blocks.append({"type": "notes", "label": "Anmerkungen:", "text": invoice["notes"]})
+
+        blocks.append({"type": "footer", "text": letterhead["legal_text"]})
+
+        return {
+            "layout_version": LAYOUT_VERSION,
+            "page_format": "A4",
+            "blocks": blocks,
+        }
+
+    def render_invoice_pdf(self, payload: Dict[str, Any]) -> bytes:
+        """
+        Render a PDF invoice from a render payload.
+        
+        This is the synchronous ReportLab part of `generate_invoice_pdf` and
+        is what the render worker processes execute. Invoices that fit on one
+        page are drawn by the canvas renderer, everything else goes through
+        the platypus layout below.
+        
+        Args:
+            payload: Render payload from `build_render_payload`
             
-            invoice_date = invoice.invoice_date.strftime("%d.%m.%Y") if hasattr(invoice, 'invoice_date') else datetime.now().strftime("%d.%m.%Y")
-            due_date = invoice.due_date.strftime("%d.%m.%Y") if hasattr(invoice, 'due_date') and invoice.due_date else None
+        Returns:
+            PDF file as bytes
+        """
+        if settings.PDF_FAST_RENDERER:
+            pdf_bytes = self._canvas_renderer.render(payload)
+            if pdf_bytes is not None:
+                return pdf_bytes
+        
+        invoice = payload["invoice"]
+        letterhead = payload["letterhead"]
+        client = payload["client"]
+        
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            rightMargin=72,
+            leftMargin=72,
+            topMargin=72,
+            bottomMargin=72,
+            title=f"Rechnung {invoice['invoice_number']}",
+            author=letterhead["sender_name"],
+            subject=f"Rechnung für {client['name']}",
+            # Same payload, same bytes: keeps ETags strong across re-renders
+            invariant=1
+        )
+        
+        content = []
+        
+        if invoice["is_draft"]:
+            content.append(Watermark("ENTWURF"))
             
-            invoice_details = [
-                ["Rechnungsdatum:", invoice_date],
-                ["Fälligkeitsdatum:", due_date or "14 Tage nach Erhalt"],
+        if letterhead["logo_path"]:
+            logo = logo_cache.get(letterhead["logo_path"])
+            if logo is not None:
+                content.append(LogoFlowable(logo, width=150, height=70))
+                content.append(Spacer(1, 12))
+        
+        content.append(Paragraph(escape(f"Rechnung Nr. {invoice['invoice_number']}"), self.styles['InvoiceTitle']))
+        content.append(Spacer(1, 12))
+        
+        sender_info = [
+            [self._letterhead_paragraph("Absender:", 'InvoiceSubtitle'), self._letterhead_paragraph("Empfänger:", 'InvoiceSubtitle')],
+            [
+                self._letterhead_paragraph(letterhead["sender_markup"], 'InvoiceInfo'),
+                Paragraph(format_recipient_markup(client), self.styles['InvoiceInfo'])
             ]
+        ]
+        
+        sender_recipient_table = Table(sender_info, colWidths=[doc.width/2.0]*2)
+        sender_recipient_table.setStyle(SENDER_TABLE_STYLE)
+        content.append(sender_recipient_table)
+        content.append(Spacer(1, 24))
+        
+        invoice_details_table = Table(format_details_rows(invoice, letterhead), colWidths=[doc.width/4.0, doc.width*3/4.0])
+        invoice_details_table.setStyle(DETAILS_TABLE_STYLE)
+        content.append(invoice_details_table)
+        content.append(Spacer(1, 24))
+        
+        items_col_widths = [doc.width*0.4, doc.width*0.1, doc.width*0.15, doc.width*0.15, doc.width*0.2]
+        
+        if len(invoice["items"]) >= settings.PDF_LARGE_INVOICE_ITEMS:
+            # Time-tracking exports with thousands of rows: page the table
+            # with carried-over subtotals instead of splitting one huge Table
+            items_table = PagedItemTable(invoice["items"], format_totals_rows(invoice), items_col_widths)
+        else:
+            items_data = [ITEMS_HEADER] + [format_item_row(item) for item in invoice["items"]]
+            items_data.extend(["", "", "", label, amount] for label, amount in format_totals_rows(invoice))
+            
+            items_table = Table(items_data, colWidths=items_col_widths)
+            items_table.setStyle(ITEMS_TABLE_STYLE)
+        content.append(items_table)
+        content.append(Spacer(1, 24))
+        
+        if letterhead["payment_rows"]:
+            payment_info = [[self._letterhead_paragraph("Zahlungsinformationen:", 'InvoiceSubtitle')]]
+            payment_info.extend(
+                [self._letterhead_paragraph(row, 'InvoiceInfo')] for row in letterhead["payment_rows"]
+            )
             
-            if hasattr(user, 'tax_id') and user.tax_id:
-                invoice_details.append(["Steuernummer:", user.tax_id])
-            
-            if hasattr(user, 'vat_id') and user.vat_id:
-                invoice_details.append(["USt-IdNr.:", user.vat_id])
-            
-            invoice_details_table = Table(invoice_details, colWidths=[doc.width/4.0, doc.width*3/4.0])
-            invoice_details_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-            ]))
-            content.append(invoice_details_table)
-            content.append(Spacer(1, 24))
-            
-            items_data = [["Leistung", "Menge", "Einzelpreis", "MwSt.", "Gesamt"]]
-            
-            for item in invoice.items:
-                tax_percent = f"{item.tax_rate * 100:.0f}%"
-                item_total = item.quantity * item.unit_price
-                items_data.append([
-                    item.service,
-                    str(item.quantity),
-                    f"{item.unit_price:.2f} €",
-                    tax_percent,
-                    f"{item_total:.2f} €"
-                ])
-            
-            items_data.append(["", "", "", "Zwischensumme:", f"{invoice.subtotal:.2f} €"])
-            items_data.append(["", "", "", "MwSt.:", f"{invoice.tax_amount:.2f} €"])
-            items_data.append(["", "", "", "Gesamtbetrag:", f"{invoice.total:.2f} €"])
-            
-            items_table = Table(items_data, colWidths=[doc.width*0.4, doc.width*0.1, doc.width*0.15, doc.width*0.15, doc.width*0.2])
-            items_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -4), colors.white),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-                ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
-                ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
-                ('LINEABOVE', (0, -3), (-1, -3), 1, colors.black),
-                ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            content.append(items_table)
-            content.append(Spacer(1, 24))
+            payment_table = Table(payment_info, colWidths=[doc.width])
+            payment_table.setStyle(DETAILS_TABLE_STYLE)
+            content.append(payment_table)
             
-            if hasattr(user, 'bank_details') and user.bank_details:
-                payment_info = [
-                    [Paragraph("Zahlungsinformationen:", self.styles['InvoiceSubtitle'])],
-                    [Paragraph(f"Kontoinhaber: {user.bank_details.account_holder}", self.styles['InvoiceInfo'])],
-                    [Paragraph(f"IBAN: {user.bank_details.iban}", self.styles['InvoiceInfo'])],
+            try:
+                qr_table_data = [
+                    [QRCodeFlowable(build_epc_qr_data(letterhead, invoice)), self._letterhead_paragraph(QR_HINT_TEXT, 'InvoiceInfo')]
                 ]
                 
-                if hasattr(user.bank_details, 'bic') and user.bank_details.bic:
-                    payment_info.append([Paragraph(f"BIC: {user.bank_details.bic}", self.styles['InvoiceInfo'])])
-                
-                if hasattr(user.bank_details, 'bank_name') and user.bank_details.bank_name:
-                    payment_info.append([Paragraph(f"Bank: {user.bank_details.bank_name}", self.styles['InvoiceInfo'])])
-                
-                payment_table = Table(payment_info, colWidths=[doc.width])
-                payment_table.setStyle(TableStyle([
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                    ('TOPPADDING', (0, 0), (-1, -1), 3),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                ]))
-                content.append(payment_table)
-                
-                try:
-                    qr_data = (
-                        f"BCD\n001\n1\nSCT\n{user.bank_details.bic if hasattr(user.bank_details, 'bic') else ''}\n"
-                        f"{user.company_name or f'{user.first_name} {user.last_name}'}\n"
-                        f"{user.bank_details.iban}\nEUR{invoice.total}\n\n\n"
-                        f"Rechnung {invoice.invoice_number}"
-                    )
-                    
-                    qr_table_data = [
-                        [QRCodeFlowable(qr_data), 
-                         Paragraph("Scannen Sie diesen QR-Code mit Ihrer Banking-App, um die Zahlung zu tätigen.", 
-                                  self.styles['InvoiceInfo'])]
-                    ]
-                    
-                    qr_table = Table(qr_table_data, colWidths=[40*mm, doc.width - 40*mm - 10])
-                    qr_table.setStyle(TableStyle([
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('TOPPADDING', (0, 0), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-                    ]))
-                    
-                    content.append(Spacer(1, 12))
-                    content.append(qr_table)
-                except Exception as e:
-                    logger.warning(f"Could not generate payment QR code: {str(e)}")
+                qr_table = Table(qr_table_data, colWidths=[40*mm, doc.width - 40*mm - 10])
+                qr_table.setStyle(QR_TABLE_STYLE)
                 
-                content.append(Spacer(1, 24))
-            
-            if hasattr(invoice, 'notes') and invoice.notes:
-                content.append(Paragraph("Anmerkungen:", self.styles['InvoiceSubtitle']))
-                content.append(Paragraph(invoice.notes, self.styles['InvoiceInfo']))
-                content.append(Spacer(1, 24))
-            
-            legal_text = (
-                "Gemäß § 19 UStG enthält der ausgewiesene Betrag keine Umsatzsteuer. "
-                "Bitte überweisen Sie den Gesamtbetrag bis zum Fälligkeitsdatum. "
-                "Vielen Dank für Ihr Vertrauen."
-            )
-            
-            if hasattr(user, 'is_small_business') and user.is_small_business:
-                legal_text = (
-                    "Gemäß § 19 UStG enthält der ausgewiesene Betrag keine Umsatzsteuer. "
-                    "Bitte überweisen Sie den Gesamtbetrag bis zum Fälligkeitsdatum. "
-                    "Vielen Dank für Ihr Vertrauen."
-                )
-            
-            content.append(Paragraph(legal_text, self.styles['Footer']))
-            
-            content.append(PageNumberFooter())
-            
-            doc.build(content)
-            pdf_bytes = buffer.getvalue()
-            buffer.close()
-            
-            return pdf_bytes
+                content.append(Spacer(1, 12))
+                content.append(qr_table)
+            except Exception as e:
+                logger.warning(f"Could not generate payment QR code: {str(e)}")
             
-        except Exception as e:
-            logger.error(f"Error generating PDF for invoice {invoice.invoice_number}: {str(e)}")
-            raise
+            content.append(Spacer(1, 24))
+        
+        if invoice["notes"]:
+            content.append(Paragraph("Anmerkungen:", self.styles['InvoiceSubtitle']))
+            content.append(Paragraph(escape(invoice["notes"]), self.styles['InvoiceInfo']))
+            content.append(Spacer(1, 24))
+        
+        content.append(self._letterhead_paragraph(letterhead["legal_text"], 'Footer'))
+        
+        content.append(PageNumberFooter())
+        
+        doc.build(content)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        
+        return pdf_bytes
             
+    def _letterhead_paragraph(self, text: str, style_name: str) -> Paragraph:
+        """
+        Create a paragraph for text that repeats across renders.
+        
+        The markup is parsed once per process and the parsed fragments are
+        reused for every later paragraph with the same text and style.
+        """
+        key = (text, style_name)
+        style = self.styles[style_name]
+        fragments = self._fragments.get(key)
+        if fragments is None:
+            paragraph = Paragraph(text, style)
+            self._fragments[key] = paragraph.frags
+            if len(self._fragments) > 512:
+                self._fragments.popitem(last=False)
+            return paragraph
+        
+        self._fragments.move_to_end(key)
+        return Paragraph(text, style, frags=fragments)
+    
     async def generate_invoice_pdf_mock(
         self,
         invoice_data: Dict[str, Any],
@@ -0,0 +1,191 @@
+import os
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, Any, NamedTuple, Optional
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class StoredPDF(NamedTuple):
+    """Handle of a stored PDF blob."""
+    sha256: str
+    size: int
+    path: Optional[str] = None  # Set by backends that keep blobs as local files
+    created_at: Optional[datetime] = None  # When the blob was stored, in UTC; stable for the same bytes
+
+class PDFStorage(ABC):
+    """
+    Persistent storage for rendered invoice PDFs.
+
+    Blobs are addressed by the SHA-256 of their bytes, so identical PDFs are
+    stored once. Render keys (see `PDFService.render_key`) reference the
+    blob they rendered to; since renders are invariant, the same payload
+    always leads to the same blob.
+    """
+
+    def __init__(self):
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._deduplicated = 0
+
+    @abstractmethod
+    async def get(self, render_key: str) -> Optional[StoredPDF]:
+        """Look up the PDF rendered for a render key."""
+
+    @abstractmethod
+    async def put(self, render_key: str, data: bytes) -> StoredPDF:
+        """Store a rendered PDF under its content hash and reference it from the render key."""
+
+    @abstractmethod
+    async def read(self, stored: StoredPDF) -> bytes:
+        """Read a stored PDF into memory."""
+
+    @abstractmethod
+    async def get_blob(self, sha256: str) -> Optional[StoredPDF]:
+        """Look up a stored PDF by its content hash."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup and deduplication counters."""
+        return {
+            "backend": self.__class__.__name__,
+            "hits": self._hits,
+            "misses": self._misses,
+            "stored": self._stored,
+            "deduplicated": self._deduplicated,
+        }
+
+    def _count_lookup(self, stored: Optional[StoredPDF]) -> Optional[StoredPDF]:
+        if stored is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return stored
+
+class LocalPDFStorage(PDFStorage):
+    """PDF storage in a local directory, served with sendfile."""
+
+    def __init__(self, root: Optional[str] = None):
+        super().__init__()
+        self.root = root or settings.PDF_STORAGE_DIR
+
+    async def get(self, render_key: str) -> Optional[StoredPDF]:
+        try:
+            with open(self._ref_path(render_key)) as ref_file:
+                sha256 = ref_file.read().strip()
+            stored = self._stat_blob(sha256)
+        except (OSError, ValueError):
+            stored = None
+        return self._count_lookup(stored)
+
+    async def put(self, render_key: str, data: bytes) -> StoredPDF:
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha256)
+        if os.path.exists(path):
+            self._deduplicated += 1
+        else:
+            await asyncio.to_thread(self._write_atomic, path, data)
+            self._stored += 1
+        self._write_atomic(self._ref_path(render_key), sha256.encode("ascii"))
+        return self._stat_blob(sha256)
+
+    async def read(self, stored: StoredPDF) -> bytes:
+        return await asyncio.to_thread(self._read, stored.path)
+
+    async def get_blob(self, sha256: str) -> Optional[StoredPDF]:
+        try:
+            return self._stat_blob(sha256)
+        except OSError:
+            return None
+
+    def _stat_blob(self, sha256: str) -> StoredPDF:
+        path = self._blob_path(sha256)
+        stat = os.stat(path)
+        # Blobs are never rewritten, so their modification time is their creation time
+        return StoredPDF(sha256, stat.st_size, path, datetime.fromtimestamp(stat.st_mtime, timezone.utc))
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], f"{sha256}.pdf")
+
+    def _ref_path(self, render_key: str) -> str:
+        return os.path.join(self.root, "refs", render_key[:2], render_key)
+
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as pdf_file:
+            return pdf_file.read()
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as output:
+            output.write(data)
+        os.replace(temp_path, path)
+
+class GridFSPDFStorage(PDFStorage):
+    """PDF storage in MongoDB GridFS, for deployments without a shared disk."""
+
+    def __init__(self, bucket_name: str = "pdfs"):
+        super().__init__()
+        self.bucket_name = bucket_name
+
+    async def get(self, render_key: str) -> Optional[StoredPDF]:
+        from billirae_backend.app.db.mongodb import MongoDB
+        ref = await MongoDB.db.pdf_refs.find_one({"_id": render_key})
+        stored = StoredPDF(ref["sha256"], ref["size"], created_at=_utc(ref.get("created_at"))) if ref else None
+        return self._count_lookup(stored)
+
+    async def put(self, render_key: str, data: bytes) -> StoredPDF:
+        from pymongo.errors import DuplicateKeyError
+        from billirae_backend.app.db.mongodb import MongoDB
+        sha256 = hashlib.sha256(data).hexdigest()
+        # The content hash is the file ID, a second upload of the same PDF
+        # fails on the unique index instead of storing a copy
+        blob = await self.get_blob(sha256)
+        if blob is not None:
+            self._deduplicated += 1
+        else:
+            try:
+                await self._bucket().upload_from_stream_with_id(sha256, f"{sha256}.pdf", data)
+                self._stored += 1
+            except DuplicateKeyError:
+                self._deduplicated += 1
+            blob = await self.get_blob(sha256)
+
+        await MongoDB.db.pdf_refs.update_one(
+            {"_id": render_key},
+            {"$set": {"sha256": sha256, "size": len(data), "created_at": blob.created_at if blob else None}},
+            upsert=True
+        )
+        return blob or StoredPDF(sha256, len(data))
+
+    async def read(self, stored: StoredPDF) -> bytes:
+        stream = await self._bucket().open_download_stream(stored.sha256)
+        return await stream.read()
+
+    async def get_blob(self, sha256: str) -> Optional[StoredPDF]:
+        from billirae_backend.app.db.mongodb import MongoDB
+        blob = await MongoDB.db[f"{self.bucket_name}.files"].find_one({"_id": sha256}, {"length": 1, "uploadDate": 1})
+        return StoredPDF(sha256, blob["length"], created_at=_utc(blob.get("uploadDate"))) if blob else None
+
+    def _bucket(self):
+        import motor.motor_asyncio
+        from billirae_backend.app.db.mongodb import MongoDB
+        return motor.motor_asyncio.AsyncIOMotorGridFSBucket(MongoDB.db, bucket_name=self.bucket_name)
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Mark a naive UTC datetime read from MongoDB as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+def create_pdf_storage(backend: Optional[str] = None) -> PDFStorage:
+    """Create the PDF storage configured by PDF_STORAGE_BACKEND."""
+    backend = backend or settings.PDF_STORAGE_BACKEND
+    if backend == "local":
+        return LocalPDFStorage()
+    if backend == "gridfs":
+        return GridFSPDFStorage()
+    raise ValueError(f"Unsupported PDF storage backend: {backend}")
+
+pdf_storage = create_pdf_storage()
@@ -0,0 +1,202 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+from billirae_backend.app.db.models.invoice import InvoiceInDB
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.db.models.client import ClientInDB
+from billirae_backend.app.services.pdf_service import PDFService
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Invoices that are final and likely to be downloaded or sent again
+FINAL_STATUSES = ("sent", "paid", "overdue")
+# Invoices re-rendered after a letterhead change, the still open ones
+OPEN_STATUSES = ("sent", "overdue")
+
+class _Job:
+    """Pending re-render of one invoice."""
+
+    __slots__ = ("invoice", "user", "enqueued_at")
+
+    def __init__(self, invoice: InvoiceInDB, user: Optional[UserInDB], enqueued_at: float):
+        self.invoice = invoice
+        self.user = user
+        self.enqueued_at = enqueued_at
+
+class PrerenderQueue:
+    """
+    Background queue that renders invoice PDFs ahead of the first download.
+
+    Renders go through `PDFService.generate_invoice_pdf`, so their results
+    land in the PDF cache where the download and send endpoints find them.
+    Jobs for the same invoice are coalesced, the latest state wins.
+    """
+
+    def __init__(
+        self,
+        pdf_service: Optional[PDFService] = None,
+        concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None
+    ):
+        self.pdf_service = pdf_service or PDFService()
+        self.concurrency = settings.PDF_PRERENDER_CONCURRENCY if concurrency is None else concurrency
+        self.max_queue = settings.PDF_PRERENDER_QUEUE_SIZE if max_queue is None else max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, _Job] = {}
+        self._workers: List[asyncio.Task] = []
+        self._fan_outs = set()
+        self._in_flight = 0
+        self._enqueued = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._rendered = 0
+        self._failed = 0
+        self._lag_seconds = 0.0
+        self._last_lag_seconds = 0.0
+        self._max_lag_seconds = 0.0
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if self._workers or self.concurrency <= 0:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        logger.info(f"Started PDF pre-rendering with {self.concurrency} workers")
+
+    async def shutdown(self) -> None:
+        """Stop the workers, pending jobs are discarded."""
+        tasks = self._workers + list(self._fan_outs)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._fan_outs.clear()
+        self._pending.clear()
+        self._queue = None
+
+    async def join(self) -> None:
+        """Wait until every queued job has been processed."""
+        while self._fan_outs:
+            await asyncio.gather(*list(self._fan_outs), return_exceptions=True)
+        if self._queue is not None:
+            await self._queue.join()
+
+    def invoice_changed(self, invoice: InvoiceInDB) -> None:
+        """Hook for `InvoiceInDB.save`: re-render final invoices."""
+        if invoice.id and invoice.status in FINAL_STATUSES:
+            self.enqueue(invoice)
+
+    def letterhead_changed(self, user: UserInDB) -> None:
+        """Hook for `UserInDB.save`: re-render the open invoices of a user."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = asyncio.create_task(self._enqueue_open_invoices(user))
+        self._fan_outs.add(task)
+        task.add_done_callback(self._fan_outs.discard)
+
+    def enqueue(self, invoice: InvoiceInDB, user: Optional[UserInDB] = None) -> bool:
+        """
+        Queue a re-render of an invoice.
+
+        Must be called from the event loop; the workers are started on first
+        use. If the queue is full the job is dropped, the PDF is then rendered
+        on demand as before.
+
+        Args:
+            invoice: Invoice in its saved state
+            user: Sender, loaded by the worker if not given
+
+        Returns:
+            False if the job was dropped
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self.start()
+        if self._queue is None:
+            return False
+
+        job = self._pending.get(invoice.id)
+        if job is not None:
+            job.invoice = invoice
+            job.user = user or job.user
+            self._coalesced += 1
+            return True
+
+        try:
+            self._queue.put_nowait(invoice.id)
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning(f"PDF pre-render queue is full, dropped invoice {invoice.id}")
+            return False
+
+        self._pending[invoice.id] = _Job(invoice, user, time.monotonic())
+        self._enqueued += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue length, render lag and job counters."""
+        now = time.monotonic()
+        oldest = min((job.enqueued_at for job in self._pending.values()), default=None)
+        return {
+            "workers": len(self._workers),
+            "queue_length": len(self._pending),
+            "in_flight": self._in_flight,
+            "enqueued": self._enqueued,
+            "coalesced": self._coalesced,
+            "dropped": self._dropped,
+            "rendered": self._rendered,
+            "failed": self._failed,
+            "oldest_pending_ms": round((now - oldest) * 1000, 2) if oldest is not None else 0.0,
+            "last_lag_ms": round(self._last_lag_seconds * 1000, 2),
+            "avg_lag_ms": round(self._lag_seconds / self._rendered * 1000, 2) if self._rendered else 0.0,
+            "max_lag_ms": round(self._max_lag_seconds * 1000, 2),
+        }
+
+    async def _enqueue_open_invoices(self, user: UserInDB) -> None:
+        try:
+            async for invoice in InvoiceInDB.iter_find({"user_id": user.id, "status": {"$in": list(OPEN_STATUSES)}}):
+                if not self.enqueue(invoice, user):
+                    break
+        except Exception as e:
+            logger.warning(f"Could not queue invoices of user {user.id} for pre-rendering: {str(e)}")
+
+    async def _work(self) -> None:
+        while True:
+            invoice_id = await self._queue.get()
+            job = self._pending.pop(invoice_id, None)
+            if job is None:
+                self._queue.task_done()
+                continue
+
+            self._in_flight += 1
+            try:
+                await self._render(job)
+                lag = time.monotonic() - job.enqueued_at
+                self._rendered += 1
+                self._lag_seconds += lag
+                self._last_lag_seconds = lag
+                self._max_lag_seconds = max(self._max_lag_seconds, lag)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed += 1
+                logger.warning(f"Pre-rendering invoice {invoice_id} failed: {str(e)}")
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    async def _render(self, job: _Job) -> None:
+        invoice = job.invoice
+        user = job.user or await UserInDB.get_by_id(invoice.user_id)
+        client = await ClientInDB.get_by_id(invoice.client_id)
+        if not user or not client:
+            raise ValueError("user or client not found")
+        await self.pdf_service.generate_invoice_pdf(invoice, user, client)
+
+prerender_queue = PrerenderQueue()
@@ -0,0 +1,300 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Any, Optional, Tuple
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# PDFService instance of the current render worker, created by _init_worker
+_worker_service = None
+
+# Queue a render worker reports the start of each render to, so the pool
+# can time renders from when they start instead of from when they queued
+_started_queue = None
+
+# ReportLab keeps per-document state in the process-wide fonts and the
+# service caches parsed letterheads, so renders of one process run one at a
+# time. Only renders on threads (PDF_RENDER_WORKERS=0) ever wait for it.
+_render_lock = threading.Lock()
+
+def _init_worker(started_queue=None) -> None:
+    """Warm up a render worker by importing ReportLab, registering the fonts and building the styles once."""
+    global _worker_service, _started_queue
+    from billirae_backend.app.services.pdf_service import PDFService
+    _started_queue = started_queue
+    _worker_service = PDFService()
+
+def _warmup() -> int:
+    """No-op task used to make sure every worker process has been started."""
+    return os.getpid()
+
+def _render_in_worker(
+    payload: Dict[str, Any],
+    task_id: Optional[int] = None,
+    on_start: Optional[Callable[[int, float], None]] = None
+) -> Tuple[bytes, float, float, Dict[str, Any]]:
+    """
+    Render a payload inside a worker and report when and how long it ran.
+
+    The start is reported as soon as the render begins, to `on_start` on a
+    thread and through the started queue in a worker process.
+    """
+    from billirae_backend.app.services.logo_cache import logo_cache
+    from billirae_backend.app.services.font_registry import font_registry
+    with _render_lock:
+        if _worker_service is None:
+            _init_worker()
+        started_at = time.time()
+        if on_start is not None:
+            on_start(os.getpid(), started_at)
+        elif _started_queue is not None:
+            _started_queue.put((task_id, os.getpid(), started_at))
+        start = time.perf_counter()
+        pdf_bytes = _worker_service.render_invoice_pdf(payload)
+        render_seconds = time.perf_counter() - start
+        worker_stats = {
+            "pid": os.getpid(),
+            "logo_cache": logo_cache.stats(),
+            "font_subsets": font_registry.stats(),
+            "fast_renderer": _worker_service.renderer_stats(),
+        }
+    return pdf_bytes, started_at, render_seconds, worker_stats
+
+def _resolve(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+class RenderExecutor:
+    """
+    Pool of warm worker processes that render invoice PDFs off the event loop.
+
+    PDF_RENDER_TIMEOUT limits how long a render runs, counted from when a
+    worker starts it; time spent queued behind other renders is not
+    counted. A worker whose render times out is killed and the pool
+    replaced, so a hung render does not keep blocking the renders queued
+    behind it. Renders the old pool had not finished are retried once on
+    the new one.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_workers = settings.PDF_RENDER_WORKERS if max_workers is None else max_workers
+        self.timeout = settings.PDF_RENDER_TIMEOUT if timeout is None else timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._started_queue = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._task_ids = itertools.count()
+        # Task ID -> future resolved with (pid, start time) when a worker starts the render
+        self._starting: Dict[int, asyncio.Future] = {}
+        self._pending = 0
+        self._renders = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._recycles = 0
+        self._render_seconds = 0.0
+        self._wait_seconds = 0.0
+        self._last_render_seconds = 0.0
+        self._max_render_seconds = 0.0
+        # Latest cache statistics reported by each worker process
+        self._worker_stats: Dict[int, Dict[str, Any]] = {}
+
+    async def start(self) -> None:
+        """Start the worker processes and wait until all of them are warm."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._executor is not None or self.max_workers <= 0:
+                return
+
+            logger.info(f"Starting PDF render pool with {self.max_workers} workers")
+            context = multiprocessing.get_context("spawn")
+            loop = asyncio.get_running_loop()
+            self._started_queue = context.Queue()
+            threading.Thread(
+                target=self._read_starts, args=(self._started_queue, loop), daemon=True
+            ).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._started_queue,)
+            )
+            await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _warmup)
+                for _ in range(self.max_workers)
+            ])
+            logger.info("PDF render pool started")
+
+    async def shutdown(self) -> None:
+        """Stop the worker processes, cancelling renders that have not started yet."""
+        executor, self._executor = self._executor, None
+        self._stop_reading_starts()
+        if executor is not None:
+            logger.info("Shutting down PDF render pool...")
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+            logger.info("PDF render pool shut down")
+
+    async def render(self, payload: Dict[str, Any]) -> bytes:
+        """
+        Render a PDF in the worker pool.
+
+        With PDF_RENDER_WORKERS set to 0 the render runs in a thread of the
+        current process instead, which is convenient for scripts and tests.
+        Such renders run one at a time, as ReportLab's font state is shared.
+
+        Args:
+            payload: Render payload from `PDFService.build_render_payload`
+
+        Returns:
+            PDF file as bytes
+
+        Raises:
+            TimeoutError: If the render runs longer than PDF_RENDER_TIMEOUT
+        """
+        submitted_at = time.time()
+        self._pending += 1
+        try:
+            # A render is retried once if its pool was recycled under it
+            for attempt in range(2):
+                if self._executor is None and self.max_workers > 0:
+                    await self.start()
+                executor = self._executor
+                try:
+                    pdf_bytes, started_at, render_seconds, worker_stats = await self._run(executor, payload)
+                    break
+                except BrokenProcessPool:
+                    if executor is self._executor:
+                        logger.error("PDF render pool is broken, restarting it on the next render")
+                        self._executor = None
+                        self._stop_reading_starts()
+                        raise
+                    if attempt:
+                        raise
+                    logger.info("Retrying a PDF render of a recycled render pool")
+
+        except TimeoutError:
+            raise
+
+        except Exception:
+            self._failures += 1
+            raise
+
+        finally:
+            self._pending -= 1
+
+        self._renders += 1
+        self._render_seconds += render_seconds
+        self._wait_seconds += max(0.0, started_at - submitted_at)
+        self._last_render_seconds = render_seconds
+        self._max_render_seconds = max(self._max_render_seconds, render_seconds)
+        self._worker_stats[worker_stats["pid"]] = worker_stats
+        return pdf_bytes
+
+    async def _run(
+        self,
+        executor: Optional[ProcessPoolExecutor],
+        payload: Dict[str, Any]
+    ) -> Tuple[bytes, float, float, Dict[str, Any]]:
+        """Run one render, waiting for it up to PDF_RENDER_TIMEOUT from when it starts."""
+        loop = asyncio.get_running_loop()
+        task_id = next(self._task_ids)
+        started = self._starting[task_id] = loop.create_future()
+        if executor is None:
+            def on_start(pid: int, started_at: float) -> None:
+                loop.call_soon_threadsafe(_resolve, started, (pid, started_at))
+            future = asyncio.ensure_future(asyncio.to_thread(_render_in_worker, payload, task_id, on_start))
+        else:
+            future = loop.run_in_executor(executor, _render_in_worker, payload, task_id)
+
+        try:
+            await asyncio.wait({started, future}, return_when=asyncio.FIRST_COMPLETED)
+            if not future.done():
+                pid, started_at = started.result()
+                remaining = self.timeout - (time.time() - started_at)
+                done, _ = await asyncio.wait({future}, timeout=max(0.0, remaining))
+                if not done:
+                    self._timeouts += 1
+                    # Nobody waits for the render any more
+                    future.add_done_callback(lambda done_future: done_future.cancelled() or done_future.exception())
+                    if executor is None:
+                        logger.error(f"PDF render ran longer than {self.timeout} seconds, its thread stays busy until it ends")
+                    else:
+                        logger.error(f"PDF render ran longer than {self.timeout} seconds, recycling the render pool")
+                        self._recycle(executor, pid)
+                    raise TimeoutError(f"PDF render ran longer than {self.timeout} seconds")
+            return future.result()
+        finally:
+            self._starting.pop(task_id, None)
+            if not started.done():
+                started.cancel()
+
+    def _recycle(self, executor: ProcessPoolExecutor, pid: int) -> None:
+        """Kill the worker of a hung render; its pool breaks and is replaced on the next render."""
+        self._recycles += 1
+        if self._executor is executor:
+            self._executor = None
+            self._stop_reading_starts()
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        # Reaps the remaining workers once the pool notices the dead one
+        threading.Thread(target=executor.shutdown, kwargs={"wait": True}, daemon=True).start()
+
+    def _read_starts(self, started_queue, loop: asyncio.AbstractEventLoop) -> None:
+        """Hand the start reports of the workers to the waiting renders, until None is read."""
+        for task_id, pid, started_at in iter(started_queue.get, None):
+            future = self._starting.get(task_id)
+            if future is None:
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, future, (pid, started_at))
+            except RuntimeError:
+                # The event loop is closed
+                return
+
+    def _stop_reading_starts(self) -> None:
+        started_queue, self._started_queue = self._started_queue, None
+        if started_queue is not None:
+            started_queue.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, render timing and worker cache statistics of the pool."""
+        logo_cache_stats = {"hits": 0, "misses": 0, "entries": 0, "size_bytes": 0}
+        font_subset_stats = {"hits": 0, "misses": 0, "entries": 0, "size_bytes": 0}
+        fast_renderer_stats = {"renders": 0, "fallbacks": 0}
+        for worker_stats in self._worker_stats.values():
+            for name in logo_cache_stats:
+                logo_cache_stats[name] += worker_stats["logo_cache"][name]
+                font_subset_stats[name] += worker_stats["font_subsets"][name]
+            for name in fast_renderer_stats:
+                fast_renderer_stats[name] += worker_stats["fast_renderer"][name]
+        attempts = fast_renderer_stats["renders"] + fast_renderer_stats["fallbacks"]
+        fast_renderer_stats["fallback_rate"] = round(fast_renderer_stats["fallbacks"] / attempts, 3) if attempts else 0.0
+
+        return {
+            "workers": self.max_workers,
+            "running": self._executor is not None,
+            "pending": self._pending,
+            "queue_depth": max(0, self._pending - max(self.max_workers, 1)),
+            "renders": self._renders,
+            "failures": self._failures,
+            "timeouts": self._timeouts,
+            "recycles": self._recycles,
+            "last_render_ms": round(self._last_render_seconds * 1000, 2),
+            "avg_render_ms": round(self._render_seconds / self._renders * 1000, 2) if self._renders else 0.0,
+            "max_render_ms": round(self._max_render_seconds * 1000, 2),
+            "avg_queue_wait_ms": round(self._wait_seconds / self._renders * 1000, 2) if self._renders else 0.0,
+            "logo_cache": logo_cache_stats,
+            "font_subsets": font_subset_stats,
+            "fast_renderer": fast_renderer_stats,
+        }
+
+render_executor = RenderExecutor()
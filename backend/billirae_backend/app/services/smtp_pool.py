@@ -0,0 +1,204 @@
+import ssl
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from email.message import Message
+from typing import Deque, Dict, Any, List, Optional, Tuple
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class _PooledConnection:
+    """Authenticated SMTP session with its usage counters."""
+
+    def __init__(self, client):
+        self.client = client
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+class _ServerPool:
+    """Idle sessions and the connection limit of one SMTP server and account."""
+
+    def __init__(self, max_connections: int):
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.idle: Deque[_PooledConnection] = deque()
+        self.open = 0
+
+class SMTPConnectionPool:
+    """
+    Pool of authenticated SMTP sessions, shared by all emails of the process.
+
+    Sessions are kept open after a message and reused by the next one, so a
+    batch of emails pays the TLS handshake and login once per connection
+    instead of once per message. Each server is limited to SMTP_POOL_SIZE
+    concurrent connections, further senders wait for a free one. Sessions
+    idle for longer than SMTP_POOL_IDLE_TIMEOUT or used for
+    SMTP_POOL_MAX_MESSAGES messages are closed, and a message whose session
+    turns out to be disconnected is sent again on a new one.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        max_messages: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self.max_connections = max(1, settings.SMTP_POOL_SIZE if max_connections is None else max_connections)
+        self.idle_timeout = settings.SMTP_POOL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_messages = settings.SMTP_POOL_MAX_MESSAGES if max_messages is None else max_messages
+        self.timeout = settings.SMTP_TIMEOUT if timeout is None else timeout
+        # (host, port, username) -> pool of that server and account
+        self._pools: Dict[Tuple[str, int, str], _ServerPool] = {}
+        self._tls_context: Optional[ssl.SSLContext] = None
+        self._sent = 0
+        self._failures = 0
+        self._connects = 0
+        self._reused = 0
+        self._reconnects = 0
+
+    async def send(
+        self,
+        message: Message,
+        sender: str,
+        recipients: List[str],
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None
+    ) -> None:
+        """
+        Send a message over a pooled session.
+
+        Args:
+            message: Email message to send
+            sender: Envelope sender
+            recipients: Envelope recipients, including CC addresses
+            host: SMTP server, SMTP_SERVER by default
+            port: SMTP port, SMTP_PORT by default. Port 465 uses implicit TLS, others STARTTLS
+            username: SMTP login, SMTP_USERNAME by default. Empty skips the login
+            password: SMTP password, SMTP_PASSWORD by default
+
+        Raises:
+            aiosmtplib.SMTPException: If the server rejected the message or was unreachable
+        """
+        import aiosmtplib
+
+        # Sessions closed by the server fail before it accepted the message, so it is sent again
+        reconnect_errors = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError)
+        server = (
+            host or settings.SMTP_SERVER,
+            port or settings.SMTP_PORT,
+            settings.SMTP_USERNAME if username is None else username,
+        )
+        password = settings.SMTP_PASSWORD if password is None else password
+
+        for attempt in range(2):
+            try:
+                async with self._connection(server, password) as connection:
+                    try:
+                        await connection.client.send_message(message, sender=sender, recipients=recipients)
+                    except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+                        # Rejected by the server, which reset the envelope; the session stays usable
+                        raise
+                    except Exception:
+                        connection.messages = -1  # Do not return the session to the pool
+                        raise
+                    connection.messages += 1
+            except Exception as e:
+                if attempt == 0 and isinstance(e, reconnect_errors):
+                    self._reconnects += 1
+                    logger.info(f"SMTP connection to {server[0]} failed, reconnecting: {str(e)}")
+                    continue
+                self._failures += 1
+                raise
+            self._sent += 1
+            return
+
+    async def close(self) -> None:
+        """Close all idle sessions."""
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while pool.idle:
+                await self._disconnect(pool, pool.idle.popleft())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return connection statistics of the pool."""
+        return {
+            "max_connections": self.max_connections,
+            "open": sum(pool.open for pool in self._pools.values()),
+            "idle": sum(len(pool.idle) for pool in self._pools.values()),
+            "sent": self._sent,
+            "failures": self._failures,
+            "connects": self._connects,
+            "reused": self._reused,
+            "reconnects": self._reconnects,
+        }
+
+    @asynccontextmanager
+    async def _connection(self, server: Tuple[str, int, str], password: str):
+        """Lend a session of a server, opening one if no idle session is usable."""
+        pool = self._pools.get(server)
+        if pool is None:
+            pool = self._pools[server] = _ServerPool(self.max_connections)
+
+        async with pool.semaphore:
+            connection = None
+            while pool.idle:
+                candidate = pool.idle.pop()
+                if candidate.client.is_connected and time.monotonic() - candidate.last_used < self.idle_timeout:
+                    connection = candidate
+                    self._reused += 1
+                    break
+                await self._disconnect(pool, candidate)
+
+            if connection is None:
+                connection = await self._connect(pool, server, password)
+
+            try:
+                yield connection
+            finally:
+                connection.last_used = time.monotonic()
+                if 0 <= connection.messages < self.max_messages and connection.client.is_connected \
+                        and self._pools.get(server) is pool:
+                    pool.idle.append(connection)
+                else:
+                    await self._disconnect(pool, connection)
+
+    async def _connect(self, pool: _ServerPool, server: Tuple[str, int, str], password: str) -> _PooledConnection:
+        import aiosmtplib
+
+        host, port, username = server
+        if self._tls_context is None:
+            self._tls_context = ssl.create_default_context()
+
+        client = aiosmtplib.SMTP(
+            hostname=host,
+            port=port,
+            use_tls=port == 465,
+            tls_context=self._tls_context,
+            timeout=self.timeout
+        )
+        await client.connect()
+        pool.open += 1
+        self._connects += 1
+        try:
+            if username:
+                await client.login(username, password)
+        except Exception:
+            await self._disconnect(pool, _PooledConnection(client))
+            raise
+        logger.info(f"Opened SMTP session to {host}:{port}")
+        return _PooledConnection(client)
+
+    async def _disconnect(self, pool: _ServerPool, connection: _PooledConnection) -> None:
+        pool.open -= 1
+        try:
+            if connection.client.is_connected:
+                await connection.client.quit()
+        except Exception:
+            connection.client.close()
+
+smtp_pool = SMTPConnectionPool()
@@ -0,0 +1,200 @@
+import re
+import copy
+import time
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+from billirae_backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def audio_digest(audio_file_path: str) -> str:
+    """SHA-256 of the content of an audio file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(audio_file_path, "rb") as audio_file:
+        for chunk in iter(lambda: audio_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_transcript(text: str) -> str:
+    """
+    Normalize a transcript for cache lookups.
+
+    Case, Unicode composition, whitespace and punctuation at the ends are
+    ignored, so "Drei Massagen à 80 Euro." and "drei massagen  à 80 euro"
+    share a parse. Punctuation within the text, like decimal commas, is kept.
+    """
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .,;:!?")
+
+class VoiceCache:
+    """
+    Two-level cache of Whisper transcripts and GPT parses.
+
+    Transcripts are keyed by the SHA-256 of the audio, so a retried upload
+    is not transcribed again. Parses are keyed by the normalized transcript
+    and the current date, since relative dates like "heute" resolve
+    against it. Entries expire after VOICE_TRANSCRIPT_CACHE_TTL and
+    VOICE_PARSE_CACHE_TTL. The first level is an in-process LRU of
+    VOICE_CACHE_MAX_ENTRIES; with VOICE_CACHE_SHARED, a MongoDB collection
+    with a TTL index is the second level, shared by all workers. Concurrent
+    lookups of the same missing key wait for a single API call.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        transcript_ttl: Optional[float] = None,
+        parse_ttl: Optional[float] = None,
+        shared: Optional[bool] = None
+    ):
+        self.max_entries = settings.VOICE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.transcript_ttl = settings.VOICE_TRANSCRIPT_CACHE_TTL if transcript_ttl is None else transcript_ttl
+        self.parse_ttl = settings.VOICE_PARSE_CACHE_TTL if parse_ttl is None else parse_ttl
+        self.shared = settings.VOICE_CACHE_SHARED if shared is None else shared
+        # key -> (expiry as monotonic time, value)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._indexed = False
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    async def get_transcript(self, audio_file_path: str, transcribe: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached transcript of an audio file or transcribe it once.
+
+        Args:
+            audio_file_path: Path to the audio file
+            transcribe: Coroutine function calling Whisper
+
+        Returns:
+            Transcript of the audio
+        """
+        digest = await asyncio.to_thread(audio_digest, audio_file_path)
+        return await self._get_or_compute(f"transcript:{digest}", transcribe, self.transcript_ttl)
+
+    async def get_parse(
+        self,
+        text: str,
+        parse: Callable[[], Awaitable[Dict[str, Any]]],
+        today: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """
+        Return the cached parse of a transcript or parse it once.
+
+        Args:
+            text: Transcript of the voice input
+            parse: Coroutine function calling GPT
+            today: Date relative dates resolve against, today by default
+
+        Returns:
+            Structured invoice data, a copy the caller may change
+        """
+        today = today or date.today()
+        digest = hashlib.sha256(normalize_transcript(text).encode("utf-8")).hexdigest()
+        return await self._get_or_compute(f"parse:{today.isoformat()}:{digest}", parse, self.parse_ttl)
+
+    def clear(self) -> None:
+        """Drop all entries of the in-process level."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit statistics of the cache."""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "shared": self.shared,
+            "hits": self._hits,
+            "shared_hits": self._shared_hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "evictions": self._evictions,
+            "in_flight": len(self._in_flight),
+        }
+
+    async def _get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return copy.deepcopy(entry[1])
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            async def lookup_or_compute() -> Any:
+                value, remaining = await self._shared_get(key)
+                if remaining:
+                    self._shared_hits += 1
+                else:
+                    self._misses += 1
+                    value, remaining = await compute(), ttl
+                    await self._shared_put(key, value, ttl)
+                self._put(key, value, remaining)
+                return value
+
+            # The lookup runs as its own task, so a cancelled caller does
+            # not cancel the API call for everyone else waiting on the key
+            task = asyncio.ensure_future(lookup_or_compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _put(self, key: str, value: Any, ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    async def _shared_get(self, key: str) -> Tuple[Any, float]:
+        """Look a key up in MongoDB; returns the value and its remaining TTL, which is 0 on a miss."""
+        from billirae_backend.app.db.mongodb import MongoDB
+        if not self.shared or MongoDB.db is None:
+            return None, 0.0
+        try:
+            entry = await MongoDB.db.voice_cache.find_one({"_id": key})
+        except Exception as e:
+            logger.warning(f"Could not read the shared voice cache: {str(e)}")
+            return None, 0.0
+        # The TTL monitor deletes expired entries only once a minute
+        remaining = (entry["expires_at"] - _utcnow()).total_seconds() if entry else 0.0
+        if remaining <= 0:
+            return None, 0.0
+        return entry["value"], remaining
+
+    async def _shared_put(self, key: str, value: Any, ttl: float) -> None:
+        from billirae_backend.app.db.mongodb import MongoDB
+        if not self.shared or MongoDB.db is None:
+            return
+        try:
+            if not self._indexed:
+                await MongoDB.db.voice_cache.create_index("expires_at", expireAfterSeconds=0)
+                self._indexed = True
+            await MongoDB.db.voice_cache.update_one(
+                {"_id": key},
+                {"$set": {"value": value, "expires_at": _utcnow() + timedelta(seconds=ttl)}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not write the shared voice cache: {str(e)}")
+
+def _utcnow() -> datetime:
+    """Naive UTC time, as the TTL index and the MongoDB driver handle it."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+voice_cache = VoiceCache()
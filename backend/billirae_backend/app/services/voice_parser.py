@@ -0,0 +1,267 @@
+import re
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+# "<Anzahl> <Leistung> à <Preis> Euro für <Kunde>, <Datum>, <Steuer>"
+UTTERANCE_PATTERN = re.compile(
+    r"""^\s*
+    (?P<quantity>\d+|[a-zäöüß]+)\s*(?:x\s+|mal\s+)?
+    (?P<service>.+?)\s+
+    (?:à|á|a|zu\s+je|für\s+je|je|zu)\s+
+    (?P<price>\d[\d.]*(?:,\d{1,2})?|[a-zäöüß]+)\s*(?:euro|eur|€)
+    (?:\s+(?:pro|je)\s+\w+)?
+    \s+für\s+
+    (?P<rest>.+?)
+    [\s.!]*$""",
+    re.IGNORECASE | re.VERBOSE
+)
+
+NUMBER_WORDS = {
+    "null": 0, "ein": 1, "eins": 1, "eine": 1, "einen": 1, "einer": 1, "einem": 1,
+    "zwei": 2, "drei": 3, "vier": 4, "fünf": 5, "sechs": 6, "sieben": 7, "acht": 8, "neun": 9,
+    "zehn": 10, "elf": 11, "zwölf": 12, "dreizehn": 13, "vierzehn": 14, "fünfzehn": 15,
+    "sechzehn": 16, "siebzehn": 17, "achtzehn": 18, "neunzehn": 19,
+    "zwanzig": 20, "dreißig": 30, "vierzig": 40, "fünfzig": 50,
+    "sechzig": 60, "siebzig": 70, "achtzig": 80, "neunzig": 90,
+}
+
+WEEKDAYS = ["montag", "dienstag", "mittwoch", "donnerstag", "freitag", "samstag", "sonntag"]
+MONTHS = ["januar", "februar", "märz", "april", "mai", "juni", "juli", "august",
+          "september", "oktober", "november", "dezember"]
+RELATIVE_DAYS = {"vorgestern": -2, "gestern": -1, "heute": 0, "morgen": 1}
+
+DATE_PATTERNS = [
+    re.compile(r"\b(?P<relative>vorgestern|gestern|heute|morgen)\b"),
+    re.compile(r"\b(?:letzten|letzter|vergangenen|vergangener)\s+(?P<weekday>" + "|".join(WEEKDAYS) + r")\b"),
+    re.compile(r"(?:\b(?:am|vom)\s+)?\b(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4}|\d{2})?"),
+    re.compile(r"(?:\b(?:am|vom)\s+)?\b(?P<day>\d{1,2})\.?\s+(?P<month_name>" + "|".join(MONTHS) + r")\b(?:\s+(?P<year>\d{4}))?"),
+]
+
+TAX_WORD = r"(?:mehrwertsteuer|mwst\.?|umsatzsteuer|ust\.?)"
+TAX_RATE = r"(?:(?P<rate>\d{1,2})\s*(?:%|prozent)\s+)?"
+TAX_PHRASE = TAX_RATE + r"(?:der\s+)?(?:gesetzliche[nr]?\s+)?" + TAX_WORD
+# (pattern, tax rate when the phrase names none, confidence penalty, whether
+# the price includes the tax)
+TAX_PATTERNS = [
+    (re.compile(r"\b(?:inklusive|inkl\.?)\s+" + TAX_PHRASE), 0.19, 0.0, True),
+    (re.compile(r"\b(?:zuzüglich|zzgl\.?|plus|exklusive|exkl\.?)\s+" + TAX_PHRASE), 0.19, 0.0, False),
+    # "mit" names a price with or without the tax, GPT is asked if nothing else is off
+    (re.compile(r"\bmit\s+" + TAX_PHRASE), 0.19, 0.3, False),
+    (re.compile(r"\b(?P<rate>\d{1,2})\s*(?:%|prozent)\s+" + TAX_WORD), 0.19, 0.0, False),
+    (re.compile(r"\berm(?:ä|ae)ßigte[nr]?\s+(?:steuersatz|" + TAX_WORD + r")"), 0.07, 0.0, False),
+    (re.compile(r"\b(?:umsatz)?steuerfrei\b|\bkleinunternehmer\w*"), 0.0, 0.0, False),
+    # Either a net price or no tax at all
+    (re.compile(r"\bohne\s+" + TAX_WORD), 0.0, 0.3, False),
+]
+
+# Words that may stand between the recognized phrases
+FILLER_WORDS = {"und", "bitte", "datum", "rechnungsdatum", "am", "vom", "danke"}
+
+# Plural services whose singular ends in "-e", which no suffix rule can tell
+# apart from plurals like "Fahrten" or "Lektionen"
+PLURAL_SERVICES = {
+    "massagen": "massage",
+    "stunden": "stunde",
+    "pauschalen": "pauschale",
+    "behandlungsstunden": "behandlungsstunde",
+    "nachhilfestunden": "nachhilfestunde",
+    "reisen": "reise",
+    "analysen": "analyse",
+    "gebühren": "gebühr",
+    "fahrten": "fahrt",
+    "lektionen": "lektion",
+}
+
+# Units a quantity may count ahead of the service, as in "zwei Stunden Beratung"
+UNIT_WORDS = {
+    "stunde", "stunden", "std", "minute", "minuten", "tag", "tage", "einheit", "einheiten",
+    "sitzung", "sitzungen", "termin", "termine", "stück", "stk",
+}
+
+def parse_number(value: str) -> Optional[float]:
+    """
+    Parse a spoken or written German number.
+
+    Handles digits with decimal commas and thousands dots ("1.200,50") and
+    number words up to the thousands ("dreihundertfünfundzwanzig").
+
+    Returns:
+        The number, or None if the value is not a number
+    """
+    value = value.strip().lower()
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?", value):
+        return float(value.replace(".", "").replace(",", "."))
+    if re.fullmatch(r"\d+\.\d{1,2}", value):
+        return float(value)
+    number = _parse_number_word(value.replace("dreissig", "dreißig"))
+    return float(number) if number is not None else None
+
+def _parse_number_word(word: str) -> Optional[int]:
+    if not word:
+        return None
+    if word in NUMBER_WORDS:
+        return NUMBER_WORDS[word]
+    for name, factor in (("tausend", 1000), ("hundert", 100)):
+        if name in word:
+            left, right = word.split(name, 1)
+            multiplier = _parse_number_word(left) if left else 1
+            remainder = _parse_number_word(right[3:] if right.startswith("und") else right) if right else 0
+            if multiplier is None or remainder is None or remainder >= factor:
+                return None
+            return multiplier * factor + remainder
+    if "und" in word:
+        # "fünfundzwanzig": units, "und", tens
+        units, tens = word.split("und", 1)
+        units, tens = _parse_number_word(units), NUMBER_WORDS.get(tens)
+        if units is not None and 1 <= units <= 9 and tens is not None and tens >= 20 and tens % 10 == 0:
+            return tens + units
+    return None
+
+def drop_unit(service: str) -> str:
+    """Drop a unit the quantity counts from the start of a service ("Stunden Beratung" -> "Beratung")."""
+    words = service.split(None, 1)
+    if len(words) == 2 and words[0].lower().rstrip(".") in UNIT_WORDS:
+        return words[1]
+    return service
+
+def singular_service(service: str) -> str:
+    """Reduce a one-word plural service ("Massagen") to its singular, as invoice items name it."""
+    if " " in service:
+        return service
+    if service.lower() in PLURAL_SERVICES:
+        return service[:1] + PLURAL_SERVICES[service.lower()][1:]
+    for plural, singular in (("ungen", "ung"), ("heiten", "heit"), ("keiten", "keit"), ("innen", "in")):
+        if service.endswith(plural):
+            return service[:-len(plural)] + singular
+    return service
+
+def _match_date(text: str, today: date) -> Tuple[Optional[date], Optional[Tuple[int, int]]]:
+    """
+    Find the first date phrase; returns the date and the span of the phrase.
+
+    A phrase shaped like a date that is not one, like "31.2.", is returned
+    with no date, so it is neither taken as today nor as part of the client.
+    """
+    for pattern in DATE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        groups = match.groupdict()
+        try:
+            if groups.get("relative"):
+                found = today + timedelta(days=RELATIVE_DAYS[groups["relative"]])
+            elif groups.get("weekday"):
+                # The last such weekday before today, a week ago if it is today
+                days_back = (today.weekday() - WEEKDAYS.index(groups["weekday"])) % 7 or 7
+                found = today - timedelta(days=days_back)
+            else:
+                month = int(groups["month"]) if groups.get("month") else MONTHS.index(groups["month_name"]) + 1
+                year = int(groups["year"]) if groups.get("year") else today.year
+                found = date(year + 2000 if year < 100 else year, month, int(groups["day"]))
+        except ValueError:
+            return None, match.span()
+        return found, match.span()
+    return None, None
+
+def _match_tax(text: str) -> Tuple[Optional[float], float, bool, Optional[Tuple[int, int]]]:
+    """
+    Find the first tax phrase.
+
+    Returns:
+        The tax rate, a confidence penalty, whether the price includes the
+        tax and the span of the phrase
+    """
+    for pattern, default_rate, penalty, gross in TAX_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            rate = match.groupdict().get("rate")
+            return (int(rate) / 100 if rate else default_rate), penalty, gross, match.span()
+    return None, 0.0, False, None
+
+def _cut(text: str, spans: List[Optional[Tuple[int, int]]]) -> str:
+    """Remove the matched phrases from a text."""
+    for start, end in sorted((span for span in spans if span), reverse=True):
+        text = text[:start] + " " + text[end:]
+    return text
+
+def parse_invoice_utterance(text: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """
+    Parse a common German invoice utterance without calling GPT.
+
+    Understands "<Anzahl> <Leistung> à <Preis> Euro für <Kunde>, <Datum>"
+    with number words, "à"/"zu je" prices, relative dates (heute, gestern,
+    letzten Freitag), calendar dates and tax phrases like "inklusive" or
+    "zzgl. Mehrwertsteuer". Prices including the tax are converted to net
+    prices.
+
+    Args:
+        text: German voice input text
+        today: Date relative dates resolve against, today by default
+
+    Returns:
+        Structured invoice data in the shape of `GPTService.parse_invoice_text`
+        plus a "confidence" between 0 and 1, or None if the utterance does
+        not follow the pattern
+    """
+    today = today or date.today()
+    text = unicodedata.normalize("NFC", text)
+    match = UTTERANCE_PATTERN.match(text)
+    if not match:
+        return None
+
+    quantity = parse_number(match.group("quantity"))
+    unit_price = parse_number(match.group("price"))
+    if quantity is None or quantity != int(quantity) or quantity <= 0 or unit_price is None:
+        return None
+
+    confidence = 1.0
+    rest = match.group("rest")
+    lowered = rest.lower()
+    invoice_date, date_span = _match_date(lowered, today)
+    tax_rate, tax_penalty, gross, tax_span = _match_tax(lowered)
+
+    # The client ends at the first comma or at the first recognized phrase
+    client_end = min([len(rest)] + [span[0] for span in (date_span, tax_span) if span])
+    comma = rest.find(",")
+    if 0 <= comma < client_end:
+        client_end = comma
+    client = rest[:client_end].strip(" ,.;")
+    service = singular_service(drop_unit(match.group("service").strip(" ,.")))
+    if not client or not service:
+        return None
+
+    if invoice_date is None:
+        # A date that does not exist was misheard, GPT is asked
+        confidence -= 0.5 if date_span else 0.1
+        invoice_date = today
+    if tax_rate is None:
+        tax_rate = 0.19  # Default German VAT rate
+        confidence -= 0.1
+    confidence -= tax_penalty
+    if gross:
+        # Invoice items hold net prices; four places keep the gross total exact
+        unit_price = round(unit_price / (1 + tax_rate), 4)
+
+    # Words left over are something the rules did not understand, as are
+    # numbers and filler words within the client
+    leftover = re.findall(r"[\wäöüß]+", _cut(lowered, [date_span, tax_span])[client_end:])
+    client_words = re.findall(r"[\wäöüß]+", client.lower())
+    if any(word not in FILLER_WORDS for word in leftover) or any(
+        word in FILLER_WORDS - {"und"} or any(char.isdigit() for char in word) for word in client_words
+    ):
+        confidence -= 0.3
+
+    invoice_datetime = datetime.combine(invoice_date, datetime.min.time())
+    return {
+        "client": client,
+        "service": service[:1].upper() + service[1:],
+        "quantity": int(quantity),
+        "unit_price": unit_price,
+        "tax_rate": tax_rate,
+        "invoice_date": invoice_datetime,
+        "due_date": invoice_datetime + timedelta(days=30),
+        "currency": "EUR",
+        "language": "de",
+        "confidence": round(max(confidence, 0.0), 2),
+    }
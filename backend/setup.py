@@ -13,10 +13,14 @@ setup(
         "python-jose",
         "passlib",
         "python-multipart",
-        "reportlab",
+        "reportlab>=4.0,<5.1",  # font_registry hooks into TTFont internals, see test_font_registry.py
         "qrcode",
         "pillow",
+        "pypdf>=6.0,<7",  # einvoice_service embeds the XML with PdfWriter._add_object, see test_einvoice_service.py
+        "lxml",
         "requests",
+        "aiosmtplib",
+        "httpx[http2]",
         "python-dotenv",
     ],
 )
@@ -0,0 +1,104 @@
+"""Tests of the conditional and range request helpers."""
+from datetime import datetime, timezone
+
+import pytest
+from starlette.requests import Request
+
+from billirae_backend.app.core.conditional import (
+    conditional_response,
+    etag_matches,
+    is_not_modified,
+    parse_range,
+)
+
+ETAG = '"abc123"'
+LAST_MODIFIED = datetime(2025, 5, 1, 10, 0, 0, 500000, tzinfo=timezone.utc)
+CONTENT = bytes(range(100))
+
+def request(**headers) -> Request:
+    """A GET request with the given headers, underscores standing for dashes."""
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc123"', True),
+    ('"other", "abc123"', True),
+    ('"other" ,"abc123" , "third"', True),
+    ('W/"abc123"', True),
+    ("*", True),
+    ('"other"', False),
+    ('"abc"', False),
+    ("abc123", False),
+    ("", False),
+    (None, False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, ETAG) is matches
+
+@pytest.mark.parametrize("since, not_modified", [
+    ("Thu, 01 May 2025 10:00:00 GMT", True),
+    ("Thu, 01 May 2025 11:00:00 GMT", True),
+    ("Thu, 01 May 2025 09:59:59 GMT", False),
+    # Parsed as a naive datetime, HTTP dates are UTC
+    ("Thu, 01 May 2025 10:00:00 -0000", True),
+    ("Thu, 01 May 2025 09:59:59 -0000", False),
+    ("Thu, 01 May 2025 12:00:00 +0200", True),
+    ("Thu, 01 May 2025 11:59:59 +0200", False),
+    ("yesterday", False),
+])
+def test_if_modified_since(since, not_modified):
+    assert is_not_modified(request(if_modified_since=since), ETAG, LAST_MODIFIED) is not_modified
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    since = "Thu, 01 May 2025 11:00:00 GMT"
+    assert not is_not_modified(request(if_none_match='"other"', if_modified_since=since), ETAG, LAST_MODIFIED)
+    assert is_not_modified(request(if_none_match=ETAG, if_modified_since="Thu, 01 May 2025 09:00:00 GMT"), ETAG, LAST_MODIFIED)
+    assert not is_not_modified(request(), ETAG, LAST_MODIFIED)
+
+@pytest.mark.parametrize("header, byte_range", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=90-200", (90, 99)),
+    # Suffix ranges, the last N bytes
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    # Sent in full: several ranges, other units, invalid ranges
+    ("bytes=0-9,20-29", None),
+    ("items=0-9", None),
+    ("bytes=a-b", None),
+    ("bytes=9-0", None),
+])
+def test_parse_range(header, byte_range):
+    assert parse_range(header, len(CONTENT)) == byte_range
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=100-200", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(CONTENT))
+
+def test_range_response():
+    response = conditional_response(request(range="bytes=-10"), CONTENT, "application/pdf", ETAG, LAST_MODIFIED)
+    assert response.status_code == 206
+    assert response.body == CONTENT[90:]
+    assert response.headers["content-range"] == "bytes 90-99/100"
+
+    response = conditional_response(request(range="bytes=100-"), CONTENT, "application/pdf", ETAG, LAST_MODIFIED)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */100"
+
+@pytest.mark.parametrize("if_range, status", [
+    (ETAG, 206),
+    ('"other"', 200),
+    # Weak ETags and dates are not strong validators of this response
+    ('W/"abc123"', 200),
+    ("Thu, 01 May 2025 10:00:00 GMT", 200),
+])
+def test_if_range(if_range, status):
+    response = conditional_response(
+        request(range="bytes=0-9", if_range=if_range), CONTENT, "application/pdf", ETAG, LAST_MODIFIED
+    )
+    assert response.status_code == status
+    assert response.body == (CONTENT[:10] if status == 206 else CONTENT)
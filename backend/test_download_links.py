@@ -0,0 +1,117 @@
+"""Tests of the signed download links of stored PDFs."""
+import asyncio
+import hashlib
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from billirae_backend.app.api import invoices
+from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.download_links import DownloadLinkSigner, InvalidDownloadLink, download_links
+from billirae_backend.app.services.pdf_storage import LocalPDFStorage
+
+PDF = b"%PDF-1.4\n% stored invoice\n%%EOF\n"
+SHA256 = hashlib.sha256(PDF).hexdigest()
+OTHER_SHA256 = hashlib.sha256(b"another invoice").hexdigest()
+
+class CountingStorage(LocalPDFStorage):
+    """Local storage counting its blob lookups."""
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.lookups = 0
+
+    async def get_blob(self, sha256: str):
+        self.lookups += 1
+        return await super().get_blob(sha256)
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = CountingStorage(str(tmp_path))
+    asyncio.run(storage.put("render-key", PDF))
+    monkeypatch.setattr(invoices, "pdf_storage", storage)
+    return storage
+
+@pytest.fixture
+def client(storage):
+    app = FastAPI()
+    app.include_router(invoices.router, prefix=f"{settings.API_V1_STR}/invoices")
+    return TestClient(app)
+
+def link(sha256: str = SHA256, expires=None, altered=None) -> tuple:
+    """Path and query of a signed link, with the `altered` parts changed after signing."""
+    url = urlsplit(download_links.create_url(sha256, "Rechnung-RE-2025-001.pdf", expires))
+    query = {name: values[0] for name, values in parse_qs(url.query).items()}
+    altered = dict(altered or {})
+    return url.path.replace(sha256, altered.pop("sha256", sha256)), {**query, **altered}
+
+def test_valid_link_downloads_the_pdf(client):
+    path, query = link()
+    response = client.get(path, params=query)
+
+    assert response.status_code == 200
+    assert response.content == PDF
+    assert response.headers["etag"] == f'"{SHA256}"'
+    assert response.headers["content-disposition"] == 'attachment; filename="Rechnung-RE-2025-001.pdf"'
+    assert "immutable" in response.headers["cache-control"]
+
+@pytest.mark.parametrize("changes", [
+    {"sha256": OTHER_SHA256},
+    {"filename": "Rechnung-RE-2025-002.pdf"},
+    {"expires": str(int(time.time()) + 10 ** 6)},
+    {"signature": "A" * 43},
+])
+def test_altered_link_is_refused(client, storage, changes):
+    path, query = link(altered=changes)
+    response = client.get(path, params=query)
+
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Invalid download link signature"
+    assert storage.lookups == 0
+
+def test_expired_link_is_refused(client, storage):
+    path, query = link(expires=int(time.time()) - 1)
+    response = client.get(path, params=query)
+
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Download link has expired"
+    assert storage.lookups == 0
+
+@pytest.mark.parametrize("sha256", [SHA256.upper(), SHA256[:-1], SHA256 + "0", "..%2F..%2Fetc%2Fpasswd"])
+def test_malformed_hash_is_refused(client, storage, sha256):
+    _, query = link()
+    signer = DownloadLinkSigner()
+    # Signed correctly, so only the format check refuses it
+    query["signature"] = signer.sign(sha256, query["filename"], int(query["expires"]))
+    response = client.get(f"{settings.API_V1_STR}/invoices/download/{sha256}", params=query)
+
+    # An encoded path does not even reach the route
+    assert response.status_code == (404 if "%" in sha256 else 403)
+    assert storage.lookups == 0
+    with pytest.raises(InvalidDownloadLink, match="Malformed"):
+        signer.verify(sha256, query["filename"], int(query["expires"]), query["signature"])
+
+def test_revalidation_is_answered_without_a_lookup(client, storage):
+    path, query = link()
+    response = client.get(path, params=query, headers={"If-None-Match": f'"{SHA256}"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{SHA256}"'
+    assert storage.lookups == 0
+
+def test_link_of_a_missing_pdf(client):
+    path, query = link(sha256=OTHER_SHA256)
+    assert client.get(path, params=query).status_code == 404
+
+def test_links_of_another_secret_are_refused():
+    signer = DownloadLinkSigner(secret="one")
+    expires = int(time.time()) + 60
+    signature = signer.sign(SHA256, "a.pdf", expires)
+
+    signer.verify(SHA256, "a.pdf", expires, signature)
+    with pytest.raises(InvalidDownloadLink):
+        DownloadLinkSigner(secret="two").verify(SHA256, "a.pdf", expires, signature)
@@ -0,0 +1,91 @@
+"""Tests of the ZUGFeRD embedding, which relies on pypdf internals."""
+import io
+from datetime import datetime
+
+import pytest
+from lxml import etree
+from pypdf import PdfReader
+
+from billirae_backend.app.db.models.client import Address, ClientInDB
+from billirae_backend.app.db.models.invoice import InvoiceInDB, InvoiceItem
+from billirae_backend.app.db.models.user import UserInDB
+from billirae_backend.app.services.einvoice_service import ZUGFERD_FILENAME, EInvoiceService
+from billirae_backend.app.services.font_registry import font_registry
+from billirae_backend.app.services.pdf_service import PDFService
+
+@pytest.fixture(scope="module")
+def zugferd():
+    """A rendered invoice, its CII XML and the PDF with the XML embedded."""
+    user = UserInDB(
+        id="user-1",
+        email="erika@example.com",
+        hashed_password="x",
+        first_name="Erika",
+        last_name="Musterfrau",
+        company_name="Musterfrau Massagen",
+        address="Hauptstraße 1",
+        postal_code="10115",
+        city="Berlin",
+        vat_id="DE123456789",
+    )
+    client = ClientInDB(
+        id="client-1",
+        user_id=user.id,
+        name="Max Mustermann",
+        address=Address(street="Musterstraße 123", city="Berlin", zip="10115"),
+    )
+    invoice = InvoiceInDB(
+        id="invoice-1",
+        user_id=user.id,
+        client_id=client.id,
+        invoice_number="RE-2025-001",
+        invoice_date=datetime(2025, 5, 14),
+        due_date=datetime(2025, 5, 28),
+        status="sent",
+        items=[InvoiceItem(service="Massage", quantity=3, unit_price=80.0)],
+        subtotal=240.0,
+        tax_amount=45.6,
+        total=285.6,
+    )
+    pdf_service = PDFService()
+    einvoice_service = EInvoiceService(pdf_service)
+    pdf_bytes = pdf_service.render_invoice_pdf(pdf_service.build_render_payload(invoice, user, client))
+    xml_bytes = einvoice_service.build_xml(invoice, user, client, "cii")
+    return pdf_bytes, xml_bytes, einvoice_service.embed_xml(pdf_bytes, xml_bytes)
+
+def test_xml_is_attached_as_associated_file(zugferd):
+    pdf_bytes, xml_bytes, zugferd_bytes = zugferd
+    reader = PdfReader(io.BytesIO(zugferd_bytes))
+    root = reader.trailer["/Root"]
+
+    associated = [filespec.get_object() for filespec in root["/AF"]]
+    assert len(associated) == 1
+    filespec = associated[0]
+    assert filespec["/UF"] == ZUGFERD_FILENAME
+    assert filespec["/AFRelationship"] == "/Alternative"
+
+    embedded_file = filespec["/EF"]["/F"].get_object()
+    assert embedded_file["/Subtype"] == "/text/xml"
+    assert embedded_file["/Params"]["/Size"] == len(xml_bytes)
+    assert embedded_file.get_data() == xml_bytes
+
+    # The same file is listed in the name tree readers show as attachments
+    assert reader.attachments[ZUGFERD_FILENAME] == [xml_bytes]
+    assert etree.fromstring(xml_bytes).tag.endswith("CrossIndustryInvoice")
+
+def test_pdf_keeps_its_pages_and_declares_pdfa(zugferd):
+    pdf_bytes, _, zugferd_bytes = zugferd
+    original = PdfReader(io.BytesIO(pdf_bytes))
+    reader = PdfReader(io.BytesIO(zugferd_bytes))
+
+    assert zugferd_bytes.startswith(b"%PDF-1.7")
+    assert len(reader.pages) == len(original.pages)
+    assert reader.pages[0].extract_text() == original.pages[0].extract_text()
+
+    root = reader.trailer["/Root"]
+    assert root["/OutputIntents"][0].get_object()["/S"] == "/GTS_PDFA1"
+    metadata = root["/Metadata"].get_object().get_data().decode("utf-8")
+    assert f"<fx:DocumentFileName>{ZUGFERD_FILENAME}</fx:DocumentFileName>" in metadata
+    assert "<fx:ConformanceLevel>XRECHNUNG</fx:ConformanceLevel>" in metadata
+    # PDF/A is only declared while every font is embedded
+    assert ("<pdfaid:part>3</pdfaid:part>" in metadata) is font_registry.register().embedded
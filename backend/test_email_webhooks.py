@@ -0,0 +1,150 @@
+"""Tests of the email provider webhooks and the delivery event buffer."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from billirae_backend.app.api.webhooks import router
+from billirae_backend.app.core.config import settings
+from billirae_backend.app.db.models.invoice import merge_email_delivery
+from billirae_backend.app.services import email_webhooks
+from billirae_backend.app.services.delivery_events import DeliveryEventBuffer, delivery_events
+from billirae_backend.app.services.email_webhooks import (
+    DeliveryEvent,
+    InvalidWebhookSignature,
+    parse_mailgun_event,
+    verify_mailgun_signature,
+    verify_resend_signature,
+)
+
+# HMAC-SHA256 of "1700000000" + "token-abc123", checked with openssl dgst -hmac
+MAILGUN_KEY = "key-test-signing"
+MAILGUN_SIGNATURE = {
+    "timestamp": "1700000000",
+    "token": "token-abc123",
+    "signature": "0017a069a64ae885a6ea9b74f9fc1bb1c01fd31cc912dea1d3b259ed975207f2",
+}
+
+# Test vector published with the Svix libraries
+SVIX_SECRET = "whsec_MfKQ9r8GKYqrTwjUPD8ILPZIo2LaLaSw"
+SVIX_BODY = b'{"test": 2432232314}'
+SVIX_HEADERS = {
+    "svix-id": "msg_p5jXN8AQM9LWM0D4loKWxJek",
+    "svix-timestamp": "1614265330",
+    "svix-signature": "v1,g0hM9SsE+OTPJTGt/tmIKtSyZlE3uFJELVlNIOLJ1OE=",
+}
+
+def freeze_time(monkeypatch, timestamp: float) -> None:
+    monkeypatch.setattr(email_webhooks.time, "time", lambda: timestamp)
+
+def test_mailgun_signature(monkeypatch):
+    freeze_time(monkeypatch, 1700000000 + 60)
+    verify_mailgun_signature(MAILGUN_SIGNATURE, MAILGUN_KEY)
+
+    with pytest.raises(InvalidWebhookSignature):
+        verify_mailgun_signature({**MAILGUN_SIGNATURE, "token": "token-abc124"}, MAILGUN_KEY)
+    with pytest.raises(InvalidWebhookSignature):
+        verify_mailgun_signature(MAILGUN_SIGNATURE, "key-other")
+
+def test_resend_signature(monkeypatch):
+    freeze_time(monkeypatch, 1614265330)
+    verify_resend_signature(SVIX_HEADERS, SVIX_BODY, SVIX_SECRET)
+
+    with pytest.raises(InvalidWebhookSignature):
+        verify_resend_signature(SVIX_HEADERS, b'{"test": 2432232315}', SVIX_SECRET)
+    with pytest.raises(InvalidWebhookSignature):
+        verify_resend_signature({**SVIX_HEADERS, "svix-id": "msg_other"}, SVIX_BODY, SVIX_SECRET)
+
+def test_resend_signature_while_secret_is_rotated(monkeypatch):
+    freeze_time(monkeypatch, 1614265330)
+    good = SVIX_HEADERS["svix-signature"]
+    for header in (
+        f"v1,bm90IHRoZSBzaWduYXR1cmU= {good}",
+        f"{good} v1,bm90IHRoZSBzaWduYXR1cmU=",
+        f"v2,{good[3:]} {good}",
+    ):
+        verify_resend_signature({**SVIX_HEADERS, "svix-signature": header}, SVIX_BODY, SVIX_SECRET)
+
+    # Only "v1," entries count
+    with pytest.raises(InvalidWebhookSignature):
+        verify_resend_signature({**SVIX_HEADERS, "svix-signature": f"v2,{good[3:]}"}, SVIX_BODY, SVIX_SECRET)
+
+@pytest.mark.parametrize("offset", [-settings.EMAIL_WEBHOOK_TOLERANCE - 1, settings.EMAIL_WEBHOOK_TOLERANCE + 1])
+def test_stale_timestamps_are_refused(monkeypatch, offset):
+    freeze_time(monkeypatch, 1700000000 - offset)
+    with pytest.raises(InvalidWebhookSignature, match="tolerance"):
+        verify_mailgun_signature(MAILGUN_SIGNATURE, MAILGUN_KEY)
+
+    freeze_time(monkeypatch, 1614265330 - offset)
+    with pytest.raises(InvalidWebhookSignature, match="tolerance"):
+        verify_resend_signature(SVIX_HEADERS, SVIX_BODY, SVIX_SECRET)
+
+def test_mailgun_event_data_must_be_an_object():
+    for data in (None, "delivered", ["delivered"], 42):
+        with pytest.raises(ValueError):
+            parse_mailgun_event({"signature": MAILGUN_SIGNATURE, "event-data": data})
+
+def test_mailgun_webhook_rejects_malformed_event_data(monkeypatch):
+    freeze_time(monkeypatch, 1700000000)
+    monkeypatch.setattr(settings, "MAILGUN_WEBHOOK_SIGNING_KEY", MAILGUN_KEY)
+    app = FastAPI()
+    app.include_router(router, prefix="/webhooks")
+    client = TestClient(app)
+
+    for data in ("delivered", ["delivered"], {"event": "failed", "severity": "permanent",
+                                              "user-variables": {"outbox_id": "m1"}, "timestamp": "soon"}):
+        response = client.post("/webhooks/mailgun", json={"signature": MAILGUN_SIGNATURE, "event-data": data})
+        assert response.status_code == 400
+
+    # Events of emails not sent from the outbox are accepted and dropped
+    response = client.post("/webhooks/mailgun", json={"signature": MAILGUN_SIGNATURE, "event-data": {"event": "delivered"}})
+    assert response.status_code == 200
+    assert delivery_events.stats()["buffered"] == 0
+
+def test_out_of_order_events_merge_to_the_same_state():
+    delivered = {"status": "delivered", "delivered_at": datetime(2025, 5, 1, 10, 0)}
+    opened = {"status": "delivered", "last_opened_at": datetime(2025, 5, 1, 11, 0), "opens": 1}
+    opened_again = {"status": "delivered", "last_opened_at": datetime(2025, 5, 1, 12, 0), "opens": 1}
+    bounced = {"status": "bounced", "bounced_at": datetime(2025, 5, 1, 9, 0), "bounce_reason": "mailbox full"}
+
+    expected = {
+        "status": "bounced",
+        "delivered_at": datetime(2025, 5, 1, 10, 0),
+        "last_opened_at": datetime(2025, 5, 1, 12, 0),
+        "opens": 2,
+        "bounced_at": datetime(2025, 5, 1, 9, 0),
+        "bounce_reason": "mailbox full",
+    }
+    for order in (
+        [delivered, opened, opened_again, bounced],
+        [bounced, opened_again, delivered, opened],
+        [opened_again, bounced, opened, delivered],
+    ):
+        state = {}
+        for other in order:
+            merge_email_delivery(state, dict(other))
+        assert state == expected
+
+    # Buffered states merged into each other, as a flush does
+    left = merge_email_delivery(merge_email_delivery({}, dict(opened_again)), dict(bounced))
+    right = merge_email_delivery(merge_email_delivery({}, dict(opened)), dict(delivered))
+    assert merge_email_delivery(right, left) == expected
+
+def test_buffer_drops_retried_events_and_keeps_the_worst_status():
+    async def receive():
+        buffer = DeliveryEventBuffer(flush_interval=3600, flush_size=100, max_buffer=1)
+        now = datetime.now()
+        assert buffer.add(DeliveryEvent("e1", "m1", "complained", now))
+        assert buffer.add(DeliveryEvent("e2", "m1", "delivered", now))
+        assert buffer.add(DeliveryEvent("e2", "m1", "delivered", now))
+        # A second email does not fit the buffer, the provider retries it later
+        assert not buffer.add(DeliveryEvent("e3", "m2", "delivered", now))
+
+        stats = buffer.stats()
+        assert (stats["received"], stats["duplicates"], stats["refused"]) == (2, 1, 1)
+        assert buffer._pending["m1"] == {"status": "complained", "complained_at": now, "delivered_at": now}
+        await buffer.shutdown()
+
+    asyncio.run(receive())
@@ -0,0 +1,97 @@
+"""Regression tests of the font subset cache, which relies on ReportLab internals."""
+import io
+from struct import unpack_from
+
+import pytest
+from pypdf import PdfReader
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from billirae_backend.app.core.config import settings
+from billirae_backend.app.services.font_registry import HINTING_TABLES, font_registry
+
+TEXT = "Rechnung für Müller & Söhne: 3 × Massage à 80,00 €"
+
+def render(font_name: str) -> bytes:
+    buffer = io.BytesIO()
+    canvas = Canvas(buffer, pagesize=A4, invariant=1)
+    canvas.setFont(font_name, 12)
+    canvas.drawString(72, 720, TEXT)
+    canvas.showPage()
+    canvas.save()
+    return buffer.getvalue()
+
+def embedded_font_programs(pdf_bytes: bytes) -> list:
+    """Decoded FontFile2 streams of all fonts in a PDF."""
+    programs = []
+    for font in PdfReader(io.BytesIO(pdf_bytes)).pages[0]["/Resources"]["/Font"].values():
+        descriptor = font.get_object().get("/FontDescriptor")
+        if descriptor is not None and "/FontFile2" in descriptor.get_object():
+            programs.append(descriptor.get_object()["/FontFile2"].get_object().get_data())
+    return programs
+
+def font_objects(pdf_bytes: bytes) -> list:
+    """Widths and decoded ToUnicode map of all fonts in a PDF."""
+    objects = []
+    for font in PdfReader(io.BytesIO(pdf_bytes)).pages[0]["/Resources"]["/Font"].values():
+        font = font.get_object()
+        if "/ToUnicode" in font:
+            objects.append((list(font["/Widths"]), font["/ToUnicode"].get_object().get_data()))
+    return objects
+
+def font_tables(program: bytes) -> dict:
+    """Tables of a TrueType font program by tag."""
+    tables = {}
+    for index in range(unpack_from(">H", program, 4)[0]):
+        tag, _, offset, length = unpack_from(">4sLLL", program, 12 + 16 * index)
+        tables[tag.decode("latin-1")] = program[offset:offset + length]
+    return tables
+
+@pytest.fixture(scope="module")
+def fonts():
+    fonts = font_registry.register()
+    if not fonts.embedded:
+        pytest.skip("No TrueType font configured")
+    return fonts
+
+def test_subset_is_built_once_and_reused(fonts):
+    first = render(fonts.regular)
+    before = font_registry.stats()
+    second = render(fonts.regular)
+    after = font_registry.stats()
+
+    assert after["misses"] == before["misses"]
+    assert after["hits"] > before["hits"]
+    assert first == second
+
+def test_reused_subset_is_embedded_and_parses(fonts):
+    render(fonts.regular)
+    pdf_bytes = render(fonts.regular)
+
+    cached = {program for (name, _), (program, _) in font_registry._subsets.items() if name == fonts.regular}
+    programs = embedded_font_programs(pdf_bytes)
+    assert programs and all(program in cached for program in programs)
+    assert PdfReader(io.BytesIO(pdf_bytes)).pages[0].extract_text().strip() == TEXT
+
+def test_embedded_subset_has_no_hinting(fonts):
+    programs = embedded_font_programs(render(fonts.regular))
+
+    for program in programs:
+        tables = font_tables(program)
+        assert not HINTING_TABLES & set(tables)
+        # Every simple glyph ends its contours with an empty instruction list
+        long_offsets = unpack_from(">h", tables["head"], 50)[0] == 1
+        glyph_count = unpack_from(">H", tables["maxp"], 4)[0]
+        offsets = unpack_from(f">{glyph_count + 1}{'L' if long_offsets else 'H'}", tables["loca"])
+        for start in (offset * (1 if long_offsets else 2) for offset, end in zip(offsets, offsets[1:]) if end > offset):
+            contours = unpack_from(">h", tables["glyf"], start)[0]
+            if contours >= 0:
+                assert unpack_from(">H", tables["glyf"], start + 10 + 2 * contours)[0] == 0
+
+def test_cached_font_objects_match_reportlab(fonts):
+    pdfmetrics.registerFont(TTFont("UncachedRegular", settings.PDF_FONT_REGULAR))
+    render(fonts.regular)
+
+    assert font_objects(render(fonts.regular)) == font_objects(render("UncachedRegular"))
@@ -0,0 +1,117 @@
+"""Tests of the local parser of German invoice utterances."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from billirae_backend.app.services.voice_parser import drop_unit, parse_invoice_utterance, singular_service
+
+TODAY = date(2025, 5, 14)  # A Wednesday
+
+def invoice(client, service, quantity, unit_price, tax_rate, invoice_date, confidence):
+    """Expected parse, with the due date 30 days after the invoice date."""
+    invoice_datetime = datetime.combine(invoice_date, datetime.min.time())
+    return {
+        "client": client,
+        "service": service,
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "tax_rate": tax_rate,
+        "invoice_date": invoice_datetime,
+        "due_date": invoice_datetime + timedelta(days=30),
+        "currency": "EUR",
+        "language": "de",
+        "confidence": confidence,
+    }
+
+UTTERANCES = [
+    (
+        "Drei Massagen à 80 Euro für Max Mustermann, heute, inklusive Mehrwertsteuer",
+        invoice("Max Mustermann", "Massage", 3, 67.2269, 0.19, TODAY, 1.0),
+    ),
+    (
+        "Eine Behandlung zu 100 Euro für Max, heute, inkl. 7 % MwSt",
+        invoice("Max", "Behandlung", 1, 93.4579, 0.07, TODAY, 1.0),
+    ),
+    (
+        "Drei Massagen à 80 Euro für Max Mustermann, heute, exklusive Mehrwertsteuer",
+        invoice("Max Mustermann", "Massage", 3, 80.0, 0.19, TODAY, 1.0),
+    ),
+    (
+        "zwei Stunden zu je 45,50 Euro für Firma Schmidt GmbH am 12.5.2025 zuzüglich 19 % MwSt",
+        invoice("Firma Schmidt GmbH", "Stunde", 2, 45.5, 0.19, date(2025, 5, 12), 1.0),
+    ),
+    (
+        "Zwei Stunden Beratung zu je 120,50 Euro für Firma Schmidt GmbH, heute, zzgl. MwSt",
+        invoice("Firma Schmidt GmbH", "Beratung", 2, 120.5, 0.19, TODAY, 1.0),
+    ),
+    (
+        "fünfundzwanzig Beratungen à eintausendzweihundert Euro für Müller und Söhne letzten Freitag, Kleinunternehmer",
+        invoice("Müller und Söhne", "Beratung", 25, 1200.0, 0.0, date(2025, 5, 9), 1.0),
+    ),
+    (
+        "3 Massagen à 80 Euro für Max, 14. Mai 2025, ermäßigter Steuersatz",
+        invoice("Max", "Massage", 3, 80.0, 0.07, TODAY, 1.0),
+    ),
+    (
+        "5 Fahrten à 30 Euro für Anna Müller, gestern, ohne Mehrwertsteuer",
+        invoice("Anna Müller", "Fahrt", 5, 30.0, 0.0, date(2025, 5, 13), 0.7),
+    ),
+    # Rejected: "mit" does not tell a net from a gross price
+    (
+        "Drei Massagen à 80 Euro für Max, heute, mit Mehrwertsteuer",
+        invoice("Max", "Massage", 3, 80.0, 0.19, TODAY, 0.7),
+    ),
+    (
+        "Eine Massage à 60 Euro für Max",
+        invoice("Max", "Massage", 1, 60.0, 0.19, TODAY, 0.8),
+    ),
+    # Rejected: a date that does not exist is neither today nor part of the client
+    (
+        "3 Massagen à 80 Euro für Max am 31.2., inklusive MwSt",
+        invoice("Max", "Massage", 3, 67.2269, 0.19, TODAY, 0.5),
+    ),
+    # Rejected: words the rules do not understand end up in the client
+    (
+        "3 Massagen à 80 Euro für Max am Dienstag um 10 Uhr",
+        invoice("Max am Dienstag um 10 Uhr", "Massage", 3, 80.0, 0.19, TODAY, 0.5),
+    ),
+    # Rejected: not the pattern at all
+    ("Massage für Max", None),
+    ("Bitte eine Rechnung an Max schicken", None),
+    ("drei Massagen à viel Euro für Max", None),
+]
+
+@pytest.mark.parametrize("text, expected", UTTERANCES)
+def test_parse_invoice_utterance(text, expected):
+    assert parse_invoice_utterance(text, TODAY) == expected
+
+@pytest.mark.parametrize("quantity, gross", [(1, 80), (3, 80), (12, 80), (7, 19.99), (40, 1234.56)])
+def test_inclusive_price_keeps_the_gross_total(quantity, gross):
+    data = parse_invoice_utterance(f"{quantity} Massagen à {str(gross).replace('.', ',')} Euro für Max, inklusive MwSt", TODAY)
+    # Totals as the invoice endpoints compute them
+    subtotal = data["quantity"] * data["unit_price"]
+    assert round(subtotal + subtotal * data["tax_rate"], 2) == round(quantity * gross, 2)
+
+@pytest.mark.parametrize("plural, singular", [
+    ("Massagen", "Massage"),
+    ("Stunden", "Stunde"),
+    ("Fahrten", "Fahrt"),
+    ("Lektionen", "Lektion"),
+    ("Beratungen", "Beratung"),
+    ("Tätigkeiten", "Tätigkeit"),
+    ("Trainerinnen", "Trainerin"),
+    ("Kurse", "Kurse"),
+    ("Massage am Rücken", "Massage am Rücken"),
+])
+def test_singular_service(plural, singular):
+    assert singular_service(plural) == singular
+
+@pytest.mark.parametrize("service, without_unit", [
+    ("Stunden Beratung", "Beratung"),
+    ("Std. Nachhilfe", "Nachhilfe"),
+    ("Tage Workshop Teamführung", "Workshop Teamführung"),
+    ("Stunden", "Stunden"),
+    ("Massage am Rücken", "Massage am Rücken"),
+])
+def test_drop_unit(service, without_unit):
+    assert drop_unit(service) == without_unit
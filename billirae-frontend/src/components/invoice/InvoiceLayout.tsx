@@ -0,0 +1,112 @@
+import React from 'react';
+import { InvoiceLayout as InvoiceLayoutModel, InvoiceLayoutBlock } from '../../services/invoiceService';
+
+interface InvoiceLayoutProps {
+  layout: InvoiceLayoutModel;
+}
+
+/**
+ * Draws the layout model of an invoice as HTML, block by block like the PDF,
+ * so edits are previewed without rendering a PDF.
+ */
+export default function InvoiceLayout({ layout }: InvoiceLayoutProps) {
+  const watermark = layout.blocks.find(block => block.type === 'watermark');
+
+  return (
+    <div className="relative bg-white text-black text-sm p-8 space-y-6 aspect-[210/297] overflow-auto">
+      {watermark && watermark.type === 'watermark' && (
+        <div className="pointer-events-none absolute inset-0 flex items-center justify-center">
+          <span className="text-7xl font-bold text-gray-200 -rotate-45 select-none">{watermark.text}</span>
+        </div>
+      )}
+      {layout.blocks.map((block, index) => (
+        <LayoutBlock key={index} block={block} />
+      ))}
+    </div>
+  );
+}
+
+function LayoutBlock({ block }: { block: InvoiceLayoutBlock }) {
+  switch (block.type) {
+    case 'title':
+      return <h3 className="relative text-xl font-bold text-center">{block.text}</h3>;
+
+    case 'parties':
+      return (
+        <div className="relative grid grid-cols-2 gap-4">
+          {[block.sender, block.recipient].map(party => (
+            <div key={party.label}>
+              <p className="font-bold">{party.label}</p>
+              {party.lines.map((line, index) => <p key={index}>{line}</p>)}
+            </div>
+          ))}
+        </div>
+      );
+
+    case 'details':
+      return (
+        <table className="relative">
+          <tbody>
+            {block.rows.map(([label, value]) => (
+              <tr key={label}>
+                <td className="pr-8">{label}</td>
+                <td>{value}</td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      );
+
+    case 'items':
+      return (
+        <table className="relative w-full">
+          <thead>
+            <tr className="bg-gray-200 border-b border-black">
+              {block.columns.map(column => <th key={column} className="p-1 font-bold text-center">{column}</th>)}
+            </tr>
+          </thead>
+          <tbody>
+            {block.rows.map((row, index) => (
+              <tr key={index}>
+                {row.map((cell, column) => (
+                  <td key={column} className={`p-1 ${column > 0 ? 'text-right' : ''}`}>{cell}</td>
+                ))}
+              </tr>
+            ))}
+            {block.totals.map(([label, amount], index) => (
+              <tr key={label} className={`font-bold ${index === 0 ? 'border-t border-black' : ''} ${index === block.totals.length - 1 ? 'border-b border-black' : ''}`}>
+                <td colSpan={block.columns.length - 2} />
+                <td className="p-1 text-right">{label}</td>
+                <td className="p-1 text-right">{amount}</td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      );
+
+    case 'payment':
+      return (
+        <div className="relative space-y-1">
+          <p className="font-bold">{block.label}</p>
+          {block.lines.map((line, index) => <p key={index}>{line}</p>)}
+          <p className="text-muted-foreground">{block.qr_hint}</p>
+        </div>
+      );
+
+    case 'notes':
+      return (
+        <div className="relative">
+          <p className="font-bold">{block.label}</p>
+          <p className="whitespace-pre-line">{block.text}</p>
+        </div>
+      );
+
+    case 'footer':
+      return <p className="relative text-xs text-center text-gray-500">{block.text}</p>;
+
+    default:
+      // The watermark is drawn behind the page, the logo only appears in
+      // the PDF
+      return null;
+  }
+}
@@ -7,7 +7,8 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from '
 import { Label } from '../../components/ui/label';
 import { Input } from '../../components/ui/input';
 import { Textarea } from '../../components/ui/textarea';
-import invoiceService from '../../services/invoiceService';
+import invoiceService, { InvoiceLayout as InvoiceLayoutModel } from '../../services/invoiceService';
+import InvoiceLayout from './InvoiceLayout';
 
 interface InvoiceData {
   client: string;
@@ -23,12 +24,14 @@ interface InvoiceData {
 interface InvoicePreviewProps {
   invoiceId?: string;
   invoiceData?: InvoiceData;
+  clientId?: string; // Saved client of invoiceData, otherwise the preview names the client only
   onDataChange?: (data: InvoiceData) => void;
   onEmailSent?: () => void;
 }
 
-export default function InvoicePreview({ invoiceId, invoiceData, onDataChange, onEmailSent }: InvoicePreviewProps) {
+export default function InvoicePreview({ invoiceId, invoiceData, clientId, onDataChange, onEmailSent }: InvoicePreviewProps) {
   const [pdfUrl, setPdfUrl] = useState<string>('');
+  const [layout, setLayout] = useState<InvoiceLayoutModel | null>(null);
   const [isLoading, setIsLoading] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
@@ -51,6 +54,44 @@ export default function InvoicePreview({ invoiceId, invoiceData, onDataChange, o
     }
   }, [invoiceId, invoiceData]);
 
+  useEffect(() => {
+    const isTestMode = localStorage.getItem('test_mode') === 'true';
+    if (invoiceId || !invoiceData || isTestMode) {
+      setLayout(null);
+      return;
+    }
+
+    // The layout comes from the server without rendering a PDF; wait for a
+    // pause in editing before asking for it
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const result = await invoiceService.previewLayout({
+          ...(clientId ? { client_id: clientId } : { client_name: invoiceData.client }),
+          invoice_date: invoiceData.invoice_date,
+          items: [{
+            service: invoiceData.service,
+            quantity: invoiceData.quantity,
+            unit_price: invoiceData.unit_price,
+            tax_rate: invoiceData.tax_rate,
+          }],
+        });
+        if (!cancelled) {
+          setLayout(result);
+        }
+      } catch (err) {
+        if (!cancelled) {
+          setLayout(null);
+        }
+      }
+    }, 300);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [invoiceId, invoiceData, clientId]);
+
   const handleDownload = () => {
     if (pdfUrl) {
       window.open(pdfUrl, '_blank');
@@ -244,6 +285,8 @@ export default function InvoicePreview({ invoiceId, invoiceData, onDataChange, o
                   className="w-full h-[600px] border-0"
                   title="Rechnungsvorschau"
                 />
+              ) : layout ? (
+                <InvoiceLayout layout={layout} />
               ) : invoiceData && (
                 <div className="p-6 space-y-4">
                   <h3 className="text-lg font-medium">Rechnungsvorschau</h3>
@@ -1,5 +1,28 @@
 import api from './api';
 
+/** Block of the invoice layout model, in the order the PDF draws them */
+export type InvoiceLayoutBlock =
+  | { type: 'watermark'; text: string }
+  | { type: 'logo' }
+  | { type: 'title'; text: string }
+  | {
+      type: 'parties';
+      sender: { label: string; lines: string[] };
+      recipient: { label: string; lines: string[] };
+    }
+  | { type: 'details'; rows: [string, string][] }
+  | { type: 'items'; columns: string[]; rows: string[][]; totals: [string, string][]; paged: boolean }
+  | { type: 'payment'; label: string; lines: string[]; qr_data: string; qr_hint: string }
+  | { type: 'notes'; label: string; text: string }
+  | { type: 'footer'; text: string };
+
+/** Layout model of an invoice, see PDFService.build_layout_model */
+export interface InvoiceLayout {
+  layout_version: string;
+  page_format: string;
+  blocks: InvoiceLayoutBlock[];
+}
+
 export const invoiceService = {
   /**
    * Generate a PDF for a specific invoice
@@ -19,7 +42,7 @@ export const invoiceService = {
   /**
    * Send an invoice via email
    * @param invoiceId Invoice ID
-   * @param emailData Email data (recipient, subject, message, cc)
+   * @param emailData Email data (recipient, subject, message, cc, PDF as attachment or download link)
    * @returns Success response
    */
   sendEmail: async (invoiceId: string, emailData: {
@@ -27,6 +50,7 @@ export const invoiceService = {
     subject?: string;
     message?: string;
     cc_emails?: string[];
+    pdf_delivery?: 'attachment' | 'link';
   }) => {
     try {
       const response = await api.post(`/invoices/${invoiceId}/send-email`, emailData);
@@ -37,6 +61,41 @@ export const invoiceService = {
     }
   },
   
+  /**
+   * Send the emails of many invoices, each to the address of its client
+   * @param invoiceIds Invoice IDs
+   * @param emailData Optional subject, message and PDF delivery for all emails
+   * @returns Job ID and number of invoices
+   */
+  sendBulkEmail: async (invoiceIds: string[], emailData: {
+    subject?: string;
+    message?: string;
+    pdf_delivery?: 'attachment' | 'link';
+  } = {}) => {
+    try {
+      const response = await api.post('/invoices/send-bulk', { invoice_ids: invoiceIds, ...emailData });
+      return response.data;
+    } catch (error) {
+      console.error('Error starting bulk send:', error);
+      throw error;
+    }
+  },
+
+  /**
+   * Get the progress of a bulk send
+   * @param jobId Job ID returned by sendBulkEmail
+   * @returns Counts by state and the state of each invoice
+   */
+  getBulkSendProgress: async (jobId: string) => {
+    try {
+      const response = await api.get(`/invoices/send-bulk/${jobId}`);
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching bulk send progress:', error);
+      throw error;
+    }
+  },
+
   /**
    * Get the PDF URL for a specific invoice
    * @param invoiceId Invoice ID
@@ -45,7 +104,31 @@ export const invoiceService = {
   getPDFUrl: (invoiceId: string) => {
     return `${api.defaults.baseURL}/invoices/${invoiceId}/pdf`;
   },
-  
+
+  /**
+   * Get the layout of an invoice being edited, without rendering a PDF
+   * @param invoiceData Invoice data from the editor (client, items, dates, notes)
+   * @returns Layout model with the blocks of the invoice
+   */
+  previewLayout: async (invoiceData: {
+    client_id?: string;
+    client_name?: string;
+    invoice_number?: string;
+    invoice_date?: string;
+    due_date?: string;
+    items: { service: string; quantity: number; unit_price: number; tax_rate?: number }[];
+    status?: string;
+    notes?: string;
+  }): Promise<InvoiceLayout> => {
+    try {
+      const response = await api.post('/invoices/preview-layout', invoiceData);
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching invoice preview:', error);
+      throw error;
+    }
+  },
+
   /**
    * Create a new invoice from parsed voice data
    * @param invoiceData Invoice data from voice parsing